@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+轨迹生成器性能基准：覆盖 1.0/2.0/3.0/3.1 各版本的路段生成、坐标转换、
+CSV/NMEA/KML 格式化与解析，记录每秒点数和峰值内存，并可与之前保存的基线比较。
+
+    python bench.py                       # 运行全部用例并打印结果
+    python bench.py --save baseline.json  # 保存为基线
+    python bench.py --compare baseline.json --threshold 0.15   # 吞吐下降超过 15% 视为退化，退出码 1
+"""
+import argparse
+import ast
+import contextlib
+import csv
+import importlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENGINE_FILES = {"1.0": "1.0.py", "2.0": "2.0.py", "3.0": "3.0.py", "3.1": "3.1.py"}
+ROUTE_LENGTHS = (1000, 10000)  # 米
+RATES = (1, 10)  # Hz
+START = (39.989342, 116.407792)
+SPEED_RANGE = (4.5, 5.5)
+
+
+def load_engine(version):
+    """按文件路径加载各版本脚本。1.0.py 没有 __main__ 保护，只执行其中的 import、函数和大写常量定义。"""
+    path = os.path.join(ROOT, ENGINE_FILES[version])
+    name = "engine_" + version.replace('.', '_')
+    if version == "1.0":
+        with open(path, encoding='utf-8') as f: tree = ast.parse(f.read(), path)
+        keep = [n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom, ast.FunctionDef)) or
+                (isinstance(n, ast.Assign) and all(isinstance(t, ast.Name) and t.id.isupper() for t in n.targets))]
+        module = type(sys)(name); module.__file__ = path
+        exec(compile(ast.Module(body=keep, type_ignores=[]), path, 'exec'), module.__dict__)
+        return module
+    if version == "3.1":  # 3.1.py 只是命令行入口，实现在 gps_trajectory 各子模块，gps_trajectory.engine 汇总全部名字 (m.np 为 numpy 或 None)
+        module = importlib.import_module("gps_trajectory.engine")
+        return module
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)
+    return module
+
+
+def route_end(engines, length):
+    """从固定起点向东南方向走 length 米的终点 (几何计算统一用 3.1 的函数)。"""
+    return engines["3.1"].calculate_new_point(START[0], START[1], 135.0, length)
+
+
+def sample_points(m, n):
+    """生成 n 个带完整字段的点 (使用 3.1 的模型)，供格式化与解析用例复用。"""
+    random.seed(0)
+    utc = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    points, lat, lon, t = [], START[0], START[1], 0.0
+    while len(points) < n:
+        end_lat, end_lon = m.calculate_new_point(lat, lon, random.uniform(0, 360), 2000)
+        seg, lat, lon, t, _, _ = m.generate_segment(lat, lon, end_lat, end_lon, SPEED_RANGE, t, m.DEFAULT_HEIGHT, None, utc)
+        points.extend(seg)
+    return points[:n], utc
+
+
+# --- 用例定义：每个用例返回 (名称, 准备函数)，准备函数返回 (运行函数, 点数) ---
+def segment_cases(engines):
+    cases = []
+    for length in ROUTE_LENGTHS:
+        for rate in RATES:
+            step = 1.0 / rate; tag = f"{length // 1000}km@{rate}Hz"
+
+            def v20(length=length, step=step):
+                m = engines["2.0"]; m.TIME_STEP = step; end = route_end(engines, length)
+                def run():
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        m.generate_segment(csv.writer(io.StringIO()), START[0], START[1], end[0], end[1], "3", 0.0, m.DEFAULT_HEIGHT, None)
+                return run, int(length / sum(SPEED_RANGE) * 2 / step)
+            cases.append((f"segment/2.0-linear/{tag}", v20))
+
+            def v30(length=length, step=step):
+                m = engines["3.0"]; m.TIME_STEP = step; end = route_end(engines, length); utc = datetime.now(timezone.utc)
+                run = lambda: len(m.generate_segment(START[0], START[1], end[0], end[1], SPEED_RANGE, 0.0, m.DEFAULT_HEIGHT, None, utc)[0])
+                return run, run()
+            cases.append((f"segment/3.0-linear/{tag}", v30))
+
+            def v31(length=length, step=step):
+                m = engines["3.1"]; end = route_end(engines, length); utc = datetime.now(timezone.utc)
+                run = lambda: len(m.generate_segment(START[0], START[1], end[0], end[1], SPEED_RANGE, 0.0, m.DEFAULT_HEIGHT, None, utc, step)[0])
+                return run, run()
+            cases.append((f"segment/3.1-bearing-walk/{tag}", v31))
+
+            def v31_vec(length=length, step=step):
+                m = engines["3.1"]; end = route_end(engines, length); np = m.np
+                def run():
+                    rngs = [np.random.default_rng(0)]
+                    return int(m.generate_variant_segment(START[0], START[1], end[0], end[1], SPEED_RANGE, np.zeros(1), np.full(1, m.DEFAULT_HEIGHT), None, rngs, step)[1][0])
+                return run, run()
+            if engines["3.1"].np is not None: cases.append((f"segment/3.1-vectorized/{tag}", v31_vec))
+    return cases
+
+
+def motion_engine_cases(engines):
+    """3.1 --engine 各后端在同一条四段闭合路线 (总长 length 米) 上的吞吐，用于挑选满足真实感要求的最快模型。"""
+    m, cases = engines["3.1"], []
+    for length in ROUTE_LENGTHS:
+        for rate in RATES:
+            tag = f"{length // 1000}km@{rate}Hz"
+            for name, info in m.MOTION_ENGINES.items():
+                def run_engine(name=name, length=length, step=1.0 / rate):
+                    waypoints = [{'lat': START[0], 'lon': START[1]}]
+                    for bearing in (135.0, 45.0, 315.0, 225.0):
+                        lat, lon = m.calculate_new_point(waypoints[-1]['lat'], waypoints[-1]['lon'], bearing, length / 4); waypoints.append({'lat': lat, 'lon': lon})
+                    def run():
+                        random.seed(0)
+                        chunks = m.MOTION_ENGINES[name]['run'](waypoints, [SPEED_RANGE] * 4, step, 0.0, m.DEFAULT_HEIGHT, 0, False)
+                        return sum(m.motion_chunk_length(chunk) for chunk in chunks)
+                    return run, run()
+                if m.np is not None or not info['numpy']: cases.append((f"engine/{name}/{tag}", run_engine))
+    return cases
+
+
+def conversion_cases(engines, n):
+    cases = []
+    for version in ENGINE_FILES:
+        def conv(version=version):
+            m = engines[version]; random.seed(0)
+            coords = [(random.uniform(116.0, 117.0), random.uniform(39.5, 40.5)) for _ in range(n)]
+            gcj = m.gcj02_to_wgs84 if hasattr(m, 'gcj02_to_wgs84') else None
+            return (lambda: [gcj(lng, lat) for lng, lat in coords]), n
+        cases.append((f"convert/gcj02/{version}", conv))
+    def bd(version="3.1"):
+        m = engines[version]; random.seed(0)
+        coords = [(random.uniform(116.0, 117.0), random.uniform(39.5, 40.5)) for _ in range(n)]
+        return (lambda: [m.bd09_to_wgs84(lng, lat) for lng, lat in coords]), n
+    cases.append(("convert/bd09/3.1", bd))
+    return cases
+
+
+def format_cases(engines, n, workdir):
+    m = engines["3.1"]; points, utc = sample_points(m, n)
+    cols = m.points_to_columns(points) if m.np is not None else None
+    def writer_rows():
+        w = csv.writer(io.StringIO())
+        for p in points: w.writerow([f"{p['time']:.2f}", f"{p['lat']:.8f}", f"{p['lon']:.8f}", f"{p['height']:.3f}"])
+    cases = [
+        ("format/csv/per-point", lambda: (writer_rows, n)),
+        ("format/gpgga/per-point", lambda: ((lambda: [m.create_gpgga_sentence(p) for p in points]), n)),
+        ("format/gprmc/per-point", lambda: ((lambda: [m.create_gprmc_sentence(p) for p in points]), n)),
+        ("format/kml/write", lambda: ((lambda: m.write_kml_file(points, os.path.join(workdir, "bench.kml"))), n)),
+    ]
+    if cols is not None:
+        cases += [
+            ("format/csv/block", lambda: ((lambda: m.format_csv_block(cols)), n)),
+            ("format/gpgga/block", lambda: ((lambda: m.format_gpgga_block(cols, utc)), n)),
+            ("format/gprmc/block", lambda: ((lambda: m.format_gprmc_block(cols, utc)), n)),
+            ("format/nmea-set/interleaved", lambda: ((lambda: m.render_nmea_set(cols, utc, m.NMEA_SENTENCES, 'GP', True)), n)),
+        ]
+    return cases
+
+
+def parse_cases(engines, n, workdir):
+    m = engines["3.1"]; points, _ = sample_points(m, n)
+    csv_path, gga_path, rmc_path = (os.path.join(workdir, f) for f in ("bench.csv", "bench_gpgga.txt", "bench_gprmc.txt"))
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        for p in points: w.writerow([f"{p['time']:.2f}", f"{p['lat']:.8f}", f"{p['lon']:.8f}", f"{p['height']:.3f}"])
+    with open(gga_path, 'w', encoding='utf-8') as f: f.writelines(m.create_gpgga_sentence(p) + '\n' for p in points)
+    with open(rmc_path, 'w', encoding='utf-8') as f: f.writelines(m.create_gprmc_sentence(p) + '\n' for p in points)
+    cases = []
+    for version in ("3.0", "3.1"):
+        e = engines[version]
+        cases += [(f"parse/csv/{version}", lambda e=e: ((lambda: e.parse_csv_to_points(csv_path)), n)),
+                  (f"parse/gpgga/{version}", lambda e=e: ((lambda: e.parse_gpgga_to_points(gga_path)), n)),
+                  (f"parse/gprmc/{version}", lambda e=e: ((lambda: e.parse_gprmc_to_points(rmc_path)), n))]
+    return cases
+
+
+def measure(prepare, repeats):
+    """取 repeats 次中最快的一次作为耗时，另跑一次 tracemalloc 记录峰值内存 (不计入耗时)。"""
+    random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        run, points = prepare()
+        best = float('inf')
+        for _ in range(repeats):
+            random.seed(0); start = time.perf_counter(); run(); best = min(best, time.perf_counter() - start)
+        random.seed(0); tracemalloc.start(); run(); _, peak = tracemalloc.get_traced_memory(); tracemalloc.stop()
+    return {'points': points, 'seconds': best, 'points_per_sec': points / best if best > 0 else float('inf'), 'peak_kb': peak / 1024}
+
+
+def compare(results, baseline, threshold):
+    """返回吞吐低于基线 (1 - threshold) 倍的用例列表。"""
+    regressions = []
+    for name, r in results.items():
+        old = baseline.get('results', {}).get(name)
+        if old and r['points_per_sec'] < old['points_per_sec'] * (1 - threshold):
+            regressions.append((name, old['points_per_sec'], r['points_per_sec']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS 轨迹生成器性能基准")
+    parser.add_argument("-n", "--points", type=int, default=20000, help="格式化/解析/坐标转换用例的点数，默认 20000。")
+    parser.add_argument("--repeats", type=int, default=3, help="每个用例重复次数 (取最快一次)，默认 3。")
+    parser.add_argument("-k", "--filter", type=str, default="", help="只运行名称包含该字符串的用例。")
+    parser.add_argument("--save", type=str, metavar='JSON', help="把结果保存为基线 JSON。")
+    parser.add_argument("--compare", type=str, metavar='JSON', help="与之前保存的基线比较。")
+    parser.add_argument("--threshold", type=float, default=0.15, help="判定退化的吞吐下降比例，默认 0.15。")
+    args = parser.parse_args()
+
+    engines = {v: load_engine(v) for v in ENGINE_FILES}
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = segment_cases(engines) + motion_engine_cases(engines) + conversion_cases(engines, args.points) + format_cases(engines, args.points, workdir) + parse_cases(engines, args.points, workdir)
+        results = {}
+        print(f"{'用例':<36}{'点数':>9}{'点/秒':>14}{'峰值内存(KB)':>14}")
+        for name, prepare in cases:
+            if args.filter not in name: continue
+            results[name] = r = measure(prepare, args.repeats)
+            print(f"{name:<36}{r['points']:>9}{r['points_per_sec']:>14,.0f}{r['peak_kb']:>14,.1f}")
+
+    report = {'meta': {'timestamp': datetime.now(timezone.utc).isoformat(), 'python': platform.python_version(), 'platform': platform.platform(),
+                       'numpy': getattr(engines["3.1"].np, '__version__', None), 'points': args.points, 'repeats': args.repeats},
+              'results': results}
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"基线已保存到 '{args.save}'。")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f: baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 个性能退化 (阈值 {args.threshold:.0%}):")
+            for name, old, new in regressions: print(f"  {name}: {old:,.0f} -> {new:,.0f} 点/秒 ({new / old - 1:+.1%})")
+            sys.exit(1)
+        print(f"\n与基线 '{args.compare}' 相比没有超过 {args.threshold:.0%} 的性能退化。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+GPS 轨迹生成器的库接口：不经过命令行，直接在 Python 里生成、读取和格式化轨迹。
+
+    import gps_trajectory as gt
+    cols = gt.generate([{'lat': 39.989342, 'lon': 116.407792}, {'lat': 39.934766, 'lon': 116.409353, 'mode': '2'}], seed=42)
+    text = gt.to_csv(cols)                       # 与 -gg 写出的 .csv 内容相同
+    cols, utc = gt.convert('track_gpgga.txt')    # CSV / GTB / NMEA / GPX 读成点列数组
+    report = gt.analyze('track.csv')             # 与 --qa 相同的质量检查，report['passed'] 为是否通过
+
+点列数组 (cols) 是以 TRAJECTORY_COLUMNS 为键的 numpy 数组字典。各 to_* 函数只返回文本或数组，不写文件、不打印；
+进度和警告走 logging 的 "gps_trajectory" 日志器 (默认不输出，需要时由调用方配置)。除 import 外都需要 numpy。
+生成核心 (core)、读取 (readers) 和质量检查 (qa) 在第一次用到 generate / convert / analyze / MOTION_ENGINES 等时才导入；只用输出格式时可直接 from gps_trajectory import sinks。
+"""
+import importlib
+from datetime import datetime, timezone
+
+from .common import DEFAULT_HEIGHT, DEFAULT_MOTION_ENGINE, OOC_CHUNK_POINTS, SPEED_MODES, TRAJECTORY_COLUMNS, bd09_to_wgs84, gcj02_to_wgs84, numpy_module
+from .sinks import (
+    GPX_FOOTER, GTB_ENCODINGS, KML_COORD_SEPARATOR, KML_FOOTER, NMEA_SENTENCES, columns_to_gtb_records, format_csv_block, format_gpgga_block,
+    format_gprmc_block, format_gpx_block, format_nmea_set, gpx_header, kml_column_coordinates, kml_header, start_row_columns,
+)
+
+__all__ = ['generate', 'convert', 'iter_chunks', 'analyze', 'to_csv', 'to_gpgga', 'to_gprmc', 'to_nmea', 'to_gpx', 'to_kml', 'to_gtb_records', 'SINKS',
+           'MOTION_ENGINES', 'register_motion_engine', 'QA_LIMITS', 'TRAJECTORY_COLUMNS', 'SPEED_MODES', 'NMEA_SENTENCES', 'DEFAULT_HEIGHT']
+
+
+_LAZY_NAMES = {'MOTION_ENGINES': 'core', 'register_motion_engine': 'core', 'QA_LIMITS': 'qa'}
+
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module('.' + _LAZY_NAMES[name], __name__), name)
+
+
+def _numpy(feature):
+    np = numpy_module()
+    if np is None: raise ImportError(f"{feature} 需要 numpy，请先执行 pip install numpy。")
+    return np
+
+
+def _concat(chunks):
+    np = _numpy("点列数组")
+    chunks = list(chunks)
+    return {key: np.concatenate([np.asarray(c[key], dtype=float) for c in chunks]) if chunks else np.zeros(0) for key in TRAJECTORY_COLUMNS}
+
+
+def generate(waypoints, speed=None, rate=1.0, seed=None, coord='wgs84', engine=DEFAULT_MOTION_ENGINE, dynamics=False, smooth_corners=False,
+             start_time=0.0, start_height=DEFAULT_HEIGHT):
+    """
+    生成整条路线 (与 -gg 相同的模型)，返回含起点的点列数组字典。
+    waypoints 为 {'lat', 'lon'[, 'mode']} 字典序列，mode 为 SPEED_MODES 的键 ('1'-'4')；coord 为 'gcj02' / 'bd09' 时先转换为 WGS-84。
+    speed 为 '10-15'、'15' 或 (最小, 最大) m/s，指定后覆盖各点的 mode；rate 为采样频率 (Hz)。
+    engine 为 MOTION_ENGINES 中的运动模型后端 (与 --engine 相同)；dynamics / smooth_corners 与 --dynamics / --smooth-corners 相同，即 engine='routed'。
+    """
+    _numpy("generate()")
+    from .core import MOTION_ENGINES, generate_route, parse_speed_range, resolve_speed_ranges
+    if rate <= 0: raise ValueError("rate 必须大于 0")
+    convert_point = {'gcj02': gcj02_to_wgs84, 'bd09': bd09_to_wgs84}.get(coord)
+    route = []
+    for wp in waypoints:
+        lon, lat = convert_point(wp['lon'], wp['lat']) if convert_point else (wp['lon'], wp['lat'])
+        route.append({'lat': float(lat), 'lon': float(lon), 'mode': str(wp['mode']) if wp.get('mode') else None})
+    if len(route) < 2: raise ValueError("至少需要两个路线点")
+    speed_range = parse_speed_range(speed) if isinstance(speed, str) else (parse_speed_range(str(speed)) if isinstance(speed, (int, float)) else speed)
+    speed_ranges = resolve_speed_ranges(route, tuple(speed_range) if speed_range else None)
+    engine = 'routed' if dynamics or smooth_corners else engine
+    if engine not in MOTION_ENGINES: raise ValueError(f"不支持的运动引擎 '{engine}'，可选 {', '.join(MOTION_ENGINES)}")
+    _, cols = generate_route(route, speed_ranges, seed, 1.0 / rate, None, start_time, start_height, engine, smooth_corners)
+    return _concat([start_row_columns((start_time, route[0]['lat'], route[0]['lon'], start_height)), cols])
+
+
+def iter_chunks(path, coord=None, chunk_points=OOC_CHUNK_POINTS):
+    """按块读取 .gtb / .csv / .gpx / GPGGA / GPRMC 轨迹，依次产出点列数组字典 (大文件只占一块的内存)。"""
+    _numpy("iter_chunks()")
+    from .readers import TrajectoryChunkReader
+    return TrajectoryChunkReader(path, coord, chunk_points)
+
+
+def convert(path, coord=None):
+    """把整个轨迹文件读成 (点列数组字典, 起始 UTC 时间)；.csv 没有 UTC 信息，起始时间为 None。"""
+    reader = iter_chunks(path, coord)
+    cols = _concat(reader)
+    return cols, reader.utc_start_time
+
+
+def analyze(path, mode=None, coord=None):
+    """
+    轨迹质量检查 (与 --qa 相同)：返回速度/加速度/转向角速度/升降速度分布、时间断档/重复、跳点等计数，
+    以及按 mode ('1'-'4'，默认按速度中位数选择) 的 QA_LIMITS 门限逐项判定的字典，'passed' 为总结果。
+    """
+    _numpy("analyze()")
+    from .qa import analyze_trajectory
+    return analyze_trajectory(path, mode, coord)
+
+
+def to_csv(cols):
+    """time,lat,lon,height 文本 (\\r\\n 行尾，与 csv.writer 一致)。"""
+    _numpy("to_csv()")
+    return format_csv_block(cols)
+
+
+def to_gpgga(cols, utc_start_time=None):
+    """GPGGA 语句列表；utc_start_time 为 cols['time'] == 0 对应的 UTC 时间，默认当前时间。"""
+    _numpy("to_gpgga()")
+    return format_gpgga_block(cols, utc_start_time or datetime.now(timezone.utc))
+
+
+def to_gprmc(cols, utc_start_time=None):
+    """GPRMC 语句列表。"""
+    _numpy("to_gprmc()")
+    return format_gprmc_block(cols, utc_start_time or datetime.now(timezone.utc))
+
+
+def to_nmea(cols, sentences=('GGA', 'RMC'), utc_start_time=None, talker='GP'):
+    """NMEA 语句集：返回 {语句类型: 语句列表}，可选 NMEA_SENTENCES 中的任意组合，与 --nmea 相同。"""
+    _numpy("to_nmea()")
+    unknown = sorted(set(sentences) - set(NMEA_SENTENCES))
+    if unknown: raise ValueError(f"不支持的语句: {','.join(unknown)}")
+    return format_nmea_set(cols, utc_start_time or datetime.now(timezone.utc), tuple(sentences), talker)
+
+
+def to_gpx(cols, utc_start_time=None, track_name="Generated Track"):
+    """完整的 GPX 1.1 文档文本。"""
+    _numpy("to_gpx()")
+    return gpx_header(track_name) + format_gpx_block(cols, utc_start_time or datetime.now(timezone.utc)) + GPX_FOOTER
+
+
+def to_kml(cols, track_name="Converted Track"):
+    """完整的 KML 文档文本，与 -k 对同一组点写出的文件相同。"""
+    _numpy("to_kml()")
+    return kml_header(track_name) + KML_COORD_SEPARATOR.join(kml_column_coordinates(cols)) + KML_FOOTER
+
+
+def to_gtb_records(cols, encoding='i4'):
+    """.gtb 定长记录 (numpy 结构化数组)；encoding 为 'i4' (定点) 或 'f8'。"""
+    _numpy("to_gtb_records()")
+    return columns_to_gtb_records(cols, GTB_ENCODINGS[encoding])
+
+
+SINKS = {'csv': to_csv, 'gpgga': to_gpgga, 'gprmc': to_gprmc, 'nmea': to_nmea, 'gpx': to_gpx, 'kml': to_kml, 'gtb': to_gtb_records}
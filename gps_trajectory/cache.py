@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""轨迹结果缓存 (--cache)，-gg 和 --serve 共用；core.iter_route_columns 只通过传入的 cache 对象调用它。"""
+import hashlib
+import json
+import os
+import shutil
+
+from .common import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_MB, DEFAULT_HEIGHT, ENGINE_VERSION, LOGGER, TRAJECTORY_COLUMNS, LazyModule
+
+np = LazyModule('numpy', 'np', globals())
+
+
+# --- 轨迹结果缓存 ---
+# 缓存键 = (转换后的路线点, 各段速度范围, 采样间隔, 随机种子, 起始状态, 引擎版本) 的哈希。
+# 每个条目是一个目录，只有一份数据：points.npz (np.savez_compressed) 保存起点行和点列数组 (float64，命中时输出与重新生成逐字节相同)，
+# CSV/NMEA/GPX 等输出在命中时由点列数组重新渲染 (NMEA 中的 UTC 时间本来就与运行时刻有关)。
+class TrajectoryCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE_MB * 1024 * 1024):
+        self.cache_dir, self.max_bytes = cache_dir, max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(waypoints, speed_ranges, time_step, seed, start_time=0.0, start_height=DEFAULT_HEIGHT, engine=ENGINE_VERSION):
+        payload = {'engine': engine, 'waypoints': [[wp['lat'], wp['lon']] for wp in waypoints], 'speed_ranges': [list(r) for r in speed_ranges],
+                   'time_step': time_step, 'seed': seed, 'start': [start_time, start_height]}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        """命中时刷新条目的访问时间 (LRU) 并返回 (起点行, 点列数组字典)，否则返回 None。"""
+        entry = os.path.join(self.cache_dir, key)
+        if not os.path.isfile(os.path.join(entry, 'points.npz')): return None
+        try:
+            with np.load(os.path.join(entry, 'points.npz')) as data:
+                start, cols = data['start'].tolist(), {k: data[k] for k in TRAJECTORY_COLUMNS}
+        except Exception as e: LOGGER.warning(f"警告: 缓存条目 {key[:12]} 已损坏，将重新生成 ({e})。"); shutil.rmtree(entry, ignore_errors=True); return None
+        os.utime(entry)
+        return start, cols
+
+    def store(self, key, start, cols):
+        entry = os.path.join(self.cache_dir, key); tmp = f"{entry}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        np.savez_compressed(os.path.join(tmp, 'points.npz'), start=np.array(start, dtype=float), **{k: np.asarray(cols[k], dtype=float) for k in TRAJECTORY_COLUMNS})
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)  # 先写临时目录再改名，并发运行时不会读到写了一半的条目
+        self.evict()
+
+    def evict(self):
+        """按最近访问时间从旧到新删除条目，直到总大小不超过上限。"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(path) or '.tmp-' in name: continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+        total = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            shutil.rmtree(path, ignore_errors=True); total -= size
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+GPS 轨迹生成器 3.1 的命令行 (入口为仓库根目录的 3.1.py)：参数解析、日志配置和模式分派。
+各模式的流程在 drivers / serve 中，解析完参数后才导入，--help 和参数错误只加载生成核心和输出格式的常量。
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import traceback
+
+from .common import (
+    DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_MB, DEFAULT_CHUNK_SECONDS, DEFAULT_MOTION_ENGINE, DEFAULT_SERVE_PORT, DEFAULT_SHM_CAPACITY, DEFAULT_STREAM_BUFFER,
+    LOGGER, PROFILER, PROGRESS_LOGGER, SPEED_MODES, TIME_STEP,
+)
+from .core import MOTION_ENGINES
+from .gnss import DEFAULT_ELEVATION_MASK, GNSS_ERROR_MODELS
+from .sinks import GTB_ENCODINGS, NMEA_SENTENCES, NMEA_TALKERS
+
+
+# --- 主程序入口 (无变化) ---
+def configure_logging(stream, quiet_progress=False):
+    """命令行的日志输出：只打印消息本身，与原来的 print 输出一致。"""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    LOGGER.handlers[:] = [handler]; LOGGER.propagate = False; LOGGER.setLevel(logging.INFO)
+    PROGRESS_LOGGER.setLevel(logging.WARNING if quiet_progress else logging.NOTSET)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="GPS轨迹生成与KML转换工具", formatter_class=argparse.RawTextHelpFormatter,
+        epilog="""
+用法示例:
+1. 从高德CSV生成GPRMC，使用自定义速度 20-25 m/s:
+   python %(prog)s -gg my_route.csv -o track -c -s "20-25"
+2. 启动交互模式，使用固定速度 15 m/s:
+   python %(prog)s -g -o my_interactive_track -s 15
+3. 将本脚本生成的CSV/TXT/GTB文件转换为KML:
+   python %(prog)s -k track.csv
+4. 同一路线批量生成 1000 个随机变体 (种子 42 ~ 1041):
+   python %(prog)s -gg my_route.csv -o sim/track -V 1000 --seed 42
+5. 启动本地生成服务，在浏览器打开 http://127.0.0.1:8765/ 选点生成:
+   python %(prog)s --serve --cache
+6. 把 10Hz 轨迹切成 300 秒一段 (重叠 5 秒)，每段交给一个 gps-sdr-sim 进程:
+   python %(prog)s --split track.csv --chunk-seconds 300 --chunk-overlap 5
+7. 按真实时间把 10Hz NMEA 推送到本机 TCP 10110 端口 (接收端连接 127.0.0.1:10110):
+   python %(prog)s -gg my_route.csv -r 10 --stream tcp://127.0.0.1:10110
+8. 管道模式，从其他程序读入路线点并输出 GPGGA:
+   cat points.txt | python %(prog)s --filter --format gpgga --seed 1 > track_gpgga.txt
+9. 把录制的 NMEA 轨迹改为 10Hz、总时长 2 小时并加 2 米噪声:
+   python %(prog)s --replay recorded_gpgga.txt -o replay -r 10 --target-duration 7200 --noise 2 -a
+10. 批量检查 -V 生成的变体 (按开车模式的门限)，有不通过的文件时退出码为 1:
+   python %(prog)s --qa sim/track_v*.csv --qa-mode 4 --qa-report qa.json
+11. 断点续写后增量更新 KMZ，只转换新追加的点 (每次续写作为一个新的 Placemark):
+   python %(prog)s -k track.csv --incremental --kmz --kml-session
+-------------------------------------------------------------------
+by: 兮辰，仅在小黄鱼（兮辰666）使用，其他均为盗版
+GitHub: https://github.com/xichenyun/GPS-Trajectory-Generator
+"""
+    )
+    mode_group = parser.add_mutually_exclusive_group(required=False)
+    mode_group.add_argument("-k", "--kml_convert", type=str, metavar='INPUT_FILE', help="【独立模式】将指定的轨迹文件转换为KML。")
+    mode_group.add_argument("-gg", "--gaode_csv", type=str, metavar='CSV_FILE', help="【生成模式】从CSV文件生成轨迹，也可以是 .gpx / .geojson 路线或轨迹。")
+    mode_group.add_argument("-g", "--gaode_interactive", action='store_true', help="【生成模式】高德交互模式。")
+    mode_group.add_argument("-b", "--baidu_interactive", action='store_true', help="【生成模式】百度交互模式。")
+    mode_group.add_argument("--split", type=str, metavar='INPUT_FILE', help="【独立模式】把轨迹文件 (CSV/GTB/NMEA) 按时长切分为多个分块并写出清单，供 gps-sdr-sim 分段并行使用。")
+    mode_group.add_argument("--replay", type=str, metavar='INPUT_FILE', help="【回放模式】把已有轨迹 (CSV/GTB/NMEA/GPX) 重新计时、按 -r 重采样并叠加噪声，输出为新轨迹。")
+    mode_group.add_argument("--filter", action='store_true', help="【管道模式】从 stdin 读取 '经度,纬度[,模式]' 路线点，生成结果按 --format 写到 stdout，无任何交互提示。")
+    mode_group.add_argument("--shm-attach", type=str, metavar='NAME', help="【共享内存消费者】连接 --shm 创建的共享内存段，把收到的点写成 CSV (-o)，用作下游程序的参考实现。")
+    mode_group.add_argument("--qa", type=str, nargs='+', metavar='INPUT_FILE', help="【校验模式】检查已生成的轨迹 (CSV/GTB/NMEA/GPX)：速度/加速度分布、航向突变、时间断档和重复、高度漂移、跳点，按运动模式门限判定，有不通过时退出码为 1。")
+    mode_group.add_argument("--serve", type=int, nargs='?', const=DEFAULT_SERVE_PORT, metavar='PORT', help=f"【服务模式】启动本地 HTTP 生成服务 (默认端口 {DEFAULT_SERVE_PORT})，供 index.html 直接生成轨迹。")
+    parser.add_argument("-s", "--speed", type=str, help="【生成模式】自定义速度范围(m/s), 如 '10-15'。将覆盖所有其他速度设置。")
+    parser.add_argument("-o", "--output", type=str, default="trajectory", help="输出文件名的基础部分。")
+    parser.add_argument("-c", "--gprmc", action="store_true", help="生成GPRMC NMEA文件。")
+    parser.add_argument("-a", "--gpgga", action="store_true", help="生成GPGGA NMEA文件。")
+    parser.add_argument("-x", "--clear", action="store_true", help="清空输出文件。")
+    parser.add_argument("--gpx", action="store_true", help="同时输出 GPX 1.1 轨迹 <output>.gpx (含时间、高程、速度和航向，需要 numpy)。")
+    parser.add_argument("-B", "--binary", action="store_true", help="同时输出紧凑的二进制轨迹 <output>.gtb (带时间索引，可用 -k 转换，需要 numpy)。")
+    parser.add_argument("--binary-encoding", choices=sorted(GTB_ENCODINGS), default='i4', help="二进制记录编码：i4 为定点整数 (20 字节/点，1e-7 度)，f8 为双精度 (48 字节/点)，默认 i4。")
+    parser.add_argument("-V", "--variants", type=int, metavar='K', help="【-gg 模式】同一路线批量生成 K 个独立变体，输出 <output>_vNNNN.* (需要 numpy)。")
+    parser.add_argument("--dynamics", action="store_true", help="【-gg 模式】使用运动学规划：起终点静止、转弯处按转角减速，加速度和加加速度受限 (需要 numpy)。")
+    parser.add_argument("--smooth-corners", action="store_true", help="【-gg 模式】拐角用圆弧平滑 (航向连续变化)，会自动启用 --dynamics。")
+    parser.add_argument("--engine", choices=list(MOTION_ENGINES), metavar='ENGINE',
+                        help="【-gg 模式】运动模型后端，生成后报告实测 点/秒 (默认 bearing-walk；--dynamics 即 routed)：\n" +
+                             "\n".join(f"  {name:<13}{info['description']}" for name, info in MOTION_ENGINES.items()))
+    parser.add_argument("--gnss-error", choices=GNSS_ERROR_MODELS, help="【生成/--filter/--replay】叠加时间相关的定位误差：gauss-markov (一阶高斯-马尔可夫) 或 random-walk (随机游走)，需要 numpy。")
+    parser.add_argument("--gnss-sigma", type=float, default=1.5, metavar="M", help="误差模型的水平标准差 (米)，默认 1.5；随机游走时为经过 --gnss-tau 秒后的标准差。")
+    parser.add_argument("--gnss-vsigma", type=float, default=3.0, metavar="M", help="误差模型的高程标准差 (米)，默认 3.0。")
+    parser.add_argument("--gnss-tau", type=float, default=60.0, metavar="SEC", help="误差的相关时间 (秒)，默认 60。")
+    parser.add_argument("--nmea", type=str, metavar="GGA,RMC,...", help=f"【生成/--replay】输出的 NMEA 语句集，可任意组合 {','.join(NMEA_SENTENCES)}；-c/-a 会并入该集合。各语句写入 *_gpxxx.txt，或用 --nmea-interleave 按历元交错写入 *_nmea.txt。")
+    parser.add_argument("--talker", choices=NMEA_TALKERS, default='GP', help="【--nmea】语句的 talker ID，默认 GP (gps-sdr-sim 只识别 $GPGGA)。")
+    parser.add_argument("--nmea-interleave", action="store_true", help="【--nmea】所有语句按历元顺序交错写入同一个 *_nmea.txt。")
+    parser.add_argument("--nav", type=str, metavar="RINEX", help="【生成/--replay】GPS 广播星历导航文件 (与 gps-sdr-sim -e 相同)：GGA 写入实际可见星数和 HDOP，并输出 *_gpgsv.txt (GSA+GSV)。")
+    parser.add_argument("--nav-start", type=str, metavar="YYYY/MM/DD,hh:mm:ss", help="【--nav】轨迹起始 UTC 时间 (与 gps-sdr-sim -t 相同)，默认取导航文件第一组星历的时间。")
+    parser.add_argument("--elevation-mask", type=float, default=DEFAULT_ELEVATION_MASK, metavar="DEG", help=f"【--nav】卫星截止仰角 (度)，默认 {DEFAULT_ELEVATION_MASK:g}。")
+    parser.add_argument("--shm", type=str, metavar='NAME', help="【生成/--replay】把点列数组写入名为 NAME 的共享内存环形缓冲，下游程序 attach 后零拷贝读取 (需要 numpy)。")
+    parser.add_argument("--shm-capacity", type=int, default=DEFAULT_SHM_CAPACITY, metavar='N', help=f"【--shm】环形缓冲容量 (条，每条 48 字节)，默认 {DEFAULT_SHM_CAPACITY}；写满时等待消费者读取。")
+    parser.add_argument("-r", "--rate", type=float, default=1.0 / TIME_STEP, help="【生成模式】采样频率 (Hz)，默认 1Hz。")
+    parser.add_argument("--cache", type=str, nargs='?', const=DEFAULT_CACHE_DIR, metavar='DIR', help=f"【-gg 模式】启用结果缓存 (默认目录 {DEFAULT_CACHE_DIR})，需与 --seed 同用。")
+    parser.add_argument("--cache-size", type=float, default=DEFAULT_CACHE_SIZE_MB, metavar='MB', help=f"缓存总大小上限 (MB)，超出后按最近最少使用淘汰，默认 {DEFAULT_CACHE_SIZE_MB}。")
+    parser.add_argument("--profile", type=str, nargs='?', const='', metavar='REPORT_JSON', help="记录各阶段耗时/点数并写出 JSON 报告 (默认 <output>_profile.json)，同时关闭逐段输出。")
+    parser.add_argument("--profile-memory", action="store_true", help="与 --profile 同用，用 tracemalloc 记录各阶段内存分配。")
+    parser.add_argument("--cprofile", type=str, metavar='PSTATS_FILE', help="与 --profile 同用，额外保存 cProfile 函数级统计。")
+    parser.add_argument("--qa-mode", choices=sorted(SPEED_MODES), help="【校验模式】按哪种运动模式的门限判定 (1 走路 2 慢跑 3 快跑 4 开车)，默认按速度中位数自动选择；混合模式的路线请指定最快的模式。")
+    parser.add_argument("--qa-report", type=str, metavar='JSON', help="【校验模式】把每个文件的分布、计数和判定写入 JSON。")
+    parser.add_argument("--simplify", type=float, metavar='METERS', help="【-k 模式】按 Douglas-Peucker 抽稀后再写 KML，容差单位为米 (分窗口处理，需要 numpy)。")
+    parser.add_argument("--incremental", action='store_true', help="【-k 模式】增量更新：用状态记录 <输出>.state 记住已转换的位置，输入续写后再次 -k 只解析新追加的点并接到原 KML 末尾；状态对不上时完整重建。")
+    parser.add_argument("--kml-session", action='store_true', help="【-k 模式】与 --incremental 联用：本次追加的点写成新的 Placemark (Session N)，从上次的最后一点开始。")
+    parser.add_argument("--kmz", action='store_true', help="【-k 模式】输出压缩的 .kmz (只含 doc.kml)，同样支持 --incremental。")
+    parser.add_argument("--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS, metavar='SECONDS', help=f"【--split 模式】每块时长 (秒)，默认 {DEFAULT_CHUNK_SECONDS:g}。")
+    parser.add_argument("--chunk-overlap", type=float, default=0.0, metavar='SECONDS', help="【--split 模式】相邻分块的重叠时长 (秒)，默认 0。")
+    parser.add_argument("--time-scale", type=float, metavar='FACTOR', help="【回放模式】时间轴缩放系数，2 表示用两倍时间走完。")
+    parser.add_argument("--target-duration", type=float, metavar='SECONDS', help="【回放模式】把总时长调整为指定秒数。")
+    parser.add_argument("--target-speed", type=float, metavar='M/S', help="【回放模式】把平均速度调整为指定值 (m/s)，速度起伏按比例保留。")
+    parser.add_argument("--noise", type=float, default=0.0, metavar='METERS', help="【回放模式】叠加的水平高斯噪声标准差 (米)，默认 0。")
+    parser.add_argument("--height-noise", type=float, default=0.0, metavar='METERS', help="【回放模式】叠加的高度高斯噪声标准差 (米)，默认 0。")
+    parser.add_argument("--format", choices=['csv', 'gprmc', 'gpgga', 'kml', 'gpx'], default='csv', help="【管道模式】stdout 输出格式，默认 csv。")
+    parser.add_argument("--coord", choices=['gcj02', 'bd09', 'wgs84'], help="输入坐标系。管道模式默认 gcj02 (高德)；-gg 导入 GPX/GeoJSON 时默认按文件标记 (未标记视为 wgs84)。")
+    parser.add_argument("--stream", type=str, metavar='TARGET', help="【-gg 模式】按墙钟节奏实时输出 GGA+RMC 到 tcp://HOST:PORT (本机服务端)、udp://HOST:PORT 或 pty (伪终端)，不写文件。")
+    parser.add_argument("--stream-buffer", type=int, default=DEFAULT_STREAM_BUFFER, metavar='POINTS', help=f"【--stream】生成线程最多领先的点数，默认 {DEFAULT_STREAM_BUFFER}。")
+    parser.add_argument("--stream-stats", type=str, metavar='JSON', help="【--stream】把迟到统计 (平均/p50/p99/最大，毫秒) 写入 JSON。")
+    parser.add_argument("--serve-origin", type=str, action='append', metavar='ORIGIN', help="【服务模式】额外允许跨域调用 /generate 的网页来源 (如 http://192.168.1.5:8080，可重复)；默认只允许本服务的页面和从本地文件打开的 index.html。")
+    parser.add_argument("--workers", type=int, metavar='N', help="【服务/--split 模式】工作进程数，默认等于 CPU 核数。")
+    parser.add_argument("--seed", type=int, help="【生成模式】随机种子，相同种子得到相同轨迹；-V 模式下变体 i 的种子为 seed+i。")
+    args = parser.parse_args(argv)
+    configure_logging(sys.stderr if args.filter else sys.stdout, quiet_progress=args.profile is not None)  # 管道模式下 stdout 只输出数据
+    args.dynamics = args.dynamics or args.smooth_corners  # 圆弧平滑基于运动学规划器
+    if args.dynamics and args.engine not in (None, 'routed'): parser.error("--dynamics / --smooth-corners 即 --engine routed，不能与其他 --engine 同用")
+    args.engine = args.engine or ('routed' if args.dynamics else DEFAULT_MOTION_ENGINE)
+    args.dynamics = args.engine == 'routed'
+    if args.nmea:
+        # -c/-a 并入语句集，之后只由语句集负责 NMEA 输出
+        sentences = [x.strip().upper() for x in args.nmea.split(',') if x.strip()] + [x for x, flag in (('RMC', args.gprmc), ('GGA', args.gpgga)) if flag]
+        unknown = sorted(set(sentences) - set(NMEA_SENTENCES))
+        if unknown or not sentences: parser.error(f"--nmea 不支持的语句: {','.join(unknown) or '(空)'}，可选 {','.join(NMEA_SENTENCES)}")
+        args.nmea, args.gprmc, args.gpgga = list(dict.fromkeys(sentences)), False, False
+    if args.profile is not None:
+        PROFILER.enable(trace_memory=args.profile_memory, use_cprofile=bool(args.cprofile))
+    from .drivers import (  # 解析完参数才导入各模式的流程 (连同 numpy 之外的较重依赖)
+        run_filter_mode, run_kml_conversion_mode, run_qa_mode, run_replay_mode, run_shm_attach_mode, run_split_mode, run_trajectory_generation,
+    )
+    from .serve import run_generation_server
+    qa_failed = False
+    try:
+        is_generation_mode = args.gaode_csv or args.gaode_interactive or args.baidu_interactive
+        if args.serve is not None: run_generation_server(args)
+        elif args.shm_attach: run_shm_attach_mode(args)
+        elif args.filter:
+            if args.rate <= 0: print("错误: -r 采样频率必须大于 0。", file=sys.stderr); sys.exit(1)
+            if args.nav or args.nmea or args.shm or args.engine != DEFAULT_MOTION_ENGINE: print("警告: --filter 模式按 --format 输出，已忽略 --nav / --nmea / --shm / --engine。", file=sys.stderr)
+            run_filter_mode(args)
+        elif args.replay:
+            if args.rate <= 0: print("错误: -r 采样频率必须大于 0。"); sys.exit(1)
+            run_replay_mode(args)
+        elif args.split:
+            if is_generation_mode or args.speed: print("警告: --split 模式为独立模式，将忽略所有生成模式相关参数 (-gg, -g, -b, -s 等)。")
+            run_split_mode(args)
+        elif args.qa:
+            if is_generation_mode or args.speed: print("警告: --qa 模式为独立模式，将忽略所有生成模式相关参数 (-gg, -g, -b, -s 等)。")
+            qa_failed = not run_qa_mode(args)
+        elif args.kml_convert:
+            if is_generation_mode or args.speed: print("警告: -k 模式为独立模式，将忽略所有生成模式相关参数 (-gg, -g, -b, -s 等)。")
+            run_kml_conversion_mode(args.kml_convert, args.simplify, args.incremental, args.kml_session, args.kmz)
+        elif args.variants is not None and (not args.gaode_csv or args.variants < 1):
+            print("错误: -V 参数必须与 -gg 联用，且变体数至少为 1。"); sys.exit(1)
+        elif args.rate <= 0: print("错误: -r 采样频率必须大于 0。"); sys.exit(1)
+        elif args.gnss_error and (args.variants or args.stream):
+            print("错误: --gnss-error 目前不支持 -V 和 --stream。"); sys.exit(1)
+        elif args.nav and (args.variants or args.stream):
+            print("错误: --nav 目前不支持 -V 和 --stream。"); sys.exit(1)
+        elif args.nmea and (args.variants or args.stream):
+            print("错误: --nmea 目前不支持 -V 和 --stream (这两种模式仍按 -c/-a 输出 GPRMC/GPGGA)。"); sys.exit(1)
+        elif args.shm and (args.variants or args.stream):
+            print("错误: --shm 目前不支持 -V 和 --stream。"); sys.exit(1)
+        elif args.engine != DEFAULT_MOTION_ENGINE and (not args.gaode_csv or args.variants or args.stream):
+            print(f"错误: --engine {args.engine}{' (--dynamics)' if args.dynamics else ''} 目前只能与 -gg 联用 (不支持 -V 和 --stream)。"); sys.exit(1)
+        elif args.stream and (not args.gaode_csv or args.variants or args.stream_buffer < 1):
+            print("错误: --stream 只能与 -gg 联用 (不支持 -V)，且 --stream-buffer 至少为 1。"); sys.exit(1)
+        elif is_generation_mode: run_trajectory_generation(args)
+        elif args.speed and not is_generation_mode:
+            print("错误: -s 参数必须与一种生成模式 (-gg, -g, -b) 联用。"); parser.print_help(); sys.exit(1)
+        else: print("错误: 请指定一种操作模式。"); parser.print_help(); sys.exit(1)
+    except SystemExit: pass
+    except Exception as e: print("\n--- 程序意外终止 ---"); traceback.print_exc(); sys.exit(1)
+    finally:
+        if args.profile is not None:
+            report_base = os.path.splitext(args.kml_convert or args.split or (args.qa[0] if args.qa else args.output))[0]
+            with contextlib.redirect_stdout(sys.stderr if args.filter else sys.stdout):  # 管道模式下 stdout 只输出数据
+                PROFILER.finish(args.profile or f"{report_base}_profile.json", args.cprofile)
+    if qa_failed: sys.exit(1)  # 校验模式作为批处理的门禁，用退出码报告不通过
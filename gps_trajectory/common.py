@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+公共部分：日志器、numpy 的延迟导入、常量、分阶段性能统计 (--profile)、球面几何和坐标转换。
+包内其他模块都从这里导入，这里不依赖包内任何模块。
+"""
+import contextlib
+import importlib
+import logging
+import math
+import sys
+import time
+
+LOGGER = logging.getLogger("gps_trajectory")
+PROGRESS_LOGGER = logging.getLogger("gps_trajectory.progress")
+
+class LazyModule:
+    """
+    第一次访问属性时才导入模块，并把所在模块 (namespace 为其 globals()) 的全局名字换成真正的模块，之后的访问没有额外开销；
+    模块不存在时换成 None。用到 numpy 的各子模块各自建一个，互不影响。
+    """
+    def __init__(self, module_name, global_name, namespace):
+        self.module_name, self.global_name, self.namespace = module_name, global_name, namespace
+
+    def load(self):
+        try: module = importlib.import_module(self.module_name)
+        except ImportError: module = None
+        self.namespace[self.global_name] = module
+        return module
+
+    def __getattr__(self, attr):
+        module = self.load()
+        if module is None: raise AttributeError(f"模块 {self.module_name} 未安装，无法访问 {attr}")
+        return getattr(module, attr)
+
+np = LazyModule('numpy', 'np', globals())  # 仅向量化功能 (如 --variants) 需要 numpy；没有安装时为 None
+
+def numpy_module():
+    """返回 numpy 模块 (需要时才导入)，未安装时返回 None。"""
+    return np.load() if isinstance(np, LazyModule) else np
+
+# --- 常量定义 ---
+EARTH_RADIUS = 6371000
+HEIGHT_FLUCTUATION = 0.003
+SMOOTHING_FACTOR = 0.15
+DEFAULT_HEIGHT = 100.0
+TIME_STEP = 1.0  # 【修改】时间步长改为1.0秒
+KNOTS_PER_METER_PER_SECOND = 1.94384
+SPEED_MODES = {"1": (1.2, 1.5), "2": (2.8, 3.5), "3": (4.5, 5.5), "4": (12.0, 16.0)}
+DEFAULT_SPEED_MODE = "1"
+DEFAULT_MOTION_ENGINE = 'bearing-walk'  # --engine 默认后端，见 core.MOTION_ENGINES
+VARIANT_BATCH_SIZE = 256  # 批量变体模式每批同时计算的变体数，限制内存占用
+TRAJECTORY_COLUMNS = ('time', 'lat', 'lon', 'height', 'speed_knots', 'bearing')
+ENGINE_VERSION = "3.1"  # 生成模型有改动时必须修改，旧的缓存结果会随之失效
+DEFAULT_CACHE_DIR = ".traj_cache"
+DEFAULT_CACHE_SIZE_MB = 512
+DEFAULT_SERVE_PORT = 8765
+DEFAULT_CHUNK_SECONDS = 300.0  # --split 每块时长
+DEFAULT_SHM_CAPACITY = 1 << 16  # --shm 环形缓冲的默认容量 (条)
+OOC_CHUNK_POINTS = 1 << 16  # 分块 (外存) 处理每块的点数，见 readers
+DEFAULT_STREAM_BUFFER = 600  # 实时流输出时生成线程最多领先的点数
+
+def require_numpy(feature):
+    if numpy_module() is None: print(f"错误: {feature} 需要 numpy，请先执行 pip install numpy。"); sys.exit(1)
+
+# --- 分阶段性能统计 (--profile) ---
+class StageProfiler:
+    """
+    按流水线阶段 (读取路线点、坐标转换、生成、格式化、写入) 累计墙钟时间、调用次数和点数，
+    可选用 tracemalloc 记录每个阶段的内存分配、用 cProfile 记录函数级耗时。未启用时 stage() 几乎没有开销。
+    """
+    def __init__(self):
+        self.enabled, self.trace_memory, self.cprofile, self.stages, self.started = False, False, None, {}, None
+
+    def enable(self, trace_memory=False, use_cprofile=False):
+        self.enabled, self.trace_memory, self.started = True, trace_memory, time.perf_counter()
+        if trace_memory: import tracemalloc; tracemalloc.start()
+        if use_cprofile: import cProfile; self.cprofile = cProfile.Profile(); self.cprofile.enable()
+
+    @contextlib.contextmanager
+    def stage(self, name, points=0):
+        """统计一个阶段；点数事先未知时可在 with 块内设置 yield 出的字典的 'points'。阶段不可嵌套。"""
+        counter = {'points': points}
+        if not self.enabled: yield counter; return
+        import tracemalloc
+        if self.trace_memory: tracemalloc.reset_peak(); mem_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try: yield counter
+        finally:
+            record = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'points': 0})
+            record['seconds'] += time.perf_counter() - start; record['calls'] += 1; record['points'] += counter['points']
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['alloc_net_kb'] = record.get('alloc_net_kb', 0.0) + (current - mem_before) / 1024
+                record['alloc_peak_kb'] = max(record.get('alloc_peak_kb', 0.0), (peak - mem_before) / 1024)
+
+    def finish(self, report_path, cprofile_path=None):
+        if not self.enabled: return
+        if self.cprofile:
+            self.cprofile.disable()
+            if cprofile_path: self.cprofile.dump_stats(cprofile_path)
+        total = time.perf_counter() - self.started
+        for record in self.stages.values():
+            record['points_per_sec'] = record['points'] / record['seconds'] if record['points'] and record['seconds'] > 0 else None
+        report = {'total_seconds': total, 'stages': self.stages, 'cprofile': cprofile_path if self.cprofile else None}
+        if self.trace_memory: import tracemalloc; report['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] / 1024; tracemalloc.stop()
+        import json
+        with open(report_path, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"--- 性能统计 (总计 {total:.3f} 秒) ---")
+        for name, record in self.stages.items():
+            rate = f"{record['points_per_sec']:,.0f} 点/秒" if record['points_per_sec'] else ""
+            print(f"  {name:<10} {record['seconds']:8.3f} 秒 {record['calls']:6d} 次 {record['points']:9d} 点 {rate}")
+        print(f"性能报告已写入 '{report_path}'。")
+
+PROFILER = StageProfiler()
+
+def progress(message):
+    """逐段/逐批的进度信息；--profile 时命令行把 gps_trajectory.progress 调到 WARNING，避免打印本身影响计时。"""
+    PROGRESS_LOGGER.info(message)
+
+# --- 核心计算与坐标转换函数 ---
+def calculate_distance(lat1, lon1, lat2, lon2):
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None: return 0.0
+    if abs(lat1 - lat2) < 1e-9 and abs(lon1 - lon2) < 1e-9: return 0.0
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1; dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    a = max(0, min(a, 1.0)); c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+def calculate_bearing(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dLon = lon2 - lon1
+    if abs(dLon) < 1e-9 and abs(lat2 - lat1) < 1e-9: return 0.0
+    y = math.sin(dLon) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dLon)
+    bearing = math.atan2(y, x)
+    return (math.degrees(bearing) + 360) % 360
+
+# 【新增】辅助函数：根据起点、方位角和距离计算新点
+def calculate_new_point(lat, lon, bearing, distance):
+    """
+    根据起点、方位角(度)和距离(米)计算新的经纬度。
+    """
+    R = EARTH_RADIUS
+    d = distance
+    lat1_rad = math.radians(lat)
+    lon1_rad = math.radians(lon)
+    bearing_rad = math.radians(bearing)
+
+    lat2_rad = math.asin(math.sin(lat1_rad) * math.cos(d / R) +
+                         math.cos(lat1_rad) * math.sin(d / R) * math.cos(bearing_rad))
+    lon2_rad = lon1_rad + math.atan2(math.sin(bearing_rad) * math.sin(d / R) * math.cos(lat1_rad),
+                                      math.cos(d / R) - math.sin(lat1_rad) * math.sin(lat2_rad))
+
+    return math.degrees(lat2_rad), math.degrees(lon2_rad)
+
+# 【新增】数组版本：与上面的标量函数公式一致，可一次处理任意形状的 numpy 数组
+def calculate_bearing_array(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    dLon = lon2 - lon1
+    y = np.sin(dLon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dLon)
+    bearing = (np.degrees(np.arctan2(y, x)) + 360) % 360
+    return np.where((np.abs(dLon) < 1e-9) & (np.abs(lat2 - lat1) < 1e-9), 0.0, bearing)
+
+def calculate_new_point_array(lat, lon, bearing, distance):
+    lat1_rad, lon1_rad, bearing_rad = np.radians(lat), np.radians(lon), np.radians(bearing)
+    delta = np.asarray(distance) / EARTH_RADIUS
+    lat2_rad = np.arcsin(np.sin(lat1_rad) * np.cos(delta) + np.cos(lat1_rad) * np.sin(delta) * np.cos(bearing_rad))
+    lon2_rad = lon1_rad + np.arctan2(np.sin(bearing_rad) * np.sin(delta) * np.cos(lat1_rad),
+                                     np.cos(delta) - np.sin(lat1_rad) * np.sin(lat2_rad))
+    return np.degrees(lat2_rad), np.degrees(lon2_rad)
+
+def calculate_distance_array(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    a = np.clip(a, 0.0, 1.0)
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def ar1_filter(x, beta, state, block=256):
+    """
+    沿最后一维计算一阶递推 y[n] = beta * y[n-1] + x[n]，state 为 y[-1]。
+    beta 可以是标量，也可以是沿最后一维逐点给出的正数数组 (时间步不等时)。
+    每块内用闭式 y[n] = beta^n * (state + sum(x[k] / beta^k)) 求解 (逐点 beta 时 beta^n 换成累乘)，块间传递状态，避免逐点 Python 循环。
+    返回 (y, 最后状态)，最后状态可用于下一次分块调用。
+    """
+    x = np.asarray(x, dtype=float); state = np.asarray(state, dtype=float)
+    varying = np.ndim(beta) > 0; low = float(np.min(beta)) if varying and np.size(beta) else (1.0 if varying else beta)
+    if not varying and beta <= 0: return x.copy(), x[..., -1] if x.shape[-1] else state
+    if low < 1: block = max(1, min(block, int(-30.0 / math.log(low))))  # 防止 beta^-n 溢出
+    y = np.empty_like(x); n = x.shape[-1]
+    for start in range(0, n, block):
+        seg = x[..., start:start + block]
+        powers = np.cumprod(beta[start:start + seg.shape[-1]]) if varying else beta ** np.arange(1, seg.shape[-1] + 1)
+        y[..., start:start + seg.shape[-1]] = powers * (state[..., None] + np.cumsum(seg / powers, axis=-1))
+        state = y[..., start + seg.shape[-1] - 1]
+    return y, state
+
+
+# --- 坐标转换 (无变化) ---
+def out_of_china(lng, lat): return not (72.004 <= lng <= 137.8347 and 0.8293 <= lat <= 55.8271)
+def transform_lat_gcj(x, y):
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(y * math.pi) + 40.0 * math.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (160.0 * math.sin(y / 12.0 * math.pi) + 320 * math.sin(y * math.pi / 30.0)) * 2.0 / 3.0
+    return ret
+def transform_lng_gcj(x, y):
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(x * math.pi) + 40.0 * math.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (150.0 * math.sin(x / 12.0 * math.pi) + 300.0 * math.sin(x / 30.0 * math.pi)) * 2.0 / 3.0
+    return ret
+def gcj02_to_wgs84(gcj_lng, gcj_lat):
+    if out_of_china(gcj_lng, gcj_lat): return gcj_lng, gcj_lat
+    a = 6378245.0; ee = 0.00669342162296594323
+    dlat = transform_lat_gcj(gcj_lng - 105.0, gcj_lat - 35.0)
+    dlng = transform_lng_gcj(gcj_lng - 105.0, gcj_lat - 35.0)
+    radlat = gcj_lat / 180.0 * math.pi; magic = math.sin(radlat); magic = 1 - ee * magic * magic; sqrtmagic = math.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * math.pi)
+    dlng = (dlng * 180.0) / (a / sqrtmagic * math.cos(radlat) * math.pi)
+    return gcj_lng - dlng, gcj_lat - dlat
+def bd09_to_gcj02(bd_lng, bd_lat):
+    x_pi = 3.14159265358979324 * 3000.0 / 180.0; x = bd_lng - 0.0065; y = bd_lat - 0.006
+    z = math.sqrt(x * x + y * y) - 0.00002 * math.sin(y * x_pi)
+    theta = math.atan2(y, x) - 0.000003 * math.cos(x * x_pi)
+    return z * math.cos(theta), z * math.sin(theta)
+def bd09_to_wgs84(bd_lng, bd_lat):
+    gcj_lng, gcj_lat = bd09_to_gcj02(bd_lng, bd_lat)
+    return gcj02_to_wgs84(gcj_lng, gcj_lat)
+
+# 【新增】数组版本：运算顺序与上面的标量函数相同 (差别只在 np.sin 等与 math 的末位舍入)，境外的点原样返回
+def gcj02_to_wgs84_array(gcj_lng, gcj_lat):
+    lng, lat = np.asarray(gcj_lng, dtype=float), np.asarray(gcj_lat, dtype=float)
+    x, y = lng - 105.0, lat - 35.0
+    dlat = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.abs(x))
+    dlat += (20.0 * np.sin(6.0 * x * math.pi) + 20.0 * np.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    dlat += (20.0 * np.sin(y * math.pi) + 40.0 * np.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
+    dlat += (160.0 * np.sin(y / 12.0 * math.pi) + 320 * np.sin(y * math.pi / 30.0)) * 2.0 / 3.0
+    dlng = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.abs(x))
+    dlng += (20.0 * np.sin(6.0 * x * math.pi) + 20.0 * np.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    dlng += (20.0 * np.sin(x * math.pi) + 40.0 * np.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
+    dlng += (150.0 * np.sin(x / 12.0 * math.pi) + 300.0 * np.sin(x / 30.0 * math.pi)) * 2.0 / 3.0
+    a = 6378245.0; ee = 0.00669342162296594323
+    radlat = lat / 180.0 * math.pi; magic = np.sin(radlat); magic = 1 - ee * magic * magic; sqrtmagic = np.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * math.pi)
+    dlng = (dlng * 180.0) / (a / sqrtmagic * np.cos(radlat) * math.pi)
+    inside = (72.004 <= lng) & (lng <= 137.8347) & (0.8293 <= lat) & (lat <= 55.8271)
+    return np.where(inside, lng - dlng, lng), np.where(inside, lat - dlat, lat)
+def bd09_to_wgs84_array(bd_lng, bd_lat):
+    x_pi = 3.14159265358979324 * 3000.0 / 180.0
+    x, y = np.asarray(bd_lng, dtype=float) - 0.0065, np.asarray(bd_lat, dtype=float) - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * x_pi)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * x_pi)
+    return gcj02_to_wgs84_array(z * np.cos(theta), z * np.sin(theta))
@@ -0,0 +1,548 @@
+# -*- coding: utf-8 -*-
+"""
+轨迹生成核心：逐段生成 (generate_segment)、运动学速度规划、批量变体、运动模型后端注册表 (--engine)、结果缓存和整条路线生成。
+不包含命令行和文件输出，输出格式见 sinks，结果缓存见 cache。
+"""
+import math
+import random
+import time
+from datetime import datetime, timezone, timedelta
+
+from .common import (
+    DEFAULT_HEIGHT, DEFAULT_MOTION_ENGINE, DEFAULT_SPEED_MODE, EARTH_RADIUS, ENGINE_VERSION, HEIGHT_FLUCTUATION,
+    KNOTS_PER_METER_PER_SECOND, LOGGER, PROFILER, SMOOTHING_FACTOR, SPEED_MODES, TIME_STEP, TRAJECTORY_COLUMNS, LazyModule, ar1_filter,
+    calculate_bearing, calculate_bearing_array, calculate_distance, calculate_distance_array, calculate_new_point, calculate_new_point_array,
+)
+from .sinks import points_to_columns
+
+np = LazyModule('numpy', 'np', globals())
+numba = LazyModule('numba', 'numba', globals())  # 可选：--engine jit 用来编译逐步循环；没有安装时 jit 后端退回纯 Python 的 bearing-walk
+
+def numba_module():
+    return numba.load() if isinstance(numba, LazyModule) else numba
+
+
+# --- 轨迹生成模块 ---
+# 【重大修改】重写此函数以实现逐秒生成和速度平滑浮动
+def generate_segment(start_lat, start_lon, end_lat, end_lon, speed_range, current_time, current_height, previous_speed, utc_start_time, time_step=TIME_STEP, rand=random):
+    segment_points = []
+    
+    # 初始化当前状态
+    current_lat, current_lon = start_lat, start_lon
+    
+    # 初始化速度，如果上个路段有速度，就继承过来，否则在范围内随机取一个
+    current_speed_ms = previous_speed if previous_speed is not None else rand.uniform(*speed_range)
+    
+    # 只要离终点还远，就继续生成点
+    while True:
+        distance_to_end = calculate_distance(current_lat, current_lon, end_lat, end_lon)
+        
+        # 如果剩余距离小于1.5秒的路程，就直接生成最后一个点并结束
+        # 这样可以确保精确到达终点，并避免在终点附近抖动
+        if distance_to_end < current_speed_ms * time_step * 1.5:
+            if distance_to_end > 0.1: # 避免距离过近时还生成一个点
+                time_to_end = distance_to_end / current_speed_ms if current_speed_ms > 0.01 else 0
+                final_time = current_time + time_to_end
+                point_data = {
+                    'time': final_time, 'lat': end_lat, 'lon': end_lon, 'height': current_height,
+                    'utc_time': utc_start_time + timedelta(seconds=final_time),
+                    'speed_knots': current_speed_ms * KNOTS_PER_METER_PER_SECOND,
+                    'bearing': calculate_bearing(current_lat, current_lon, end_lat, end_lon)
+                }
+                segment_points.append(point_data)
+                current_time = final_time
+            break # 退出循环
+            
+        # 1. 速度平滑浮动逻辑
+        target_speed_in_range = rand.uniform(*speed_range)
+        current_speed_ms += SMOOTHING_FACTOR * (target_speed_in_range - current_speed_ms)
+        # 限制速度，防止超出范围太多
+        current_speed_ms = max(speed_range[0] * 0.8, min(current_speed_ms, speed_range[1] * 1.2))
+        
+        # 2. 计算这一步要走的距离
+        distance_this_step = current_speed_ms * time_step
+        
+        # 3. 计算前进方向
+        bearing_to_end = calculate_bearing(current_lat, current_lon, end_lat, end_lon)
+        
+        # 4. 计算新坐标
+        next_lat, next_lon = calculate_new_point(current_lat, current_lon, bearing_to_end, distance_this_step)
+
+        # 5. 更新时间和高度
+        current_time += time_step
+        current_height += rand.uniform(-HEIGHT_FLUCTUATION, HEIGHT_FLUCTUATION) * 10
+        
+        # 6. 存储数据点
+        point_data = {
+            'time': current_time, 'lat': next_lat, 'lon': next_lon, 'height': current_height,
+            'utc_time': utc_start_time + timedelta(seconds=current_time),
+            'speed_knots': current_speed_ms * KNOTS_PER_METER_PER_SECOND,
+            'bearing': bearing_to_end
+        }
+        segment_points.append(point_data)
+        
+        # 7. 更新当前位置，为下一步做准备
+        current_lat, current_lon = next_lat, next_lon
+
+    # 返回生成的所有点，以及路段结束时的最终状态
+    return segment_points, end_lat, end_lon, current_time, current_height, current_speed_ms
+
+
+def resolve_speed_ranges(waypoints, custom_speed_range):
+    """按 -gg 的规则给每一段 (waypoints[i] -> waypoints[i+1]) 确定速度范围：终点无模式时沿用上一个有效模式。"""
+    ranges, last_valid_mode = [], DEFAULT_SPEED_MODE
+    for end_wp in waypoints[1:]:
+        if custom_speed_range: ranges.append(custom_speed_range); continue
+        if end_wp.get('mode'): last_valid_mode = end_wp['mode']
+        ranges.append(SPEED_MODES.get(last_valid_mode, SPEED_MODES[DEFAULT_SPEED_MODE]))
+    return ranges
+
+
+# --- 运动学速度规划 (--dynamics) ---
+# 先把整条路线按 DYNAMICS_STEP_M 米加密成折线，在每个转折点按转角求过弯限速 (v = sqrt(横向加速度 * 半径))；
+# 再用两次 O(N) 的整列扫描求加速度/减速度受限的速度曲线：v² 的前向约束 v²[i] <= v²[j] + 2a(s[i]-s[j])
+# 等价于 A[i] + min_{j<=i}(限速²[j] - A[j])，用 np.minimum.accumulate 一次算完，后向同理。
+# 最后在时间域上用宽度 τ = (a+d)/j 的滑动平均限制加加速度 (平均不改变总路程，也不会让加/减速度超过限制)。
+DYNAMICS_STEP_M = 1.0
+DYNAMICS_LIMITS = {  # 模式: (加速度, 减速度, 加加速度, 横向加速度, 拐角切线长度 m)
+    "1": (0.5, 0.8, 1.0, 1.0, 1.0), "2": (1.0, 1.5, 2.0, 1.5, 2.0),
+    "3": (1.5, 2.0, 3.0, 2.0, 2.5), "4": (2.0, 3.0, 1.5, 2.5, 8.0)}
+
+def nearest_speed_mode(speed):
+    """速度范围中点最接近 speed (m/s) 的运动模式。"""
+    return min(SPEED_MODES, key=lambda mode: abs(sum(SPEED_MODES[mode]) / 2 - speed))
+
+def dynamics_limits_for(speed_range):
+    """按速度范围中点选最接近的运动模式的动力学参数 (-s 自定义速度时也适用)。"""
+    return DYNAMICS_LIMITS[nearest_speed_mode(sum(speed_range) / 2)]
+
+def route_polyline(waypoints, step=DYNAMICS_STEP_M):
+    """把路线点加密为约 step 米一点的折线，返回 (累计里程, 纬度, 经度, 每点所在路段号)，整条路线一次算完。"""
+    lat, lon = np.array([wp['lat'] for wp in waypoints]), np.array([wp['lon'] for wp in waypoints])
+    lengths = calculate_distance_array(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    bearings = calculate_bearing_array(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    counts = np.maximum(1, np.ceil(lengths / step).astype(np.int64))
+    leg = np.repeat(np.arange(len(lengths)), counts)
+    offset = (np.arange(len(leg)) - np.repeat(np.cumsum(counts) - counts, counts)) * (lengths / counts)[leg]
+    dense_lat, dense_lon = calculate_new_point_array(lat[leg], lon[leg], bearings[leg], offset)
+    starts = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+    return (np.append(starts[leg] + offset, lengths.sum()), np.append(dense_lat, lat[-1]), np.append(dense_lon, lon[-1]),
+            np.append(leg, len(lengths) - 1))
+
+def route_fillet_path(waypoints, tangent, step=DYNAMICS_STEP_M, max_turn_deg=5.0):
+    """
+    --smooth-corners：每个中间路线点用与前后两段相切的圆弧替换 (切线长 tangent[i-1]，不超过相邻段长的一半)。
+    在以路线起点为原点的局部平面 (米) 里一次构造所有直线段和圆弧，直线按 step 米、圆弧按不超过 max_turn_deg 度的转角采样，
+    返回 (弧长累计里程, 纬度, 经度, 路段号, 曲率 1/m, 航向 度 (已展开，可直接插值))；之后按里程取点只需 searchsorted/插值。
+    """
+    lat, lon = np.array([wp['lat'] for wp in waypoints]), np.array([wp['lon'] for wp in waypoints])
+    scale = np.array([EARTH_RADIUS * np.cos(np.radians(lat[0])), EARTH_RADIUS])
+    points = np.radians(np.column_stack((lon - lon[0], lat - lat[0]))) * scale
+    delta = np.diff(points, axis=0); lengths = np.hypot(*delta.T); unit = delta / np.maximum(lengths, 1e-12)[:, None]
+    k = len(lengths); u_in, u_out = unit[:-1], unit[1:]
+    cross = u_in[:, 0] * u_out[:, 1] - u_in[:, 1] * u_out[:, 0]
+    theta = np.arctan2(np.abs(cross), np.einsum('ij,ij->i', u_in, u_out))
+    trim = np.where(theta > 1e-6, np.minimum(tangent, 0.5 * np.minimum(lengths[:-1], lengths[1:])), 0.0)
+    radius = trim / np.tan(np.clip(theta, 1e-6, np.pi - 1e-9) / 2)
+    sign = np.where(cross >= 0, 1.0, -1.0)  # 左转为正
+    arc_begin = points[1:-1] - u_in * trim[:, None]
+    center = arc_begin + (sign * radius)[:, None] * np.column_stack((-u_in[:, 1], u_in[:, 0]))
+    start_angle = np.arctan2(arc_begin[:, 1] - center[:, 1], arc_begin[:, 0] - center[:, 0])
+    # 图元交替排列：直线 0, 圆弧 1, 直线 1, ..., 直线 K-1；圆弧数组末尾补一个空圆弧，省去 K=1 的特殊处理
+    pad = lambda a: np.concatenate((a, np.zeros((1,) + a.shape[1:])))
+    theta, radius, sign, center, start_angle = pad(theta * (trim > 0)), pad(radius), pad(sign), pad(center), pad(start_angle)
+    trim_start, trim_end = np.concatenate(([0.0], trim)), np.concatenate((trim, [0.0]))
+    line_start = points[:-1] + unit * trim_start[:, None]; line_length = np.maximum(lengths - trim_start - trim_end, 0.0)
+    order = np.repeat(np.arange(k), 2)[:-1]; is_arc = np.arange(2 * k - 1) % 2 == 1
+    prim_length = np.where(is_arc, radius[order] * theta[order], line_length[order])
+    counts = np.where(is_arc, np.ceil(theta[order] / np.radians(max_turn_deg)), 0) + np.ceil(prim_length / step)
+    counts = np.where(prim_length > 0, np.maximum(counts, 1), 0).astype(np.int64)
+    prim = np.repeat(np.arange(len(order)), counts)
+    frac = (np.arange(len(prim)) - np.repeat(np.cumsum(counts) - counts, counts)) / counts[prim]
+    idx, arc = order[prim], is_arc[prim]
+    angle = start_angle[idx] + sign[idx] * theta[idx] * frac
+    xy = np.where(arc[:, None], center[idx] + radius[idx, None] * np.column_stack((np.cos(angle), np.sin(angle))),
+                  line_start[idx] + unit[idx] * (line_length[idx] * frac)[:, None])
+    # 航向 (正北顺时针)：直线取方向，圆弧取切向
+    heading = np.where(arc, np.arctan2(-sign[idx] * np.sin(angle), sign[idx] * np.cos(angle)), np.arctan2(unit[idx, 0], unit[idx, 1]))
+    heading = np.degrees(np.unwrap(np.append(heading, np.arctan2(unit[-1, 0], unit[-1, 1]))))
+    s = np.append((np.cumsum(prim_length) - prim_length)[prim] + frac * prim_length[prim], prim_length.sum())
+    curvature = np.append(np.where(arc, 1.0 / np.maximum(radius[idx], 1e-9), 0.0), 0.0)
+    leg = np.append(np.where(arc, idx + 1, idx), k - 1)
+    dense_lon, dense_lat = (np.degrees(np.vstack((xy, points[-1:])) / scale) + [lon[0], lat[0]]).T
+    return s, dense_lat, dense_lon, leg, curvature, heading
+
+def corner_speed_limits(bearing_in, bearing_out, tangent, lateral_accel):
+    """转角 θ 处按切线长 L 的圆弧过弯：半径 R = L / tan(θ/2)，限速 sqrt(横向加速度 * R)；直行时不限速。"""
+    theta = np.radians(np.abs((np.asarray(bearing_out) - bearing_in + 180.0) % 360.0 - 180.0))
+    with np.errstate(divide='ignore'):
+        radius = np.where(theta > 1e-6, tangent / np.tan(np.minimum(theta, np.pi - 1e-9) / 2), np.inf)
+    return np.sqrt(lateral_accel * radius)
+
+def plan_speed_profile(s, v_limit, accel, decel):
+    """加/减速度受限的最快速度曲线 (前向 + 后向两次整列扫描)。accel/decel 为每个区间 (长度 N-1) 的限制。"""
+    u_limit, ds = np.square(v_limit), np.diff(s)
+    A = np.concatenate(([0.0], np.cumsum(2 * accel * ds)))
+    D = np.concatenate(([0.0], np.cumsum(2 * decel * ds)))
+    forward = A + np.minimum.accumulate(u_limit - A)
+    backward = np.minimum.accumulate((u_limit + D)[::-1])[::-1] - D
+    return np.sqrt(np.maximum(np.minimum(forward, backward), 0.0))
+
+def jerk_limit_profile(s, v, tau, dt):
+    """把 v(s) 换到时间域 (步长 dt)，用宽度 tau 的滑动平均限制加加速度，两端各补 tau 的零速度；返回 (时间, 里程, 速度)。"""
+    interval = 2 * np.diff(s) / np.maximum(v[1:] + v[:-1], 1e-6)
+    t = np.concatenate(([0.0], np.cumsum(interval)))
+    grid = np.arange(0.0, t[-1] + dt, dt); vg = np.interp(grid, t, v)
+    pad = max(0, int(round(tau / 2 / dt))); width = 2 * pad + 1
+    padded = np.concatenate((np.zeros(2 * pad), vg, np.zeros(2 * pad)))
+    csum = np.concatenate(([0.0], np.cumsum(padded)))
+    vf = (csum[width:] - csum[:-width]) / width
+    sf = np.concatenate(([0.0], np.cumsum((vf[1:] + vf[:-1]) / 2 * dt)))
+    if sf[-1] > 0: sf *= s[-1] / sf[-1]  # 消除数值积分误差，保证正好到达终点
+    return np.arange(len(vf)) * dt, sf, vf
+
+def plan_route_dynamics(waypoints, speed_ranges, time_step=TIME_STEP, start_time=0.0, start_height=DEFAULT_HEIGHT, rng=None, smooth=False, rand=random):
+    """
+    运动学规划整条路线：每段巡航速度在速度范围内随机取 (从 rand 取，默认 random 模块，受 --seed 控制)，起终点静止，
+    转折点按转角减速，加速度/加加速度受限。smooth 为 True 时拐角换成圆弧，圆弧上按曲率限速，航向沿曲线连续变化。
+    返回不含起点的点列数组字典 (时间从 start_time + time_step 起)。
+    """
+    limits = np.array([dynamics_limits_for(r) for r in speed_ranges])  # 每段一行
+    accel, decel, jerk, lateral, tangent = limits.T
+    tau = float(np.max((accel + decel) / jerk))
+    if smooth: s, lat, lon, leg, curvature, heading = route_fillet_path(waypoints, tangent[1:])
+    else: s, lat, lon, leg = route_polyline(waypoints)
+    cruise = np.array([rand.uniform(*r) for r in speed_ranges])
+    v_limit = cruise[leg].copy(); v_limit[0] = v_limit[-1] = 0.0
+    if smooth:
+        with np.errstate(divide='ignore'): curve_limit = np.sqrt(lateral[leg] / curvature)
+        # 与折线同样预扣平滑抬高量；圆弧上是连续一段限速，不能降到 0 (否则整段耗时无穷)，至少保留 0.1 m/s 的蠕行速度
+        v_limit = np.minimum(v_limit, np.maximum(curve_limit - (accel[leg] + decel[leg]) * tau / 8, 0.1))
+    elif len(waypoints) > 2:
+        wlat, wlon = np.array([wp['lat'] for wp in waypoints]), np.array([wp['lon'] for wp in waypoints])
+        bearings = calculate_bearing_array(wlat[:-1], wlon[:-1], wlat[1:], wlon[1:])
+        lengths = calculate_distance_array(wlat[:-1], wlon[:-1], wlat[1:], wlon[1:])
+        vertex = np.searchsorted(leg, np.arange(1, len(lengths)))  # 每个中间路线点在折线上的下标
+        corner = corner_speed_limits(bearings[:-1], bearings[1:], np.minimum(tangent[1:], 0.5 * np.minimum(lengths[:-1], lengths[1:])), lateral[1:])
+        # 滑动平均会把 V 形低谷抬高至多 (a+d)·τ/8，预先扣掉，保证平滑后仍不超过过弯限速
+        v_limit[vertex] = np.minimum(v_limit[vertex], np.maximum(corner - (accel[1:] + decel[:-1]) * tau / 8, 0.0))
+    v = plan_speed_profile(s, v_limit, accel[leg[:-1]], decel[leg[:-1]])
+    t, sf, vf = jerk_limit_profile(s, v, tau, min(time_step, tau / 20, 0.05))
+    times = np.arange(time_step, t[-1], time_step)
+    if not len(times) or t[-1] - times[-1] > 1e-6: times = np.append(times, t[-1])
+    distance = np.interp(times, t, sf)
+    out_lat, out_lon = np.interp(distance, s, lat), np.interp(distance, s, lon)
+    if smooth: bearing = np.interp(distance, s, heading) % 360.0  # 曲线切向，沿圆弧连续变化
+    else:
+        out_leg = leg[np.minimum(np.searchsorted(s, distance, side='right') - 1, len(leg) - 1)]
+        end_lat, end_lon = np.array([wp['lat'] for wp in waypoints[1:]]), np.array([wp['lon'] for wp in waypoints[1:]])
+        bearing = calculate_bearing_array(out_lat, out_lon, end_lat[out_leg], end_lon[out_leg])
+    rng = rng if rng is not None else np.random.default_rng(rand.getrandbits(32))
+    height = start_height + np.cumsum(rng.uniform(-HEIGHT_FLUCTUATION, HEIGHT_FLUCTUATION, len(times)) * 10)
+    return {'time': start_time + times, 'lat': out_lat, 'lon': out_lon, 'height': height,
+            'speed_knots': np.interp(times, t, vf) * KNOTS_PER_METER_PER_SECOND, 'bearing': bearing}
+
+
+# --- 批量变体生成模块 (Monte Carlo) ---
+# 与 generate_segment 的模型相同 (朝终点的方位角步进 + 速度平滑浮动)，但 K 个变体共享路段几何，
+# 整段以 (变体 x 时间) 二维数组一次算完。沿大圆朝终点步进时位置只取决于累计距离，
+# 因此每步的位置可以由累计距离直接求出，速度的平滑递推用 ar1_filter 分块求解。
+def generate_variant_segment(start_lat, start_lon, end_lat, end_lon, speed_range, current_time, current_height, previous_speed, rngs, time_step=TIME_STEP):
+    """
+    current_time / current_height / previous_speed 为长度 K 的数组 (previous_speed 可为 None)，rngs 为每个变体的随机数发生器。
+    返回 (按变体顺序展平的点列数组字典, 每个变体的点数, 新时间, 新高度, 新速度)。
+    """
+    lo, hi = speed_range; k = len(rngs); rows = np.arange(k)
+    distance = calculate_distance(start_lat, start_lon, end_lat, end_lon)
+    bearing0 = calculate_bearing(start_lat, start_lon, end_lat, end_lon)
+    # 第一步之后速度不低于 lo*0.8，所以 n_max 步一定能走完全程
+    n_max = int(math.ceil(distance / (lo * 0.8 * time_step))) + 1
+    speeds0 = np.asarray(previous_speed, dtype=float) if previous_speed is not None else np.array([r.uniform(lo, hi) for r in rngs])
+    targets = np.stack([r.uniform(lo, hi, n_max) for r in rngs])
+    jitter = np.stack([r.uniform(-HEIGHT_FLUCTUATION, HEIGHT_FLUCTUATION, n_max) for r in rngs]) * 10
+
+    # 1. 速度：第一步可能因换挡被限幅，之后是 [lo, hi] 内的凸组合，不会再触发限幅
+    speeds = np.empty((k, n_max + 1)); speeds[:, 0] = speeds0
+    speeds[:, 1] = np.clip(speeds0 + SMOOTHING_FACTOR * (targets[:, 0] - speeds0), lo * 0.8, hi * 1.2)
+    if n_max > 1: speeds[:, 2:], _ = ar1_filter(SMOOTHING_FACTOR * targets[:, 1:], 1 - SMOOTHING_FACTOR, speeds[:, 1])
+    travelled = np.zeros((k, n_max + 1)); np.cumsum(speeds[:, 1:] * time_step, axis=1, out=travelled[:, 1:])
+
+    # 2. 与标量版本相同的终止条件：剩余距离小于 1.5 步
+    remaining = distance - travelled
+    steps = np.argmax(remaining < speeds * time_step * 1.5, axis=1)
+    rem_end, speed_end = remaining[rows, steps], speeds[rows, steps]
+    has_final = rem_end > 0.1
+
+    # 3. 各步位置、方位角 (上一个点指向终点)、高度和时间
+    lat = np.empty((k, n_max + 1)); lon = np.empty((k, n_max + 1))
+    lat[:, 0], lon[:, 0] = start_lat, start_lon
+    lat[:, 1:], lon[:, 1:] = calculate_new_point_array(start_lat, start_lon, bearing0, travelled[:, 1:])
+    bearing = calculate_bearing_array(lat, lon, end_lat, end_lon)
+    height = np.empty((k, n_max + 1)); height[:, 0] = current_height
+    np.cumsum(jitter, axis=1, out=height[:, 1:]); height[:, 1:] += np.asarray(current_height, dtype=float)[:, None]
+    times = np.asarray(current_time, dtype=float)[:, None] + time_step * np.arange(n_max + 1)
+
+    # 4. 组装：第 j 列为第 j+1 步，最后一个点 (精确到达终点) 放在第 steps 列
+    end_height, end_time = height[rows, steps], times[rows, steps]
+    final_time = end_time + np.where(speed_end > 0.01, rem_end / np.maximum(speed_end, 0.01), 0.0)
+    out = {'time': times[:, 1:], 'lat': lat[:, 1:], 'lon': lon[:, 1:], 'height': height[:, 1:],
+           'speed_knots': speeds[:, 1:] * KNOTS_PER_METER_PER_SECOND, 'bearing': bearing[:, :-1]}
+    out = {key: np.concatenate([col, np.zeros((k, 1))], axis=1) for key, col in out.items()}
+    for key, value in (('time', final_time), ('lat', end_lat), ('lon', end_lon), ('height', end_height),
+                       ('speed_knots', speed_end * KNOTS_PER_METER_PER_SECOND), ('bearing', bearing[rows, steps])):
+        out[key][rows, steps] = value
+    counts = steps + has_final
+    valid = np.arange(n_max + 1) < counts[:, None]
+    new_time = np.where(has_final, final_time, end_time)
+    return {key: col[valid] for key, col in out.items()}, counts, new_time, end_height, speed_end
+
+
+def generate_route_variants(waypoints, speed_ranges, seeds, start_time=0.0, start_height=DEFAULT_HEIGHT, time_step=TIME_STEP):
+    """对每个种子生成一条完整路线，返回每个变体的点列数组字典 (不含起点)。"""
+    rngs = [np.random.default_rng(seed) for seed in seeds]; k = len(rngs)
+    current_time, current_height, previous_speed = np.full(k, float(start_time)), np.full(k, float(start_height)), None
+    pieces = []
+    for (start_wp, end_wp), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+        flat, counts, current_time, current_height, previous_speed = generate_variant_segment(
+            start_wp['lat'], start_wp['lon'], end_wp['lat'], end_wp['lon'], speed_range,
+            current_time, current_height, previous_speed, rngs, time_step)
+        pieces.append((flat, np.concatenate(([0], np.cumsum(counts)))))
+    return [{key: np.concatenate([flat[key][off[i]:off[i + 1]] for flat, off in pieces]) if pieces else np.empty(0) for key in TRAJECTORY_COLUMNS}
+            for i in range(k)]
+
+
+# --- 运动模型后端 (--engine) ---
+# 每个后端把整条路线 (路线点 + 每段速度范围) 变成不含起点的轨迹，逐段 (routed 为整条) 产出一块：
+#   linear        2.0/3.0 的直线插值：每段取一个平滑后的平均速度，经纬度等分，逐点高度浮动
+#   bearing-walk  3.1 默认模型：每步朝终点方位角前进，速度平滑浮动 (generate_segment，不需要 numpy)
+#   vectorized    与 bearing-walk 相同的模型，每段用数组一次算完；随机数来自 numpy，同一种子的结果与 bearing-walk 不同
+#   jit           与 bearing-walk 相同的模型和随机数，逐步循环由 numba 编译 (可选依赖，没有时就是 bearing-walk)
+#   routed        整条路线的运动学规划：起终点静止、转弯减速、加速度/加加速度受限 (即 --dynamics，smooth 对应 --smooth-corners)
+# 产出的块是点字典列表 (bearing-walk) 或点列数组字典，写出时分别交给 write_segment_points / write_route_columns。
+# 使用 random 模块的后端从 rand 取随机数：默认即 random 模块 (命令行由调用方 random.seed)，generate_route 传入独立的 random.Random(seed)，
+# 不改动调用方进程的全局随机数状态；vectorized 用 seed 建立自己的 numpy 随机数发生器。
+MOTION_ENGINES = {}
+
+def register_motion_engine(name, description, requires_numpy=True, prepare=None):
+    """
+    登记运动模型后端。被装饰的函数签名为 (waypoints, speed_ranges, time_step, start_time, start_height, seed, smooth, rand=random)；
+    prepare 为可选的无参函数 (如 JIT 编译)，在计时开始前调用，不计入报告的 点/秒。
+    """
+    def register(run):
+        MOTION_ENGINES[name] = {'run': run, 'description': description, 'numpy': requires_numpy, 'prepare': prepare}
+        return run
+    return register
+
+def motion_engine_tag(name, smooth=False):
+    """缓存键里的引擎标记；bearing-walk 和 routed 沿用原来的标记，已有缓存不会失效。"""
+    if name == DEFAULT_MOTION_ENGINE: return ENGINE_VERSION
+    if name == 'routed': return f"{ENGINE_VERSION}-dynamics{'-smooth' if smooth else ''}"
+    return f"{ENGINE_VERSION}-{name}"
+
+def motion_chunk_length(chunk):
+    return 0 if chunk is None else len(chunk) if isinstance(chunk, list) else len(chunk['time'])
+
+def motion_chunks_to_columns(chunks):
+    """把运动引擎产出的各块拼成一个点列数组字典。"""
+    cols = [points_to_columns(c) if isinstance(c, list) else c for c in chunks]
+    return {key: np.concatenate([c[key] for c in cols]) if cols else np.zeros(0) for key in TRAJECTORY_COLUMNS}
+
+def measured_motion_chunks(chunks, meter):
+    """逐块拉取引擎输出：拉取过程计入 'generate' 阶段，耗时和点数累加到 meter ({'seconds', 'points'})，用于报告点/秒。"""
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        with PROFILER.stage('generate') as st:
+            chunk = next(chunks, None); st['points'] = motion_chunk_length(chunk)
+        meter['seconds'] += time.perf_counter() - started; meter['points'] += st['points']
+        if chunk is None: return
+        yield chunk
+
+def generate_linear_segment(start_lat, start_lon, end_lat, end_lon, speed_range, current_time, current_height, previous_speed, time_step=TIME_STEP, rand=random):
+    """
+    3.0 版直线插值模型的数组实现。随机数的消耗顺序与 3.0.py 的 generate_segment 相同，位置和时间按同样的顺序逐步累加
+    (np.cumsum 与逐步 += 的舍入一致)，同一种子下时间、位置、高度和速度与 3.0 逐位相同，方位角只差舍入误差。返回 (点列数组字典或 None, 新时间, 新高度, 本段平均速度)。
+    """
+    distance = calculate_distance(start_lat, start_lon, end_lat, end_lon)
+    if distance < 0.01: return None, current_time, current_height, previous_speed
+    target = rand.uniform(*speed_range)
+    speed = target if previous_speed is None else previous_speed + SMOOTHING_FACTOR * (target - previous_speed)
+    speed = max(max(speed_range[0] * 0.8, min(speed, speed_range[1] * 1.2)), 0.05)
+    total = distance / speed; n = max(1, int(round(total / time_step))); dt = total / n
+    lat = np.cumsum(np.concatenate(([start_lat], np.full(n, (end_lat - start_lat) / n))))
+    lon = np.cumsum(np.concatenate(([start_lon], np.full(n, (end_lon - start_lon) / n))))
+    lat[-1], lon[-1] = end_lat, end_lon
+    times = np.cumsum(np.concatenate(([current_time], np.full(n, dt))))[1:]
+    heights = np.cumsum([current_height] + [rand.uniform(-HEIGHT_FLUCTUATION, HEIGHT_FLUCTUATION) * 10 for _ in range(n)])[1:]
+    step = calculate_distance_array(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    cols = {'time': times, 'lat': lat[1:], 'lon': lon[1:], 'height': heights, 'speed_knots': step / dt * KNOTS_PER_METER_PER_SECOND,
+            'bearing': calculate_bearing_array(lat[:-1], lon[:-1], lat[1:], lon[1:])}
+    return cols, float(times[-1]), float(heights[-1]), speed
+
+@register_motion_engine('linear', "2.0/3.0 直线插值，每段一个平均速度")
+def linear_motion_engine(waypoints, speed_ranges, time_step, start_time, start_height, seed=None, smooth=False, rand=random):
+    current_time, current_height, previous_speed = start_time, start_height, None
+    for (start_wp, end_wp), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+        cols, current_time, current_height, previous_speed = generate_linear_segment(
+            start_wp['lat'], start_wp['lon'], end_wp['lat'], end_wp['lon'], speed_range, current_time, current_height, previous_speed, time_step, rand)
+        if cols is not None: yield cols
+
+@register_motion_engine('bearing-walk', "3.1 默认：逐步朝终点方位角前进，速度平滑浮动", requires_numpy=False)
+def bearing_walk_motion_engine(waypoints, speed_ranges, time_step, start_time, start_height, seed=None, smooth=False, rand=random):
+    current_time, current_height, previous_speed = start_time, start_height, None
+    utc_start_time = datetime.now(timezone.utc) - timedelta(seconds=start_time)  # 只用于点字典里的 utc_time 字段
+    for (start_wp, end_wp), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+        segment_points, _, _, current_time, current_height, previous_speed = generate_segment(
+            start_wp['lat'], start_wp['lon'], end_wp['lat'], end_wp['lon'], speed_range,
+            current_time, current_height, previous_speed, utc_start_time, time_step, rand)
+        if segment_points: yield segment_points
+
+@register_motion_engine('vectorized', "与 bearing-walk 同一模型，每段整列计算 (numpy 随机数)")
+def vectorized_motion_engine(waypoints, speed_ranges, time_step, start_time, start_height, seed=None, smooth=False, rand=random):
+    rngs = [np.random.default_rng(seed)]
+    current_time, current_height, previous_speed = np.array([float(start_time)]), np.array([float(start_height)]), None
+    for (start_wp, end_wp), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+        cols, counts, current_time, current_height, previous_speed = generate_variant_segment(
+            start_wp['lat'], start_wp['lon'], end_wp['lat'], end_wp['lon'], speed_range, current_time, current_height, previous_speed, rngs, time_step)
+        if counts[0]: yield cols
+
+# --- 可选 JIT 内核 (--engine jit) ---
+# bearing-walk 每一步的方位角取决于上一步的位置，速度每步限幅，到达判断也逐步进行，整段向量化只能近似 (vectorized 用了
+# "每步方位角不变" 的等价改写)。jit 后端把 generate_segment 的循环原样写成只用 math 和数组下标的内核，装了 numba 时编译成
+# 本地代码；随机数仍由 random 模块按 generate_segment 的顺序 (每步先目标速度、后高度抖动) 取出后分块传入，同一种子与
+# bearing-walk 的轨迹相同 (只差 libm 的末位舍入)。没有 numba 时 jit 后端直接运行 bearing-walk，输出不变。
+JIT_DRAW_BLOCK = 1 << 14  # 每次传给内核的最多步数 (每步两个随机数)
+JIT_KERNELS = {}
+DEG_TO_RAD, RAD_TO_DEG = math.pi / 180.0, 180.0 / math.pi  # 与 math.radians / math.degrees 的乘数相同
+
+def bearing_walk_kernel(draws, lo, hi, lat, lon, end_lat, end_lon, speed, t, h, time_step, out):
+    """
+    从状态 (lat, lon, speed, t, h) 起执行 generate_segment 的循环，draws[i] 为第 i 步的两个 random.random() 值，点按
+    TRAJECTORY_COLUMNS 的顺序写入 out 的各行。返回 (点数, 用掉的步数, 是否已到终点, lat, lon, speed, t, h)；
+    draws 用完还没到终点时由调用方接着传下一块。
+    """
+    # 与标量函数逐项相同的运算；同一个角的 sin/cos 只算一次 (终点纬度的在循环外)，结果逐位不变
+    n, lat2 = 0, end_lat * DEG_TO_RAD
+    sin_lat2, cos_lat2 = math.sin(lat2), math.cos(lat2)
+    for step in range(draws.shape[0] + 1):
+        lat1, lon1 = lat * DEG_TO_RAD, lon * DEG_TO_RAD
+        sin_lat1, cos_lat1 = math.sin(lat1), math.cos(lat1)
+        dlon = end_lon * DEG_TO_RAD - lon1
+        # 到终点的距离 (calculate_distance)
+        if abs(lat - end_lat) < 1e-9 and abs(lon - end_lon) < 1e-9: remaining = 0.0
+        else:
+            a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos_lat2 * math.sin(dlon / 2) ** 2
+            a = max(0.0, min(a, 1.0)); remaining = EARTH_RADIUS * (2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
+        # 朝终点的方位角 (calculate_bearing)
+        if abs(dlon) < 1e-9 and abs(lat2 - lat1) < 1e-9: bearing = 0.0
+        else:
+            y = math.sin(dlon) * cos_lat2; x = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * math.cos(dlon)
+            bearing = (math.atan2(y, x) * RAD_TO_DEG + 360) % 360
+        if remaining < speed * time_step * 1.5:
+            if remaining > 0.1:
+                t = t + (remaining / speed if speed > 0.01 else 0.0)
+                out[0, n], out[1, n], out[2, n], out[3, n] = t, end_lat, end_lon, h
+                out[4, n], out[5, n] = speed * KNOTS_PER_METER_PER_SECOND, bearing; n += 1
+            return n, step, True, lat, lon, speed, t, h
+        if step == draws.shape[0]: return n, step, False, lat, lon, speed, t, h
+        speed += SMOOTHING_FACTOR * ((lo + (hi - lo) * draws[step, 0]) - speed)
+        speed = max(lo * 0.8, min(speed, hi * 1.2))
+        # 前进一步 (calculate_new_point)
+        delta, bearing_rad = speed * time_step / EARTH_RADIUS, bearing * DEG_TO_RAD
+        sin_delta, cos_delta = math.sin(delta), math.cos(delta)
+        lat_next = math.asin(sin_lat1 * cos_delta + cos_lat1 * sin_delta * math.cos(bearing_rad))
+        lon_next = lon1 + math.atan2(math.sin(bearing_rad) * sin_delta * cos_lat1, cos_delta - sin_lat1 * math.sin(lat_next))
+        lat, lon = lat_next * RAD_TO_DEG, lon_next * RAD_TO_DEG
+        t += time_step
+        h += (-HEIGHT_FLUCTUATION + (HEIGHT_FLUCTUATION + HEIGHT_FLUCTUATION) * draws[step, 1]) * 10
+        out[0, n], out[1, n], out[2, n], out[3, n], out[4, n], out[5, n] = t, lat, lon, h, speed * KNOTS_PER_METER_PER_SECOND, bearing; n += 1
+    return n, draws.shape[0], False, lat, lon, speed, t, h
+
+def bearing_walk_jit():
+    """返回 numba 编译的 bearing_walk_kernel (首次调用时编译或从 __pycache__ 载入，并空跑一步)；numba 未安装时返回 None。"""
+    if 'walk' not in JIT_KERNELS:
+        module, kernel = numba_module(), None
+        if module is not None:
+            kernel = module.njit(cache=True, nogil=True)(bearing_walk_kernel)
+            kernel(np.zeros((1, 2)), 1.0, 2.0, 0.0, 0.0, 0.0, 0.001, 1.0, 0.0, 0.0, 1.0, np.empty((len(TRAJECTORY_COLUMNS), 2)))
+        else: LOGGER.info("numba 未安装，--engine jit 使用 bearing-walk 的纯 Python 循环。")
+        JIT_KERNELS['walk'] = kernel
+    return JIT_KERNELS['walk']
+
+def generate_segment_jit(kernel, start_lat, start_lon, end_lat, end_lon, speed_range, current_time, current_height, previous_speed, time_step=TIME_STEP, rand=random):
+    """
+    用 kernel 走完一段，返回 (点列数组字典或 None, 新时间, 新高度, 新速度)。每块先记下 rand 的状态再取随机数，
+    到终点时回到该状态并只重新取内核用掉的个数，rand 之后的序列与 generate_segment 完全一致。
+    """
+    lo, hi = float(speed_range[0]), float(speed_range[1])
+    speed = previous_speed if previous_speed is not None else rand.uniform(*speed_range)
+    lat, lon, t, h, draw, pieces = start_lat, start_lon, current_time, current_height, rand.random, []
+    while True:
+        # 按平均速度估计剩余步数，短路段不多取随机数
+        block = min(JIT_DRAW_BLOCK, int(calculate_distance(lat, lon, end_lat, end_lon) / (0.5 * (lo + hi) * time_step)) + 16)
+        state = rand.getstate()
+        draws = np.array([draw() for _ in range(2 * block)]).reshape(block, 2)
+        out = np.empty((len(TRAJECTORY_COLUMNS), block + 1))
+        n, used, done, lat, lon, speed, t, h = kernel(draws, lo, hi, float(lat), float(lon), float(end_lat), float(end_lon), float(speed), float(t), float(h), float(time_step), out)
+        pieces.append(out[:, :n])
+        if done: break
+    rand.setstate(state)
+    for _ in range(2 * used): draw()
+    out = np.concatenate(pieces, axis=1)
+    if not out.shape[1]: return None, t, h, speed
+    return dict(zip(TRAJECTORY_COLUMNS, out)), t, h, speed
+
+@register_motion_engine('jit', "与 bearing-walk 同一模型和随机数，逐步循环用 numba 编译 (未安装 numba 时即 bearing-walk)", requires_numpy=False,
+                        prepare=bearing_walk_jit)
+def jit_motion_engine(waypoints, speed_ranges, time_step, start_time, start_height, seed=None, smooth=False, rand=random):
+    kernel = bearing_walk_jit()
+    if kernel is None:
+        yield from bearing_walk_motion_engine(waypoints, speed_ranges, time_step, start_time, start_height, seed, smooth, rand); return
+    current_time, current_height, previous_speed = start_time, start_height, None
+    for (start_wp, end_wp), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+        cols, current_time, current_height, previous_speed = generate_segment_jit(
+            kernel, start_wp['lat'], start_wp['lon'], end_wp['lat'], end_wp['lon'], speed_range, current_time, current_height, previous_speed, time_step, rand)
+        if cols is not None: yield cols
+
+@register_motion_engine('routed', "整条路线运动学规划：起终点静止、转弯减速、加速度受限 (--dynamics)")
+def routed_motion_engine(waypoints, speed_ranges, time_step, start_time, start_height, seed=None, smooth=False, rand=random):
+    if len(waypoints) > 1: yield plan_route_dynamics(waypoints, speed_ranges, time_step, start_time, start_height, smooth=smooth, rand=rand)
+
+
+def parse_speed_range(text):
+    """解析 -s 参数 ('15' 或 '10-15')，格式错误时抛出 ValueError。"""
+    parts = [float(p.strip()) for p in text.split('-')]
+    if len(parts) == 1:
+        val = parts[0]
+        # 对于单个速度值，我们给一个极小的浮动范围，以符合新的生成逻辑
+        return (val * 0.95, val * 1.05) if val > 0 else (0, 0)
+    elif len(parts) == 2: return (min(parts), max(parts))
+    raise ValueError(text)
+
+
+def generate_route(waypoints, speed_ranges, seed=None, time_step=TIME_STEP, cache=None, start_time=0.0, start_height=DEFAULT_HEIGHT,
+                   engine=DEFAULT_MOTION_ENGINE, smooth=False):
+    """
+    非交互地生成整条路线 (与 -gg 相同，engine 为 MOTION_ENGINES 中的后端)，返回 (起点行, 点列数组字典)。
+    起点行为 (time, lat, lon, height)；传入 cache 且指定 seed 时先查缓存，未命中则生成后写入。
+    """
+    start_row = (start_time, waypoints[0]['lat'], waypoints[0]['lon'], start_height)
+    return start_row, motion_chunks_to_columns(iter_route_columns(waypoints, speed_ranges, seed, time_step, cache, start_time, start_height, engine, smooth))
+
+
+def iter_route_columns(waypoints, speed_ranges, seed=None, time_step=TIME_STEP, cache=None, start_time=0.0, start_height=DEFAULT_HEIGHT,
+                       engine=DEFAULT_MOTION_ENGINE, smooth=False):
+    """
+    与 generate_route 相同，但每生成一段就产出该段的点列数组字典 (不含起点)，供 --serve 边生成边发送。
+    缓存命中时一次产出整条；未命中且可缓存时在最后一段产出之后写入缓存。
+    """
+    key = cache.make_key(waypoints, speed_ranges, time_step, seed, start_time, start_height, motion_engine_tag(engine, smooth)) if cache is not None and seed is not None else None
+    cached = cache.lookup(key) if key else None
+    if cached: yield cached[1]; return
+    # 独立的随机数发生器：同一 seed 的序列与 random.seed(seed) 之后的 random 模块相同，但不重置调用方的全局状态
+    chunks, generated = MOTION_ENGINES[engine]['run'](waypoints, speed_ranges, time_step, start_time, start_height, seed, smooth, random.Random(seed)), []
+    for chunk in chunks:
+        cols = points_to_columns(chunk) if isinstance(chunk, list) else chunk
+        if key: generated.append(cols)
+        yield cols
+    if key: cache.store(key, (start_time, waypoints[0]['lat'], waypoints[0]['lon'], start_height), motion_chunks_to_columns(generated))
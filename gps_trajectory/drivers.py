@@ -0,0 +1,803 @@
+# -*- coding: utf-8 -*-
+"""
+命令行各模式的流程 (run_*)：读入路线、组合 core 的生成和 sinks / streaming 的输出、打印进度和结果。
+由 cli.main 在解析完参数后才导入，--help 不会加载这里和它依赖的模块。
+"""
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import traceback
+from datetime import datetime, timezone, timedelta
+
+from .cache import TrajectoryCache
+from .common import (
+    DEFAULT_HEIGHT, DEFAULT_SPEED_MODE, EARTH_RADIUS, LOGGER, OOC_CHUNK_POINTS, PROFILER, SPEED_MODES, VARIANT_BATCH_SIZE, LazyModule, bd09_to_wgs84,
+    calculate_distance_array, gcj02_to_wgs84, progress, require_numpy,
+)
+from .core import (
+    MOTION_ENGINES, generate_route_variants, generate_segment, measured_motion_chunks, motion_chunks_to_columns, motion_engine_tag,
+    parse_speed_range, resolve_speed_ranges,
+)
+from .gnss import GnssErrorModel, SatelliteSky, format_gsa_gsv_block, parse_nav_start
+from .qa import QA_BEARING_JUMP_DEG, QA_METRICS, analyze_trajectory
+from .readers import (
+    KML_INPUT_MESSAGES, KML_LINE_PARSERS, column_windows, derive_motion_chunks, gtb_time_at, import_route_columns, iter_csv_points,
+    iter_gpgga_points, iter_gprmc_points, kml_input_kind, read_geojson_columns, read_gpx_columns, simplify_chunks, spooled_trajectory, to_wgs84_columns,
+)
+from .serve import SERVE_COORD_SYSTEMS
+from .sinks import (
+    GPX_FOOTER, KML_FOOTER, GtbWriter, NmeaSetWriter, create_gpgga_sentence, create_gprmc_sentence, format_csv_block, format_gpgga_block,
+    format_gprmc_block, format_gpx_block, gpx_header, gtb_locate, gtb_records_to_columns, iter_batches, kml_column_coordinates, kml_header,
+    kml_point_coordinates, nmea_set_paths, open_gpx_for_append, open_gtb, points_to_columns, start_row_columns, write_kml_document, write_kml_stream,
+)
+from .streaming import ColumnFanout, NmeaStreamSink, ShmRingReader, ShmRingWriter, stream_paced
+
+np = LazyModule('numpy', 'np', globals())
+
+
+def get_last_entry_from_file(filename):
+    if not filename or not os.path.exists(filename) or os.path.getsize(filename) == 0: return None, None, None, None
+    if filename.lower().endswith('.gtb'):
+        try:
+            header, records, _ = open_gtb(filename)
+            if len(records):
+                last = {key: float(values[-1]) for key, values in gtb_records_to_columns(records[-1:], header['encoding']).items()}
+                LOGGER.info(f"检测到轨迹文件 '{filename}'，最后记录: T={last['time']:.2f}, Lat={last['lat']:.8f}, Lon={last['lon']:.8f}, H={last['height']:.3f}")
+                return last['time'], last['lat'], last['lon'], last['height']
+        except Exception as e: LOGGER.error(f"读取轨迹文件 '{filename}' 错误: {e}")
+        return None, None, None, None
+    try:
+        with open(filename, "r", encoding='utf-8') as f:
+            lines = f.readlines()
+            for line in reversed(lines):
+                line_content = line.strip()
+                if line_content and ',' in line_content and line_content.split(',')[0].replace('.', '', 1).isdigit():
+                    parts = line_content.split(",")
+                    if len(parts) >= 3:
+                        # 【修改】时间戳现在是整数，直接用float转换即可
+                        time, lat, lon = float(parts[0]), float(parts[1]), float(parts[2])
+                        height = float(parts[3]) if len(parts) > 3 else DEFAULT_HEIGHT
+                        LOGGER.info(f"检测到轨迹文件 '{filename}'，最后记录: T={time:.2f}, Lat={lat:.8f}, Lon={lon:.8f}, H={height:.3f}")
+                        return time, lat, lon, height
+    except Exception as e: LOGGER.error(f"读取轨迹文件 '{filename}' 错误: {e}")
+    return None, None, None, None
+
+
+# --- 增量 KML/KMZ (-k --incremental) ---
+# 状态记录 <输出>.state (JSON) 保存已转换到的输入位置 (文本为完整行末尾的字节偏移，.gtb 为记录数)、该位置之前内容的指纹，
+# 以及 KmlDocumentWriter 的续写状态 (正文末尾位置、最后一个坐标等)。再次运行时只解析新追加的输入并接到正文末尾，
+# 输入被截断/改写、输出被改动或状态对不上时完整重建，不会拼出错误的文档。
+KML_STATE_VERSION = 1
+KML_FINGERPRINT_BYTES = 4096
+
+class AppendedLines:
+    """从字节偏移 offset 起逐行读取文本文件，只产出以换行结尾的完整行 (正在写入的半行留到下次)；offset 随读取前进。"""
+    def __init__(self, path, offset=0):
+        self.path, self.offset = path, offset
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for raw in f:
+                if not raw.endswith(b'\n'): return
+                line = raw.decode('utf-8-sig' if self.offset == 0 else 'utf-8'); self.offset += len(raw)
+                yield line
+
+def kml_input_fingerprint(input_file, kind, offset):
+    """输入在 offset 之前的开头和结尾各一段的摘要；与上次记录的不同 (或输入比 offset 短) 说明文件不是只追加过，返回 None 表示无法续写。"""
+    digest = hashlib.sha1(kind.encode())
+    if kind == 'gtb':
+        header, records, _ = open_gtb(input_file)
+        if header['points'] < offset: return None
+        digest.update(bytes([header['encoding']])); digest.update(records[:min(offset, 64)].tobytes()); digest.update(records[max(0, offset - 64):offset].tobytes())
+        return digest.hexdigest()
+    if os.path.getsize(input_file) < offset: return None
+    with open(input_file, 'rb') as f:
+        digest.update(f.read(min(offset, KML_FINGERPRINT_BYTES))); f.seek(max(0, offset - KML_FINGERPRINT_BYTES)); digest.update(f.read(offset - f.tell()))
+    return digest.hexdigest()
+
+def load_kml_state(state_path, input_file, kind, kml_filename):
+    """读取并核对续写状态，返回 (状态, 不能续写的原因)；没有状态文件时两者都为 None。"""
+    if not os.path.exists(state_path): return None, None
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f: state = json.load(f)
+        if state.get('version') != KML_STATE_VERSION: return None, "状态文件版本不同"
+        if state['input'] != os.path.abspath(input_file) or state['kind'] != kind: return None, "输入文件与上次不同"
+        if not os.path.exists(kml_filename) or os.stat(kml_filename).st_mtime_ns != state['output_mtime'] or os.path.getsize(kml_filename) != state['output_size']:
+            return None, f"'{kml_filename}' 在上次转换后被改动过"
+        if kml_input_fingerprint(input_file, kind, state['offset']) != state['fingerprint']: return None, "输入文件不是在上次的内容之后追加的 (被截断或改写)"
+    except (OSError, ValueError, KeyError, TypeError) as e: return None, f"状态文件无法使用 ({e})"
+    return state, None
+
+def save_kml_state(state_path, state):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, state_path)
+
+def convert_kml_incremental(input_file, kind, kml_filename, new_session=False):
+    """
+    -k --incremental：有可用的状态记录时只解析上次之后追加的输入，新坐标接在原折线末尾 (new_session 时作为新的 Placemark)，
+    .kml 的结果与完整转换逐字节相同；否则完整转换并建立状态记录。返回本次写入的点数。
+    """
+    state_path = f"{kml_filename}.state"
+    state, reason = load_kml_state(state_path, input_file, kind, kml_filename)
+    if reason: print(f"信息: {reason}，将完整重新生成 {kml_filename}。")
+    offset = state['offset'] if state else 0
+    if kind == 'gtb':
+        require_numpy("读取 .gtb 二进制轨迹")
+        header, records, _ = open_gtb(input_file); consumed = header['points']
+        coordinate_chunks = (kml_column_coordinates(gtb_records_to_columns(records[lo:lo + OOC_CHUNK_POINTS], header['encoding'])) for lo in range(offset, consumed, OOC_CHUNK_POINTS))
+    else:
+        lines = AppendedLines(input_file, offset)
+        def appended_points():
+            try: yield from KML_LINE_PARSERS[kind](lines)
+            except Exception as e: LOGGER.error(f"解析文件 '{input_file}' 出错: {e}")
+        coordinate_chunks = map(kml_point_coordinates, iter_batches(appended_points(), OOC_CHUNK_POINTS))
+    if state: print(f"正在追加到KML文件: {kml_filename} (已有 {state['points']} 个点，从输入第 {offset} {'条记录' if kind == 'gtb' else '字节'}处继续)")
+    else: print(f"正在写入KML文件: {kml_filename}")
+    session_name = f"Session {state['sessions'] + 1}" if state and new_session else None
+    count, written = write_kml_document(coordinate_chunks, kml_filename, resume=state, session_name=session_name)
+    consumed = consumed if kind == 'gtb' else lines.offset
+    if written is None and not state:
+        if reason and os.path.exists(state_path): os.remove(state_path)
+        return 0
+    if written is None:
+        if count: return count  # 写入出错 (已记录日志)；输出与状态对不上，下次会完整重建
+        print(f"没有新追加的点，{kml_filename} 保持不变 (共 {state['points']} 个点)。"); written = state
+    written.update(version=KML_STATE_VERSION, input=os.path.abspath(input_file), kind=kind, offset=consumed,
+                   fingerprint=kml_input_fingerprint(input_file, kind, consumed))
+    save_kml_state(state_path, written)
+    return count
+
+def run_kml_conversion_mode(input_file, simplify=None, incremental=False, new_session=False, kmz=False):
+    print(f"--- KML 转换模式 ---")
+    if not os.path.exists(input_file): print(f"错误: 输入文件 '{input_file}' 不存在。"); sys.exit(1)
+    if simplify is not None:
+        require_numpy("轨迹抽稀 (--simplify)")
+        if simplify <= 0: print("错误: --simplify 容差必须大于 0。"); sys.exit(1)
+        if incremental: print("错误: --incremental 不能与 --simplify 同时使用 (抽稀窗口跨过追加位置时结果与整体转换不同)。"); sys.exit(1)
+    try: kind = kml_input_kind(input_file)
+    except Exception as e: print(f"无法读取文件 '{input_file}': {e}"); sys.exit(1)
+    if kind is None: print(f"错误: 无法识别文件 '{input_file}' 的格式。"); sys.exit(1)
+    if kind in KML_INPUT_MESSAGES: print(KML_INPUT_MESSAGES[kind])
+    if new_session and not incremental: print("警告: --kml-session 只在 --incremental 追加时有效，已忽略。")
+    if incremental and kind == 'route': print("警告: GPX / GeoJSON 不是按行追加的格式，不支持 --incremental，将完整转换。"); incremental = False
+    kml_filename = f"{os.path.splitext(input_file)[0]}.{'kmz' if kmz else 'kml'}"
+    if incremental:
+        with PROFILER.stage('convert') as st: st['points'] = convert_kml_incremental(input_file, kind, kml_filename, new_session)
+        return
+    # 输入按 OOC_CHUNK_POINTS 个点一块读取、格式化并写出，内存与轨迹长度无关
+    column_chunks, point_chunks = None, None
+    if kind == 'route':
+        with PROFILER.stage('parse') as st:
+            try: cols = import_route_columns(input_file)
+            except (ValueError, OSError, SyntaxError) as e: print(f"错误: 无法解析 '{input_file}': {e}"); sys.exit(1)
+            st['points'] = len(cols['lat'])
+        column_chunks = column_windows(cols)
+    elif kind == 'gtb':
+        require_numpy("读取 .gtb 二进制轨迹")
+        header, records, _ = open_gtb(input_file)
+        column_chunks = (gtb_records_to_columns(records[lo:lo + OOC_CHUNK_POINTS], header['encoding']) for lo in range(0, header['points'], OOC_CHUNK_POINTS))
+    else:
+        points = {'csv': iter_csv_points, 'GGA': iter_gpgga_points, 'RMC': iter_gprmc_points}[kind](input_file)
+        point_chunks = iter_batches(points, OOC_CHUNK_POINTS)
+        if simplify is not None: column_chunks = ({key: np.array([p[key] for p in chunk]) for key in ('lat', 'lon', 'height')} for chunk in point_chunks)
+    if column_chunks is not None:
+        if simplify is not None: column_chunks = simplify_chunks(column_chunks, simplify)
+        coordinate_chunks = map(kml_column_coordinates, column_chunks)
+    else: coordinate_chunks = map(kml_point_coordinates, point_chunks)
+    print(f"正在写入KML文件: {kml_filename}")
+    with PROFILER.stage('convert') as st: st['points'] = write_kml_stream(coordinate_chunks, kml_filename)
+    if not st['points']: print("未从文件中解析出任何坐标点。")
+
+
+# --- 回放 / 时间缩放 (--replay) ---
+# 把录制的或之前生成的轨迹重新变成新轨迹：按目标平均速度/总时长/缩放系数整体调整时间轴，
+# 用 np.interp 重采样到 -r 指定的频率，再叠加新的水平/高度噪声；输入先 spool 成 .gtb，输出按 OOC_CHUNK_POINTS 个点一窗生成和写出。
+def replay_time_scale(header, records, time_scale=None, target_duration=None, target_speed=None, chunk_points=OOC_CHUNK_POINTS):
+    """时间轴缩放系数 (None 表示保持原时间)。三个参数至多给一个；总距离按窗口累加 (相邻窗口重叠一点)。"""
+    n = header['points']; duration = gtb_time_at(header, records, n - 1) - gtb_time_at(header, records, 0)
+    if target_duration is not None: return target_duration / duration if duration > 0 else None
+    if target_speed is not None:
+        distance = 0.0
+        for lo in range(0, n - 1, chunk_points):
+            cols = gtb_records_to_columns(records[lo:lo + chunk_points + 1], header['encoding'])
+            distance += float(calculate_distance_array(cols['lat'][:-1], cols['lon'][:-1], cols['lat'][1:], cols['lon'][1:]).sum())
+        return (distance / duration) / target_speed if duration > 0 and distance > 0 else None
+    return time_scale
+
+def resample_window(header, records, index, new_times, t0, time_scale=None):
+    """
+    重采样一个窗口：只映射覆盖 new_times 的输入记录 (两侧各多取几点)，时间减去 t0 并按 time_scale 缩放，
+    去掉时间不递增的重复点后线性插值 lat/lon/height；逐点结果与对整条轨迹做 np.interp 相同。
+    """
+    to_input = (lambda x: x / time_scale + t0) if time_scale else (lambda x: x + t0)
+    lo = max(gtb_locate(header, records, index, to_input(float(new_times[0])), 'left') - 3, 0)
+    hi = min(gtb_locate(header, records, index, to_input(float(new_times[-1])), 'right') + 2, header['points'])
+    cols = gtb_records_to_columns(records[lo:hi], header['encoding'])
+    times = np.asarray(cols['time'], dtype=float) - t0
+    if time_scale: times = times * time_scale
+    keep = np.concatenate(([lo == 0], np.diff(times) > 0))  # 窗口第一点只用来判断下一点是否重复
+    return {'time': np.round(new_times, 6), **{key: np.interp(new_times, times[keep], np.asarray(cols[key], dtype=float)[keep]) for key in ('lat', 'lon', 'height')}}
+
+def add_position_noise(cols, sigma_m, height_sigma_m, rng):
+    """叠加独立高斯噪声 (米)：水平方向分别加在北向/东向，再换算为经纬度。每点按 (北, 东, 高) 一行取随机数，分块调用与整条调用结果相同。"""
+    if sigma_m <= 0 and height_sigma_m <= 0: return cols
+    north, east, up = rng.standard_normal((len(cols['time']), 3)).T
+    if sigma_m > 0:
+        cols['lat'] = cols['lat'] + np.degrees(north * sigma_m / EARTH_RADIUS)
+        cols['lon'] = cols['lon'] + np.degrees(east * sigma_m / (EARTH_RADIUS * np.cos(np.radians(cols['lat']))))
+    if height_sigma_m > 0: cols['height'] = cols['height'] + up * height_sigma_m
+    return cols
+
+
+def make_sky_model(args):
+    """按 --nav 参数创建卫星可见性计算器；未指定时返回 None。"""
+    if not args.nav: return None
+    require_numpy("卫星可见性 (--nav)")
+    try: sky = SatelliteSky(args.nav, args.elevation_mask, parse_nav_start(args.nav_start) if args.nav_start else None)
+    except (ValueError, OSError, IndexError) as e: print(f"错误: 读取导航文件失败: {e}"); sys.exit(1)
+    print(f"信息: 导航文件 {args.nav} 共 {len(sky.eph['prn'])} 组 GPS 星历 ({len(sky.prns)} 颗卫星)，轨迹起始时间 {sky.start_utc:%Y/%m/%d,%H:%M:%S} UTC。")
+    return sky
+
+
+def make_error_model(args, rng=None):
+    """按 --gnss-error 等参数创建误差模型；未指定时返回 None。"""
+    if not args.gnss_error: return None
+    require_numpy("GNSS 误差模型 (--gnss-error)")
+    if min(args.gnss_sigma, args.gnss_vsigma) < 0 or args.gnss_tau <= 0:
+        print("错误: 误差标准差不能为负，--gnss-tau 必须大于 0。", file=sys.stderr if args.filter else sys.stdout); sys.exit(1)
+    return GnssErrorModel(args.gnss_error, args.gnss_sigma, args.gnss_vsigma, args.gnss_tau,
+                          rng if rng is not None else np.random.default_rng(args.seed))
+
+
+def write_column_outputs(base_name, chunks, utc_start_time, args):
+    """
+    把依次产出的点列块写出为 CSV (可选)、-c/-a/--nmea NMEA、--nav 的 GSA/GSV、-B 二进制和 --gpx，与生成模式的文件命名一致；
+    --shm 时同时发布到共享内存。每块格式化后立即写出，内存只与块大小有关。
+    """
+    sky_model = make_sky_model(args)
+    if sky_model is not None: utc_start_time = sky_model.start_utc
+    paths = {'csv': f"{base_name}.csv" if not (args.gprmc or args.gpgga or args.nmea) else None, 'gprmc': f"{base_name}_gprmc.txt" if args.gprmc else None,
+             'gpgga': f"{base_name}_gpgga.txt" if args.gpgga else None, 'gsv': f"{base_name}_gpgsv.txt" if sky_model is not None else None,
+             'gpx': f"{base_name}.gpx" if args.gpx else None, 'gtb': f"{base_name}.gtb" if args.binary else None}
+    written = [path for path in paths.values() if path] + (nmea_set_paths(base_name, args.nmea, args.talker, args.nmea_interleave) if args.nmea else [])
+    for path in written:
+        if os.path.exists(path): os.remove(path)
+    files, nmea_writer, gtb_writer, shm_writer = {}, None, None, None
+    try:
+        for key in ('csv', 'gprmc', 'gpgga', 'gsv'):
+            if paths[key]: files[key] = open(paths[key], 'w', newline='' if key == 'csv' else None, encoding='utf-8')
+        if paths['gpx']: files['gpx'] = open_gpx_for_append(paths['gpx'], os.path.basename(base_name))
+        if args.nmea: nmea_writer = NmeaSetWriter(base_name, args.nmea, args.talker, args.nmea_interleave)
+        if paths['gtb']: gtb_writer = GtbWriter(paths['gtb'], args.binary_encoding); gtb_writer.utc_start_time = utc_start_time
+        if args.shm: shm_writer = open_shm_writer(args); shm_writer.set_utc_start(utc_start_time)
+        column_sink = ColumnFanout([gtb_writer, shm_writer]) if gtb_writer and shm_writer else gtb_writer or shm_writer
+        for cols in chunks:
+            write_route_columns(cols, files.get('csv'), files.get('gprmc'), files.get('gpgga'), column_sink, files.get('gpx'), utc_start_time,
+                                None, sky_model, files.get('gsv'), nmea_writer)
+    finally:
+        if 'gpx' in files: files['gpx'].write(GPX_FOOTER)
+        for f in files.values(): f.close()
+        if nmea_writer: nmea_writer.close()
+        if gtb_writer: gtb_writer.close()
+        if shm_writer: shm_writer.close()
+    for path in written: print(f"已写入 '{path}'。")
+
+def replay_spooled_trajectory(path, base_name, args):
+    header, records, index = open_gtb(path); n = header['points']
+    if n < 2: print("错误: 轨迹至少需要两个点。"); sys.exit(1)
+    time_step, t0 = 1.0 / args.rate, gtb_time_at(header, records, 0)
+    duration = gtb_time_at(header, records, n - 1) - t0
+    time_scale = replay_time_scale(header, records, args.time_scale, args.target_duration, args.target_speed)
+    count = math.ceil(((duration * time_scale if time_scale else duration) + time_step * 1e-6) / time_step)  # 与 np.arange(0, 时长 + 1e-6 步长, 步长) 的点数相同
+    print(f"信息: 原轨迹 {n} 点 / {duration:.1f} 秒，回放为 {count} 点 / {round((count - 1) * time_step, 6):.1f} 秒 ({args.rate:g} Hz)。")
+    # 噪声和误差模型各用一个子随机流，每点取数的顺序固定，输出与分块大小无关
+    noise_rng, error_rng = (np.random.default_rng(seed) for seed in np.random.SeedSequence(args.seed).spawn(2))
+    error_model = make_error_model(args, error_rng)
+    def chunks():
+        for lo in range(0, count, OOC_CHUNK_POINTS):
+            with PROFILER.stage('generate') as st:
+                new_times = np.arange(lo, min(lo + OOC_CHUNK_POINTS, count)) * time_step
+                out = add_position_noise(resample_window(header, records, index, new_times, t0, time_scale), args.noise, args.height_noise, noise_rng)
+                if error_model is not None: out = error_model.apply(out)
+                st['points'] = len(new_times)
+            yield out
+    write_column_outputs(base_name, derive_motion_chunks(chunks()), datetime.now(timezone.utc), args)
+
+def run_replay_mode(args):
+    print("--- 回放/时间缩放模式 ---")
+    require_numpy("回放模式 (--replay)")
+    if not os.path.exists(args.replay): print(f"错误: 输入文件 '{args.replay}' 不存在。"); sys.exit(1)
+    if sum(x is not None for x in (args.time_scale, args.target_duration, args.target_speed)) > 1:
+        print("错误: --time-scale、--target-duration、--target-speed 只能指定一个。"); sys.exit(1)
+    if any(x is not None and x <= 0 for x in (args.time_scale, args.target_duration, args.target_speed)) or args.noise < 0 or args.height_noise < 0:
+        print("错误: 时间缩放参数必须大于 0，噪声不能为负。"); sys.exit(1)
+    base_name = os.path.splitext(args.output)[0]
+    if os.path.dirname(base_name): os.makedirs(os.path.dirname(base_name), exist_ok=True)
+    try:
+        with spooled_trajectory(args.replay, args.coord, os.path.dirname(base_name) or '.') as path: replay_spooled_trajectory(path, base_name, args)
+    except (ValueError, OSError, SyntaxError) as e: print(f"错误: {e}"); sys.exit(1)
+
+
+# --- gps-sdr-sim 分块导出 (--split) ---
+# gps-sdr-sim 单次运行有时长限制，长轨迹按 N 秒切成多段 (可带重叠)，每段时间从 0 重新计算，
+# 各分块文件由进程池并行写出，清单 <input>_chunks.csv 记录每块的边界，供下游把 IQ 合成分发到多个核上。
+def plan_trajectory_chunks(locate, t_first, t_last, chunk_seconds, overlap):
+    """
+    返回 [(起始下标, 结束下标, 起始时间)]，每块覆盖 [起始时间, 起始时间 + chunk_seconds)，相邻块起点相隔 chunk_seconds - overlap。
+    locate(t, side) 给出时间 t 的插入位置 (同 np.searchsorted)，轨迹时间列不必整列读入内存。
+    """
+    stride, chunks, k = chunk_seconds - overlap, [], 0
+    while True:
+        start = t_first + k * stride
+        lo, hi = locate(start, 'left'), locate(start + chunk_seconds, 'left')
+        if hi > lo: chunks.append((lo, hi, float(start)))
+        if start + chunk_seconds > t_last: return chunks
+        k += 1
+
+def write_trajectory_chunk(task):
+    """
+    进程池入口：task 为 (.gtb 路径, 起止下标, 分块起始时间, 文件路径字典, 分块 UTC 起点)。各进程自己 memmap 读取分块，
+    写出 CSV (时间从 0 开始) 及可选的 NMEA 文件；任务里不带点数据，提交任务的内存与轨迹长度无关。
+    """
+    gtb_path, lo, hi, start, paths, utc_start_time = task
+    header, records, _ = open_gtb(gtb_path)
+    cols = {key: np.asarray(values, dtype=float) for key, values in gtb_records_to_columns(records[lo:hi], header['encoding']).items()}
+    cols['time'] = cols['time'] - start
+    writers = {'csv': lambda: format_csv_block(cols), 'gpgga': lambda: ''.join(s + '\n' for s in format_gpgga_block(cols, utc_start_time)),
+               'gprmc': lambda: ''.join(s + '\n' for s in format_gprmc_block(cols, utc_start_time))}
+    for fmt, path in paths.items():
+        with open(path, 'w', newline='' if fmt == 'csv' else None, encoding='utf-8') as f: f.write(writers[fmt]())
+    return hi - lo
+
+def split_spooled_trajectory(path, base_name, args):
+    chunk_seconds, overlap = args.chunk_seconds, args.chunk_overlap
+    header, records, time_index = open_gtb(path); n = header['points']
+    if not n: print("未从文件中解析出任何轨迹点。"); return
+    utc_start_time = header['utc_start_time'] or datetime.now(timezone.utc)
+    t_first, t_last = gtb_time_at(header, records, 0), gtb_time_at(header, records, n - 1)
+    with PROFILER.stage('split', n):
+        plan = plan_trajectory_chunks(lambda t, side: gtb_locate(header, records, time_index, t, side), t_first, t_last, chunk_seconds, overlap)
+        width = max(4, len(str(len(plan) - 1))); tasks, manifest = [], [["chunk", "start_time", "end_time", "points", "utc_start", "csv", "gpgga", "gprmc"]]
+        for index, (lo, hi, start) in enumerate(plan):
+            prefix = f"{base_name}_chunk{index:0{width}d}"
+            paths = {'csv': f"{prefix}.csv"}
+            if args.gpgga: paths['gpgga'] = f"{prefix}_gpgga.txt"
+            if args.gprmc: paths['gprmc'] = f"{prefix}_gprmc.txt"
+            chunk_utc = utc_start_time + timedelta(seconds=start - t_first)
+            tasks.append((path, lo, hi, start, paths, chunk_utc))
+            manifest.append([index, f"{start:.2f}", f"{start + chunk_seconds:.2f}", hi - lo, chunk_utc.isoformat(),
+                             *(os.path.basename(paths[fmt]) if fmt in paths else '' for fmt in ('csv', 'gpgga', 'gprmc'))])
+    del records, time_index  # 本进程不再需要映射，各工作进程自己打开
+    from concurrent.futures import ProcessPoolExecutor
+    workers = min(args.workers or os.cpu_count() or 1, len(tasks))
+    print(f"信息: 共 {n} 个点，切分为 {len(tasks)} 块 (每块 {chunk_seconds:g} 秒，重叠 {overlap:g} 秒)，{workers} 个进程并行写出。")
+    with PROFILER.stage('write', sum(task[2] - task[1] for task in tasks)):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor: list(executor.map(write_trajectory_chunk, tasks))
+        else:
+            for task in tasks: write_trajectory_chunk(task)
+    with open(f"{base_name}_chunks.csv", 'w', newline='', encoding='utf-8') as f: csv.writer(f).writerows(manifest)
+    print(f"分块清单已写入 '{base_name}_chunks.csv'。")
+
+def run_split_mode(args):
+    print("--- gps-sdr-sim 分块导出模式 ---")
+    require_numpy("分块导出 (--split)")
+    if args.chunk_seconds <= 0 or not 0 <= args.chunk_overlap < args.chunk_seconds: print("错误: 分块时长必须大于 0，重叠时长必须在 [0, 分块时长) 之间。"); sys.exit(1)
+    if not os.path.exists(args.split): print(f"错误: 输入文件 '{args.split}' 不存在。"); sys.exit(1)
+    base_name = os.path.splitext(args.split)[0]
+    if os.path.dirname(base_name): os.makedirs(os.path.dirname(base_name), exist_ok=True)
+    try:
+        with spooled_trajectory(args.split, args.coord, os.path.dirname(base_name) or '.') as path: split_spooled_trajectory(path, base_name, args)
+    except (ValueError, OSError, SyntaxError) as e: print(f"错误: {e}"); sys.exit(1)
+
+
+def run_qa_mode(args):
+    """逐个检查 --qa 给出的文件并打印结果，返回是否全部通过。"""
+    print("--- 轨迹质量检查模式 ---")
+    require_numpy("质量检查 (--qa)")
+    reports, started = {}, time.perf_counter()
+    for path in args.qa:
+        if not os.path.exists(path): print(f"错误: 输入文件 '{path}' 不存在。"); reports[path] = {'passed': False, 'error': "文件不存在"}; continue
+        try: report = analyze_trajectory(path, args.qa_mode, args.coord)
+        except (ValueError, OSError, SyntaxError) as e: print(f"错误: {path}: {e}"); reports[path] = {'passed': False, 'error': str(e)}; continue
+        reports[path] = report
+        mode_name = {"1": "走路", "2": "慢跑", "3": "快跑", "4": "开车"}.get(report['mode'], report['mode'])
+        print(f"{path}: {report['points']} 点，模式 {report['mode']} ({mode_name})，间隔 {report.get('step_seconds', 0):g} 秒 —— {'通过' if report['passed'] else '不通过'}")
+        for key, label, unit in QA_METRICS:
+            d = report.get('distribution', {}).get(key)
+            if d: print(f"  {label:<8} p50 {d['p50']:8.3f}  p95 {d['p95']:8.3f}  p99 {d['p99']:8.3f}  最大 {d['max']:9.3f} {unit}")
+        if 'bearing_jumps' in report: print(f"  航向突变 (>{QA_BEARING_JUMP_DEG:g}°) {report['bearing_jumps']} 次，最大间隔 {report['max_gap_seconds']:.3f} 秒")
+        for check in report['checks']:
+            if not check['passed']: print(f"  不通过: {check['name']} = {check['value']:g}，门限 {check['limit']}")
+    total = sum(r.get('points', 0) for r in reports.values()); seconds = time.perf_counter() - started
+    failed = [path for path, r in reports.items() if not r['passed']]
+    print(f"共检查 {len(reports)} 个文件 {total} 点，用时 {seconds:.2f} 秒 ({total / max(seconds, 1e-9):,.0f} 点/秒)，{len(failed)} 个不通过。")
+    if args.qa_report:
+        with open(args.qa_report, 'w', encoding='utf-8') as f: json.dump(reports, f, indent=2, ensure_ascii=False)
+        print(f"检查报告已写入 '{args.qa_report}'。")
+    return not failed
+
+
+def run_stream_generation(args, waypoints, custom_speed_range):
+    """-gg 配合 --stream：边生成边按墙钟节奏输出 GGA + RMC (\r\n 结尾)，不写文件。"""
+    if len(waypoints) < 2: print("错误: 实时流输出至少需要两个路线点。"); sys.exit(1)
+    try: sink = NmeaStreamSink(args.stream)
+    except (ValueError, OSError) as e: print(f"错误: {e}"); sys.exit(1)
+    speed_ranges, time_step = resolve_speed_ranges(waypoints, custom_speed_range), 1.0 / args.rate
+    utc_start_time = datetime.now(timezone.utc)
+    def records():
+        current_time, current_height, previous_speed = 0.0, DEFAULT_HEIGHT, None
+        for (start_wp, end_wp), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+            segment_points, _, _, current_time, current_height, previous_speed = generate_segment(
+                start_wp['lat'], start_wp['lon'], end_wp['lat'], end_wp['lon'], speed_range,
+                current_time, current_height, previous_speed, utc_start_time, time_step)
+            for p in segment_points: yield p['time'], (create_gpgga_sentence(p) + '\r\n' + create_gprmc_sentence(p) + '\r\n').encode('ascii')
+    print(f"信息: 实时流输出到 {sink.description}，缓冲 {args.stream_buffer} 点，按 Ctrl+C 停止。")
+    try:
+        with PROFILER.stage('stream') as st:
+            stats = stream_paced(sink, records(), args.stream_buffer); st['points'] = stats['points']
+    except KeyboardInterrupt: print("\n流输出已停止。"); return
+    finally: sink.close()
+    print(f"流输出完成: {stats['points']} 点，迟到 平均 {stats['mean_ms']:.3f} ms / p50 {stats['p50_ms']:.3f} ms / p99 {stats['p99_ms']:.3f} ms / 最大 {stats['max_ms']:.3f} ms，"
+          f"超过 1ms {stats['late_over_1ms']} 次，缓冲欠载 {stats['underruns']} 次，丢弃 {stats['dropped']} 次。")
+    if args.stream_stats:
+        with open(args.stream_stats, 'w', encoding='utf-8') as f: json.dump(stats, f, indent=2, ensure_ascii=False)
+        print(f"迟到统计已写入 '{args.stream_stats}'。")
+
+
+def open_shm_writer(args):
+    if args.shm_capacity < 1: print("错误: --shm-capacity 至少为 1。"); sys.exit(1)
+    try: writer = ShmRingWriter(args.shm, args.shm_capacity)
+    except FileExistsError: print(f"错误: 共享内存 '{args.shm}' 已存在 (上一次的生产者可能仍在运行)。"); sys.exit(1)
+    print(f"信息: 已创建共享内存 '{args.shm}' (容量 {writer.capacity} 条)，下游可用 --shm-attach {args.shm} 或 ShmRingReader 读取。")
+    return writer
+
+
+def run_shm_attach_mode(args):
+    """--shm-attach：参考消费者，把共享内存中的点逐块写成 CSV (-o)，并报告吞吐。"""
+    require_numpy("共享内存消费者 (--shm-attach)")
+    try: reader = ShmRingReader(args.shm_attach)
+    except (FileNotFoundError, ValueError) as e: print(f"错误: 无法连接共享内存 '{args.shm_attach}': {e}"); sys.exit(1)
+    output, count, started = os.path.splitext(args.output)[0] + '.csv', 0, time.perf_counter()
+    print(f"信息: 已连接共享内存 '{args.shm_attach}' (容量 {reader.capacity} 条)，写入 '{output}'。")
+    try:
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            for view in reader.chunks():
+                f.write(format_csv_block({key: view[key] for key in ('time', 'lat', 'lon', 'height')})); count += len(view)
+    finally: reader.close()
+    elapsed = time.perf_counter() - started
+    print(f"信息: 共读取 {count} 条记录，用时 {elapsed:.2f} 秒。")
+
+# --- 管道过滤模式 (--filter) ---
+# 从 stdin 逐行读取路线点 "经度,纬度[,模式]"，每读到一个点就生成上一点到它的一段并写到 stdout；
+# 没有任何提示，提示/警告全部输出到 stderr。输出经 64KB 缓冲，每段结束时刷新一次，下游可以边读边处理。
+FILTER_BUFFER_BYTES = 1 << 16
+
+def run_filter_mode(args):
+    log = lambda message: print(message, file=sys.stderr)
+    custom_speed_range = None
+    if args.speed:
+        try: custom_speed_range = parse_speed_range(args.speed)
+        except (ValueError, IndexError): log(f"错误: 无效的速度范围格式 '{args.speed}'。"); sys.exit(1)
+    if args.seed is not None: random.seed(args.seed)
+    convert, fmt, time_step = SERVE_COORD_SYSTEMS[args.coord or 'gcj02'], args.format, 1.0 / args.rate
+    if fmt == 'gpx': require_numpy("GPX 输出")
+    error_model = make_error_model(args)  # 误差状态跨段保留，逐段输出与整条一次处理一致
+    out = open(sys.stdout.fileno(), 'w', newline='', encoding='utf-8', buffering=FILTER_BUFFER_BYTES, closefd=False)
+    utc_start_time = datetime.now(timezone.utc)
+    current, current_time, current_height, previous_speed, last_valid_mode, count = None, 0.0, DEFAULT_HEIGHT, None, DEFAULT_SPEED_MODE, 0
+    try:
+        for line_no, line in enumerate(iter(sys.stdin.readline, ''), 1):
+            fields = [x.strip() for x in line.strip().split(',')]
+            if not fields[0] or fields[0].startswith('#'): continue
+            try: lon, lat = convert(float(fields[0]), float(fields[1]))
+            except (ValueError, IndexError):
+                if line_no > 1: log(f"警告: 跳过第 {line_no} 行: {line.strip()}")
+                continue
+            if len(fields) > 2 and fields[2] in SPEED_MODES: last_valid_mode = fields[2]
+            if current is None:
+                current = (lat, lon)
+                if fmt == 'csv': out.write(f"{current_time:.2f},{lat:.8f},{lon:.8f},{current_height:.3f}\r\n")
+                elif fmt == 'kml': out.write(kml_header("Generated Track") + f"{lon:.8f},{lat:.8f},{current_height:.3f}")
+                elif fmt == 'gpx': out.write(gpx_header("Generated Track") + format_gpx_block(start_row_columns((current_time, lat, lon, current_height)), utc_start_time))
+                out.flush(); continue
+            speed_range = custom_speed_range or SPEED_MODES[last_valid_mode]
+            with PROFILER.stage('generate') as st:
+                segment_points, new_lat, new_lon, current_time, current_height, previous_speed = generate_segment(
+                    current[0], current[1], lat, lon, speed_range, current_time, current_height, previous_speed, utc_start_time, time_step)
+                st['points'] = len(segment_points)
+            if fmt == 'kml':
+                rows = [(p['lon'], p['lat'], p['height']) for p in segment_points]
+                if error_model is not None and rows:
+                    c = error_model.apply(points_to_columns(segment_points)); rows = zip(c['lon'].tolist(), c['lat'].tolist(), c['height'].tolist())
+                with PROFILER.stage('write', len(segment_points)): out.write(''.join([f"\n          {x:.8f},{y:.8f},{h:.3f}" for x, y, h in rows]))
+            else: write_segment_points(segment_points, out if fmt == 'csv' else None, out if fmt == 'gprmc' else None, out if fmt == 'gpgga' else None,
+                                       gpx_file=out if fmt == 'gpx' else None, utc_start_time=utc_start_time, error_model=error_model)
+            out.flush(); current, count = (new_lat, new_lon), count + len(segment_points)
+        if current is not None and fmt in ('kml', 'gpx'): out.write(KML_FOOTER if fmt == 'kml' else GPX_FOOTER)
+        out.flush()
+    except BrokenPipeError:
+        # 下游提前退出 (如 head)：把 stdout 指向 /dev/null，避免解释器退出时再次报错
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno()); return
+    except KeyboardInterrupt: pass
+    log(f"信息: 管道模式共输出 {count} 个生成点。")
+
+
+def run_variant_generation(args, waypoints, custom_speed_range, base_name, should_write_csv):
+    """-V 模式：同一条路线生成 K 个独立变体，每个变体单独输出一组文件，种子 = 基础种子 + 变体编号。"""
+    require_numpy("批量变体模式 (-V)")
+    if len(waypoints) < 2: print("错误: 批量变体模式至少需要两个路线点。"); sys.exit(1)
+    speed_ranges = resolve_speed_ranges(waypoints, custom_speed_range)
+    if any(r[0] <= 0 for r in speed_ranges): print("错误: 批量变体模式的速度必须大于 0。"); sys.exit(1)
+    base_seed = args.seed if args.seed is not None else int.from_bytes(os.urandom(4), 'little')
+    width = max(4, len(str(args.variants - 1)))
+    utc_start_time = datetime.now(timezone.utc)
+    start = waypoints[0]
+    if os.path.dirname(base_name): os.makedirs(os.path.dirname(base_name), exist_ok=True)
+    manifest = [["variant", "seed", "points", "duration"]]
+    print(f"信息: 批量变体模式，共 {args.variants} 个变体，基础种子 {base_seed}，每批 {VARIANT_BATCH_SIZE} 个。")
+    for batch_start in range(0, args.variants, VARIANT_BATCH_SIZE):
+        seeds = [base_seed + i for i in range(batch_start, min(batch_start + VARIANT_BATCH_SIZE, args.variants))]
+        with PROFILER.stage('generate') as st:
+            batch = generate_route_variants(waypoints, speed_ranges, seeds, time_step=1.0 / args.rate)
+            st['points'] = sum(len(cols['time']) for cols in batch)
+        for seed, cols in zip(seeds, batch):
+            index = seed - base_seed; prefix = f"{base_name}_v{index:0{width}d}"; n = len(cols['time'])
+            with PROFILER.stage('format', n):
+                csv_text = f"{0.0:.2f},{start['lat']:.8f},{start['lon']:.8f},{DEFAULT_HEIGHT:.3f}\r\n" + format_csv_block(cols) if should_write_csv else None
+                gprmc_text = ''.join(s + '\n' for s in format_gprmc_block(cols, utc_start_time)) if args.gprmc else None
+                gpgga_text = ''.join(s + '\n' for s in format_gpgga_block(cols, utc_start_time)) if args.gpgga else None
+                gpx_text = (gpx_header(os.path.basename(prefix)) + format_gpx_block(start_row_columns((0.0, start['lat'], start['lon'], DEFAULT_HEIGHT)), utc_start_time)
+                            + format_gpx_block(cols, utc_start_time) + GPX_FOOTER) if args.gpx else None
+            with PROFILER.stage('write', n):
+                for path, text, newline in ((f"{prefix}.csv", csv_text, ''), (f"{prefix}_gprmc.txt", gprmc_text, None), (f"{prefix}_gpgga.txt", gpgga_text, None), (f"{prefix}.gpx", gpx_text, None)):
+                    if text is None: continue
+                    with open(path, 'w', newline=newline, encoding='utf-8') as f: f.write(text)
+                if args.binary:
+                    if os.path.exists(f"{prefix}.gtb"): os.remove(f"{prefix}.gtb")
+                    writer = GtbWriter(f"{prefix}.gtb", args.binary_encoding); writer.utc_start_time = utc_start_time
+                    writer.append(start_row_columns((0.0, start['lat'], start['lon'], DEFAULT_HEIGHT))); writer.append(cols); writer.close()
+            manifest.append([index, seed, n, f"{cols['time'][-1] if n else 0.0:.2f}"])
+        progress(f"  已完成 {seeds[-1] - base_seed + 1}/{args.variants} 个变体")
+    with open(f"{base_name}_variants.csv", 'w', newline='', encoding='utf-8') as f: csv.writer(f).writerows(manifest)
+    print(f"变体清单已写入 '{base_name}_variants.csv'。")
+
+
+def write_segment_points(segment_points, csv_file, gprmc_file, gpgga_file, gtb_writer=None, gpx_file=None, utc_start_time=None, error_model=None,
+                         sky_model=None, gsv_file=None, nmea_writer=None):
+    """
+    先把整段点格式化为文本 (CSV 行与 csv.writer 输出一致)，再一次性写入各文件；
+    gtb_writer 不为空时同时追加二进制记录，gpx_file 不为空时按 utc_start_time 整块写 trkpt。
+    error_model、sky_model 或 nmea_writer 不为空时转成点列数组，按 write_route_columns 写出。
+    """
+    if (error_model is not None or sky_model is not None or nmea_writer is not None) and segment_points:
+        return write_route_columns(points_to_columns(segment_points), csv_file, gprmc_file, gpgga_file, gtb_writer, gpx_file, utc_start_time,
+                                   error_model, sky_model, gsv_file, nmea_writer)
+    with PROFILER.stage('format', len(segment_points)):
+        csv_text = ''.join([f"{p['time']:.2f},{p['lat']:.8f},{p['lon']:.8f},{p['height']:.3f}\r\n" for p in segment_points]) if csv_file else ''
+        gprmc_text = ''.join([create_gprmc_sentence(p) + '\n' for p in segment_points]) if gprmc_file else ''
+        gpgga_text = ''.join([create_gpgga_sentence(p) + '\n' for p in segment_points]) if gpgga_file else ''
+        cols = points_to_columns(segment_points) if (gtb_writer or gpx_file) and segment_points else None
+        gpx_text = format_gpx_block(cols, utc_start_time) if gpx_file and cols else ''
+    with PROFILER.stage('write', len(segment_points)):
+        if csv_file: csv_file.write(csv_text)
+        if gprmc_file: gprmc_file.write(gprmc_text)
+        if gpgga_file: gpgga_file.write(gpgga_text)
+        if gpx_file: gpx_file.write(gpx_text)
+        if gtb_writer and cols: gtb_writer.append(cols)
+
+
+def write_route_columns(cols, csv_file, gprmc_file, gpgga_file, gtb_writer=None, gpx_file=None, utc_start_time=None, error_model=None,
+                        sky_model=None, gsv_file=None, nmea_writer=None):
+    """write_segment_points 的点列数组版本 (缓存命中和 --dynamics 时整条路线一次写出)；误差只加在输出上，不改动 cols。"""
+    if error_model is not None:
+        with PROFILER.stage('error', len(cols['time'])): cols = error_model.apply(cols)
+    sky = None
+    if sky_model is not None and (gpgga_file or gsv_file or (nmea_writer and {'GGA', 'GNS'} & set(nmea_writer.sentences))):
+        with PROFILER.stage('sky', len(cols['time'])): sky = sky_model.observe(cols, utc_start_time)
+    with PROFILER.stage('format', len(cols['time'])):
+        csv_text = format_csv_block(cols) if csv_file else ''
+        gprmc_text = ''.join(s + '\n' for s in format_gprmc_block(cols, utc_start_time)) if gprmc_file else ''
+        gpgga_text = ''.join(s + '\n' for s in format_gpgga_block(cols, utc_start_time, sky)) if gpgga_file else ''
+        gsv_text = ''.join(s + '\n' for s in format_gsa_gsv_block(sky, sky_model.prns)) if gsv_file and sky is not None else ''
+        gpx_text = format_gpx_block(cols, utc_start_time) if gpx_file else ''
+        nmea_texts = nmea_writer.render(cols, utc_start_time, sky) if nmea_writer else []
+    with PROFILER.stage('write', len(cols['time'])):
+        if nmea_writer: nmea_writer.write(nmea_texts)
+        if gsv_file: gsv_file.write(gsv_text)
+        if csv_file: csv_file.write(csv_text)
+        if gprmc_file: gprmc_file.write(gprmc_text)
+        if gpgga_file: gpgga_file.write(gpgga_text)
+        if gpx_file: gpx_file.write(gpx_text)
+        if gtb_writer: gtb_writer.append(cols)
+
+
+def run_trajectory_generation(args):
+    print("--- 轨迹生成模式 ---")
+
+    custom_speed_range = None
+    if args.speed:
+        try:
+            custom_speed_range = parse_speed_range(args.speed)
+            print(f"信息: 使用自定义速度范围: {custom_speed_range[0]:.2f}-{custom_speed_range[1]:.2f} m/s。")
+        except (ValueError, IndexError):
+            print(f"错误: 无效的速度范围格式 '{args.speed}'。请使用格式 '最小速度-最大速度' (例如 '10-15')。")
+            sys.exit(1)
+
+    should_write_csv = not (args.gaode_csv and (args.gprmc or args.gpgga or args.nmea))
+    if not should_write_csv: print("信息: 检测到 -gg 与 -c、-a 或 --nmea 同用，将不生成 .csv 文件。")
+    base_name, _ = os.path.splitext(args.output)
+    output_csv_file = f"{base_name}.csv" if should_write_csv else None
+    output_gprmc_file = f"{base_name}_gprmc.txt" if args.gprmc else None
+    output_gpgga_file = f"{base_name}_gpgga.txt" if args.gpgga else None
+    output_gtb_file = f"{base_name}.gtb" if args.binary else None
+    output_gpx_file = f"{base_name}.gpx" if args.gpx else None
+    output_gsv_file = f"{base_name}_gpgsv.txt" if args.nav else None
+    if args.binary: require_numpy("二进制轨迹输出 (-B)")
+    if args.gpx: require_numpy("GPX 输出 (--gpx)")
+    if MOTION_ENGINES[args.engine]['numpy']: require_numpy(f"运动引擎 --engine {args.engine}")
+    if args.clear:
+        nmea_paths = nmea_set_paths(base_name, args.nmea, args.talker, args.nmea_interleave) if args.nmea else []
+        for f_path in [output_csv_file, output_gprmc_file, output_gpgga_file, output_gtb_file, output_gpx_file, output_gsv_file] + nmea_paths:
+            if f_path and os.path.exists(f_path): os.remove(f_path); print(f"文件 '{f_path}' 已清空。")
+    waypoints = []
+    if args.gaode_csv and os.path.splitext(args.gaode_csv)[1].lower() in ('.gpx', '.geojson', '.json'):
+        print(f"正在导入路线: {args.gaode_csv}"); require_numpy("GPX/GeoJSON 导入")
+        with PROFILER.stage('parse') as st:
+            try: cols = read_gpx_columns(args.gaode_csv) if args.gaode_csv.lower().endswith('.gpx') else read_geojson_columns(args.gaode_csv)
+            except (ValueError, OSError, SyntaxError) as e: print(f"读取或解析路线文件时出错: {e}"); sys.exit(1)
+            st['points'] = len(cols['lat'])
+        print(f"信息: 共 {len(cols['lat'])} 个路线点，坐标系 {args.coord or cols['coord']}。")
+        with PROFILER.stage('convert', len(cols['lat'])): to_wgs84_columns(cols, args.coord)
+        waypoints = [{'lon': lon, 'lat': lat, 'mode': None} for lon, lat in zip(cols['lon'].tolist(), cols['lat'].tolist())]
+    elif args.gaode_csv:
+        print(f"正在读取高德CSV: {args.gaode_csv}")
+        try:
+            with PROFILER.stage('parse') as st, open(args.gaode_csv, 'r', encoding='utf-8-sig') as infile:
+                reader = csv.reader(infile); header = next(reader)
+                lon_idx, lat_idx, spd_idx = header.index('经度'), header.index('纬度'), header.index('速度')
+                for i, row in enumerate(reader):
+                    mode = row[spd_idx].strip() if not custom_speed_range and len(row) > spd_idx and row[spd_idx].strip() in SPEED_MODES else None
+                    waypoints.append({'lon': float(row[lon_idx]), 'lat': float(row[lat_idx]), 'mode': mode})
+                st['points'] = len(waypoints)
+        except Exception as e: print(f"读取或解析输入CSV时出错: {e}"); sys.exit(1)
+        with PROFILER.stage('convert', len(waypoints)):
+            for wp in waypoints: wp['lon'], wp['lat'] = gcj02_to_wgs84(wp['lon'], wp['lat'])
+    if args.variants:
+        run_variant_generation(args, waypoints, custom_speed_range, base_name, should_write_csv); return
+    if args.stream:
+        if args.seed is not None: random.seed(args.seed)
+        run_stream_generation(args, waypoints, custom_speed_range); return
+    if args.seed is not None: random.seed(args.seed)
+    time_step = 1.0 / args.rate
+    error_model = make_error_model(args)  # 起点保持原值，之后各段按时间顺序叠加相关误差
+    sky_model = make_sky_model(args)
+
+    csv_file, gprmc_file, gpgga_file, csv_writer, gtb_writer, gpx_file, gsv_file, nmea_writer = None, None, None, None, None, None, None, None
+    shm_writer = None
+    try:
+        if args.nmea: nmea_writer = NmeaSetWriter(base_name, args.nmea, args.talker, args.nmea_interleave)
+        if output_gsv_file: gsv_file = open(output_gsv_file, 'a', encoding='utf-8')
+        if output_csv_file: csv_file = open(output_csv_file, 'a', newline='', encoding='utf-8'); csv_writer = csv.writer(csv_file)
+        if output_gprmc_file: gprmc_file = open(output_gprmc_file, 'a', encoding='utf-8')
+        if output_gpgga_file: gpgga_file = open(output_gpgga_file, 'a', encoding='utf-8')
+        if output_gpx_file: gpx_file = open_gpx_for_append(output_gpx_file, os.path.basename(base_name))
+        
+        # 断点续写优先以 CSV 为准；只输出二进制时从 .gtb 的最后一条记录继续
+        last_time, last_lat, last_lon, last_height = get_last_entry_from_file(output_csv_file or output_gtb_file)
+        is_appending = last_lat is not None
+        if output_gtb_file: gtb_writer = GtbWriter(output_gtb_file, args.binary_encoding)
+        if args.shm: shm_writer = open_shm_writer(args)
+        # 点列数组同时交给 -B 和 --shm
+        column_sink = ColumnFanout([gtb_writer, shm_writer]) if gtb_writer and shm_writer else gtb_writer or shm_writer
+        
+        if args.gaode_csv:
+            if is_appending: current_lat, current_lon, current_time, current_height = last_lat, last_lon, last_time, last_height
+            elif waypoints: current_lat, current_lon, current_time, current_height = waypoints[0]['lat'], waypoints[0]['lon'], 0.0, DEFAULT_HEIGHT
+            else: print("错误: CSV文件为空或无效。"); sys.exit(1)
+            # 有导航文件时轨迹时间 0 对应星历起始时间 (与 gps-sdr-sim 相同)，否则按当前时间倒推
+            utc_start_time = sky_model.start_utc if sky_model else datetime.now(timezone.utc) - timedelta(seconds=current_time)
+            if gtb_writer: gtb_writer.utc_start_time = gtb_writer.utc_start_time or utc_start_time
+            if shm_writer: shm_writer.set_utc_start(utc_start_time)
+            if column_sink and not is_appending and waypoints: column_sink.append(start_row_columns((current_time, current_lat, current_lon, current_height)))
+            if gpx_file and not is_appending and waypoints: gpx_file.write(format_gpx_block(start_row_columns((current_time, current_lat, current_lon, current_height)), utc_start_time))
+            wp_to_process = ([{'lon': current_lon, 'lat': current_lat}] + waypoints) if is_appending else waypoints
+            speed_ranges = resolve_speed_ranges(wp_to_process, custom_speed_range)
+
+            # 结果缓存只用于全新生成 (非断点续写) 且指定了种子的情况，否则结果本来就不可复现
+            cache_key, cached = None, None
+            if args.cache:
+                if is_appending or args.seed is None: print("信息: 缓存仅用于指定 --seed 的全新生成，本次跳过缓存。")
+                else:
+                    require_numpy("轨迹缓存 (--cache)")
+                    cache = TrajectoryCache(args.cache, int(args.cache_size * 1024 * 1024))
+                    cache_key = cache.make_key(wp_to_process, speed_ranges, time_step, args.seed, current_time, current_height,
+                                               motion_engine_tag(args.engine, args.smooth_corners))
+                    cached = cache.lookup(cache_key)
+            if cached:
+                print(f"信息: 命中缓存 {cache_key[:12]}，直接复用已生成的轨迹。")
+                _, cols = cached
+                if csv_writer: csv_writer.writerow([f"{current_time:.2f}", f"{current_lat:.8f}", f"{current_lon:.8f}", f"{current_height:.3f}"])
+                write_route_columns(cols, csv_file, gprmc_file, gpgga_file, column_sink, gpx_file, utc_start_time, error_model, sky_model, gsv_file, nmea_writer)
+                wp_to_process = []
+            elif csv_writer and not is_appending and waypoints:
+                # 【修改】写入文件时，时间戳使用 round(t, 2) 保证 xx.00 格式
+                csv_writer.writerow([f"{current_time:.2f}", f"{current_lat:.8f}", f"{current_lon:.8f}", f"{current_height:.3f}"])
+            start_row, generated = (current_time, current_lat, current_lon, current_height), ([] if cache_key and not cached else None)
+            meter, prepare = {'seconds': 0.0, 'points': 0}, MOTION_ENGINES[args.engine]['prepare']
+            if prepare and wp_to_process:
+                started = time.perf_counter(); prepare()
+                progress(f"信息: 运动引擎 {args.engine} 准备 (编译/载入) 用时 {time.perf_counter() - started:.2f} 秒。")
+            chunks = MOTION_ENGINES[args.engine]['run'](wp_to_process, speed_ranges, time_step, current_time, current_height, args.seed, args.smooth_corners)
+            for chunk in measured_motion_chunks(chunks, meter):
+                write_chunk = write_segment_points if isinstance(chunk, list) else write_route_columns
+                write_chunk(chunk, csv_file, gprmc_file, gpgga_file, column_sink, gpx_file, utc_start_time, error_model, sky_model, gsv_file, nmea_writer)
+                if generated is not None: generated.append(chunk)
+            if meter['points']: progress(f"信息: 运动引擎 {args.engine} 生成 {meter['points']} 点，{meter['points'] / max(meter['seconds'], 1e-9):,.0f} 点/秒。")
+            if generated is not None: cache.store(cache_key, start_row, motion_chunks_to_columns(generated)); print(f"信息: 结果已写入缓存 {cache_key[:12]}。")
+        
+        elif args.gaode_interactive or args.baidu_interactive:
+            prompt = "高德/GCJ-02" if args.gaode_interactive else "百度/BD-09"
+            conversion_func = gcj02_to_wgs84 if args.gaode_interactive else bd09_to_wgs84
+            if is_appending: current_lat, current_lon, current_time, current_height = last_lat, last_lon, last_time, last_height
+            else:
+                while True:
+                    try:
+                        start_input = input(f"请输入起点 {prompt} 经纬度 (格式: 经度,纬度): ").strip()
+                        start_lon_in, start_lat_in = map(float, start_input.split(","))
+                        current_lon, current_lat = conversion_func(start_lon_in, start_lat_in)
+                        current_time, current_height = 0.0, DEFAULT_HEIGHT
+                        if csv_writer: csv_writer.writerow([f"{current_time:.2f}", f"{current_lat:.8f}", f"{current_lon:.8f}", f"{current_height:.3f}"])
+                        if column_sink: column_sink.append(start_row_columns((current_time, current_lat, current_lon, current_height)))
+                        print(f"起点 WGS-84 坐标: ({current_lon:.8f}, {current_lat:.8f})")
+                        break
+                    except ValueError: print("输入格式错误，请重新输入。")
+            previous_speed = None
+            # 有导航文件时轨迹时间 0 对应星历起始时间 (与 gps-sdr-sim 相同)，否则按当前时间倒推
+            utc_start_time = sky_model.start_utc if sky_model else datetime.now(timezone.utc) - timedelta(seconds=current_time)
+            if gtb_writer: gtb_writer.utc_start_time = gtb_writer.utc_start_time or utc_start_time
+            if shm_writer: shm_writer.set_utc_start(utc_start_time)
+            if gpx_file and not is_appending: gpx_file.write(format_gpx_block(start_row_columns((current_time, current_lat, current_lon, current_height)), utc_start_time))
+            while True:
+                try:
+                    end_input = input(f"请输入下一个终点 {prompt} 经纬度 (或输入 'x' 退出): ").strip()
+                    if end_input.lower() == 'x': break
+                    end_lon_in, end_lat_in = map(float, end_input.split(","))
+                    end_lon, end_lat = conversion_func(end_lon_in, end_lat_in)
+                    print(f"  转换后终点 WGS-84 坐标: ({end_lon:.8f}, {end_lat:.8f})")
+                    
+                    if custom_speed_range: speed_range = custom_speed_range
+                    else:
+                        print("选择运动模式: 1. 走路 2. 慢跑 3. 快跑 4. 开车")
+                        mode_input = input("请输入模式编号 (1-4): ").strip()
+                        while mode_input not in SPEED_MODES: mode_input = input("输入无效，请输入 1-4：").strip()
+                        speed_range = SPEED_MODES[mode_input]
+
+                    with PROFILER.stage('generate') as st:
+                        segment_points, new_lat, new_lon, new_time, new_height, new_speed = generate_segment(
+                            current_lat, current_lon, end_lat, end_lon, speed_range,
+                            current_time, current_height, previous_speed, utc_start_time, time_step
+                        )
+                        st['points'] = len(segment_points)
+                    write_segment_points(segment_points, csv_file, gprmc_file, gpgga_file, column_sink, gpx_file, utc_start_time, error_model, sky_model, gsv_file, nmea_writer)
+                    current_lat, current_lon, current_time, current_height, previous_speed = new_lat, new_lon, new_time, new_height, new_speed
+                    progress(f"--- 段落结束 --- (当前: T={current_time:.2f}, Lat={current_lat:.8f}, Lon={current_lon:.8f})")
+                except ValueError: print("输入格式错误，请重新输入。")
+                except Exception as e: print(f"处理段落时发生错误: {e}"); traceback.print_exc(); break
+    finally:
+        if csv_file: csv_file.close()
+        if gprmc_file: gprmc_file.close()
+        if gpgga_file: gpgga_file.close()
+        if gsv_file: gsv_file.close()
+        if nmea_writer: nmea_writer.close()
+        if gtb_writer: gtb_writer.close()
+        if shm_writer: shm_writer.close()
+        if gpx_file: gpx_file.write(GPX_FOOTER); gpx_file.close()
+    print("轨迹生成完毕。")
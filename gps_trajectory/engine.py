@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+兼容旧的导入路径 gps_trajectory.engine：汇总各子模块的全部名字 (verify.py、bench.py 通过 engine.xxx 访问各层函数)。
+库代码请 import gps_trajectory 或直接导入子模块 (common / sinks / readers / core / cache / gnss / qa / streaming)；导入本模块会连同命令行和各模式流程一起加载。
+"""
+from .common import *
+from .sinks import *
+from .readers import *
+from .core import *
+from .cache import *
+from .gnss import *
+from .qa import *
+from .streaming import *
+from .serve import *
+from .drivers import *
+from .cli import *
+
+np = numpy_module()  # 各子模块的 np 各自延迟导入，这里直接给出 numpy 模块 (未安装时为 None)
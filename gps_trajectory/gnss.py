@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+GNSS 相关的输出增强：RINEX 导航文件的卫星可见性 / DOP (--nav，GSA/GSV 语句) 和时间相关的定位误差模型 (--gnss-error)。
+"""
+import math
+from datetime import datetime, timezone, timedelta
+
+from .common import EARTH_RADIUS, LazyModule, ar1_filter
+from .sinks import finish_nmea_block
+
+np = LazyModule('numpy', 'np', globals())
+
+
+# --- 卫星可见性 (--nav) ---
+# 读取与 gps-sdr-sim 相同的 RINEX 导航文件 (GPS 广播星历，RINEX 2.x / 3.x)，按 IS-GPS-200 的公式
+# 整批计算卫星位置，得到每个轨迹点的可见卫星、仰角/方位角和 DOP，替换 GGA 里固定的 12 颗星 / HDOP 0.8，并输出 GSA/GSV。
+GPS_EPOCH = datetime(1980, 1, 6, tzinfo=timezone.utc)
+GPS_MU, GPS_OMEGA_E = 3.986005e14, 7.2921151467e-5   # IS-GPS-200 引力常数、地球自转角速度
+WGS84_A, WGS84_E2 = 6378137.0, 6.69437999014e-3
+DEFAULT_LEAP_SECONDS = 18        # 导航文件头没有 LEAP SECONDS 时使用
+DEFAULT_ELEVATION_MASK = 5.0
+SKY_BATCH_POINTS = 1 << 14       # 每批点数，(点 x 卫星 x 3) 的中间数组控制在几十 MB 以内
+EPHEMERIS_FIELDS = ('af0', 'af1', 'af2', 'iode', 'crs', 'delta_n', 'm0', 'cuc', 'e', 'cus', 'sqrt_a',
+                    'toe', 'cic', 'omega0', 'cis', 'i0', 'crc', 'omega', 'omega_dot', 'idot', 'codes', 'week', 'l2p', 'accuracy', 'health')
+
+def read_rinex_nav(path):
+    """解析 RINEX 导航文件中的 GPS 星历，返回 (按字段的数组字典, 闰秒)；toc/toe_abs 为自 GPS 起点的连续秒数。"""
+    with open(path, 'r', encoding='ascii', errors='replace') as f: lines = f.read().splitlines()
+    version, leap, body = 2.0, DEFAULT_LEAP_SECONDS, None
+    for i, line in enumerate(lines):
+        label = line[60:].strip()
+        if label == 'RINEX VERSION / TYPE': version = float(line[:9])
+        elif label == 'LEAP SECONDS' and line[:6].strip(): leap = int(line[:6])
+        elif label == 'END OF HEADER': body = i + 1; break
+    if body is None: raise ValueError(f"'{path}' 不是 RINEX 导航文件 (没有 END OF HEADER)。")
+    num = lambda text: float(text.replace('D', 'E').replace('d', 'e')) if text.strip() else 0.0
+    prns, tocs, values, i = [], [], [], body
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip(): i += 1; continue
+        if version >= 3:
+            system, count = line[0], (4 if line[0] in 'RS' else 8)
+            if system != 'G': i += count; continue
+            prn, stamp, first, indent = int(line[1:3]), line[4:23].split(), [line[23:42], line[42:61], line[61:80]], 4
+            year = int(stamp[0])
+        else:
+            prn, stamp, first, indent, count = int(line[:2]), line[3:22].split(), [line[22:41], line[41:60], line[60:79]], 3, 8
+            year = int(stamp[0]) + (2000 if int(stamp[0]) < 80 else 1900)
+        toc = datetime(year, int(stamp[1]), int(stamp[2]), int(stamp[3]), int(stamp[4]), tzinfo=timezone.utc) + timedelta(seconds=float(stamp[5]))
+        fields = [num(x) for x in first]
+        for orbit in lines[i + 1:i + 7]:
+            fields += [num(orbit[indent + 19 * k:indent + 19 * (k + 1)]) for k in range(4)]
+        prns.append(prn); tocs.append((toc - GPS_EPOCH).total_seconds()); values.append(fields[:len(EPHEMERIS_FIELDS)]); i += count
+    if not prns: raise ValueError(f"'{path}' 中没有 GPS 星历。")
+    table = np.array(values, dtype=float)
+    eph = {name: table[:, k] for k, name in enumerate(EPHEMERIS_FIELDS)}
+    eph['prn'], eph['toc'] = np.array(prns, dtype=np.int64), np.array(tocs)
+    eph['toe_abs'] = eph['week'] * 604800.0 + eph['toe']
+    return eph, leap
+
+def satellite_ecef(eph, t):
+    """
+    广播星历 → ECEF (米)。eph 为按卫星的一维数组字典 (S,)，t 为 GPS 连续秒 (N,)；返回 (N, S, 3)。
+    偏近点角用固定次数的牛顿迭代，整批一起算，没有逐点/逐星的 Python 循环。
+    """
+    tk = t[:, None] - eph['toe_abs']
+    a = eph['sqrt_a'] ** 2; e = eph['e']
+    mean = eph['m0'] + (np.sqrt(GPS_MU / a ** 3) + eph['delta_n']) * tk
+    ecc = mean.copy()
+    for _ in range(5): ecc -= (ecc - e * np.sin(ecc) - mean) / (1.0 - e * np.cos(ecc))
+    phi = np.arctan2(np.sqrt(1.0 - e * e) * np.sin(ecc), np.cos(ecc) - e) + eph['omega']
+    sin2, cos2 = np.sin(2 * phi), np.cos(2 * phi)
+    u = phi + eph['cus'] * sin2 + eph['cuc'] * cos2
+    r = a * (1.0 - e * np.cos(ecc)) + eph['crs'] * sin2 + eph['crc'] * cos2
+    inc = eph['i0'] + eph['idot'] * tk + eph['cis'] * sin2 + eph['cic'] * cos2
+    node = eph['omega0'] + (eph['omega_dot'] - GPS_OMEGA_E) * tk - GPS_OMEGA_E * eph['toe']
+    x, y = r * np.cos(u), r * np.sin(u)
+    return np.stack((x * np.cos(node) - y * np.cos(inc) * np.sin(node), x * np.sin(node) + y * np.cos(inc) * np.cos(node), y * np.sin(inc)), axis=-1)
+
+def geodetic_to_ecef(lat, lon, height):
+    phi, lam = np.radians(lat), np.radians(lon)
+    n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * np.sin(phi) ** 2)
+    return np.column_stack(((n + height) * np.cos(phi) * np.cos(lam), (n + height) * np.cos(phi) * np.sin(lam), (n * (1.0 - WGS84_E2) + height) * np.sin(phi)))
+
+class SatelliteSky:
+    """
+    某个导航文件的卫星可见性计算器。每个点取时间上最近的星历历元 (toe)，每颗卫星用该历元附近最近的健康星历；
+    每个历元的星历选择缓存起来，同一历元内的点按 SKY_BATCH_POINTS 分批整列计算。
+    """
+    def __init__(self, path, elevation_mask=DEFAULT_ELEVATION_MASK, start=None):
+        self.eph, self.leap = read_rinex_nav(path)
+        healthy = self.eph['health'] == 0
+        self.prns = np.unique(self.eph['prn'][healthy])
+        self.epochs = np.unique(self.eph['toe_abs'][healthy])
+        self.mask = math.radians(elevation_mask)
+        # 与 gps-sdr-sim 一致：未指定开始时间时从导航文件的第一组星历开始
+        self.start_utc = start or GPS_EPOCH + timedelta(seconds=float(self.eph['toc'].min()) - self.leap)
+        self._selection = {}
+
+    def ephemeris_at(self, epoch_index):
+        """某个星历历元下每颗卫星使用的星历 (数组字典，缺少星历的卫星位置为 NaN)，按历元缓存。"""
+        cached = self._selection.get(epoch_index)
+        if cached is not None: return cached
+        epoch, healthy = self.epochs[epoch_index], self.eph['health'] == 0
+        rows = []
+        for prn in self.prns.tolist():
+            candidates = np.nonzero(healthy & (self.eph['prn'] == prn))[0]
+            best = candidates[np.argmin(np.abs(self.eph['toe_abs'][candidates] - epoch))]
+            rows.append(best if abs(self.eph['toe_abs'][best] - epoch) <= 4 * 3600 else -1)  # 超出 4 小时拟合区间的不用
+        rows = np.array(rows)
+        eph = {key: np.where(rows >= 0, values[np.maximum(rows, 0)], np.nan) for key, values in self.eph.items() if key in EPHEMERIS_FIELDS or key == 'toe_abs'}
+        self._selection[epoch_index] = eph
+        return eph
+
+    def observe(self, cols, utc_start_time):
+        """
+        返回点列对应的可见性字典：sats (可见星数)、hdop/pdop/vdop (不足 4 颗时为 99.9)、
+        elevation/azimuth (点 x 卫星的整数度，不可见为 -1)，卫星顺序与 self.prns 相同。
+        """
+        n, s = len(cols['time']), len(self.prns)
+        t = (utc_start_time - GPS_EPOCH).total_seconds() + self.leap + np.asarray(cols['time'], dtype=float)
+        out = {'sats': np.zeros(n, dtype=np.int64), 'elevation': np.full((n, s), -1, dtype=np.int8), 'azimuth': np.full((n, s), -1, dtype=np.int16)}
+        for key in ('hdop', 'pdop', 'vdop'): out[key] = np.full(n, 99.9)
+        if not n: return out
+        edges = (self.epochs[1:] + self.epochs[:-1]) / 2
+        slot = np.searchsorted(edges, t)
+        rcv_all = geodetic_to_ecef(np.asarray(cols['lat'], dtype=float), np.asarray(cols['lon'], dtype=float), np.asarray(cols['height'], dtype=float))
+        lat, lon = np.radians(np.asarray(cols['lat'], dtype=float)), np.radians(np.asarray(cols['lon'], dtype=float))
+        change = np.flatnonzero(np.diff(slot)) + 1
+        for lo, hi in zip(np.concatenate(([0], change)).tolist(), np.concatenate((change, [n])).tolist()):
+            eph = self.ephemeris_at(int(slot[lo]))
+            for a in range(lo, hi, SKY_BATCH_POINTS):
+                b = min(a + SKY_BATCH_POINTS, hi)
+                tb = t[a:b]; base = math.floor(tb.min()); k = np.floor(tb - base).astype(np.int64)
+                if k.max() + 2 <= 2 * len(tb):  # 采样密于 1Hz 时：卫星位置在整秒网格上算一次，再线性插值 (误差厘米级)
+                    grid = satellite_ecef(eph, base + np.arange(k.max() + 2, dtype=float))
+                    sat = grid[k] + (grid[k + 1] - grid[k]) * (tb - base - k)[:, None, None]
+                else: sat = satellite_ecef(eph, tb)
+                los = sat - rcv_all[a:b, None, :]
+                los /= np.linalg.norm(los, axis=-1, keepdims=True)
+                sl, cl, so, co = np.sin(lat[a:b])[:, None], np.cos(lat[a:b])[:, None], np.sin(lon[a:b])[:, None], np.cos(lon[a:b])[:, None]
+                east = -so * los[..., 0] + co * los[..., 1]
+                north = -sl * co * los[..., 0] - sl * so * los[..., 1] + cl * los[..., 2]
+                up = cl * co * los[..., 0] + cl * so * los[..., 1] + sl * los[..., 2]
+                elev = np.arcsin(np.clip(up, -1.0, 1.0))
+                visible = elev >= self.mask  # NaN (无星历) 比较结果为 False
+                azim = np.degrees(np.arctan2(east, north)) % 360.0
+                out['elevation'][a:b] = np.where(visible, np.rint(np.degrees(np.nan_to_num(elev))), -1)
+                out['azimuth'][a:b] = np.where(visible, np.rint(np.nan_to_num(azim)) % 360, -1)
+                count = visible.sum(axis=1); out['sats'][a:b] = count
+                # DOP：G 的每行为 [-e, -n, -u, 1]，Q = (GᵀWG)⁻¹，W 为可见性 0/1；不足 4 颗的点加单位阵避免奇异，结果记为 99.9
+                g = np.stack((-east, -north, -up, np.ones_like(up)), axis=-1) * visible[..., None]
+                normal = np.einsum('bsi,bsj->bij', np.nan_to_num(g), np.nan_to_num(g)) + np.eye(4) * (count < 4)[:, None, None]
+                q = np.linalg.inv(normal)
+                ok = count >= 4
+                out['hdop'][a:b] = np.where(ok, np.minimum(np.sqrt(q[:, 0, 0] + q[:, 1, 1]), 99.9), 99.9)
+                out['vdop'][a:b] = np.where(ok, np.minimum(np.sqrt(q[:, 2, 2]), 99.9), 99.9)
+                out['pdop'][a:b] = np.where(ok, np.minimum(np.sqrt(q[:, 0, 0] + q[:, 1, 1] + q[:, 2, 2]), 99.9), 99.9)
+        return out
+
+def format_gsa_gsv_block(sky, prns):
+    """每个点输出一条 GPGSA 和若干条 GPGSV (每条 4 颗星)；载噪比按仰角粗略估算，仅用于显示。"""
+    bodies, prn_strs = [], ["{:02d}".format(p) for p in prns.tolist()]
+    for elev, azim, pdop, hdop, vdop in zip(sky['elevation'], sky['azimuth'], sky['pdop'].tolist(), sky['hdop'].tolist(), sky['vdop'].tolist()):
+        idx = np.flatnonzero(elev >= 0).tolist()
+        used = [prn_strs[k] for k in idx[:12]]
+        bodies.append("GPGSA,A,{},{},{:.1f},{:.1f},{:.1f}".format(3 if len(idx) >= 4 else 1, ','.join(used + [''] * (12 - len(used))), pdop, hdop, vdop))
+        elev_l, azim_l = elev.tolist(), azim.tolist()
+        sats = ["{},{:02d},{:03d},{:02d}".format(prn_strs[k], elev_l[k], azim_l[k], 20 + elev_l[k] * 25 // 90) for k in idx]
+        total = max(1, (len(sats) + 3) // 4)
+        for m in range(total):
+            bodies.append(','.join([f"GPGSV,{total},{m + 1},{len(sats):02d}"] + sats[4 * m:4 * m + 4]))
+    return finish_nmea_block(bodies)
+
+def parse_nav_start(text):
+    """--nav-start 与 gps-sdr-sim -t 相同的格式 YYYY/MM/DD,hh:mm:ss (UTC)。"""
+    return datetime.strptime(text, "%Y/%m/%d,%H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+# 时间相关的 GNSS 定位误差：真实接收机的误差随时间缓慢漂移，而不是每点独立。
+GNSS_ERROR_MODELS = ('gauss-markov', 'random-walk')
+
+class GnssErrorModel:
+    """
+    北/东/天三个分量相互独立的时间相关误差 (米)：
+    gauss-markov 为一阶高斯-马尔可夫过程 e[n] = β e[n-1] + w[n]，β = exp(-Δt/τ)，稳态标准差为 sigma；
+    random-walk 为随机游走 (β = 1)，sigma 表示经过 τ 秒后的标准差。
+    β 按相邻点的时间差逐点计算，整列用 ar1_filter 递推；上次的时间和误差状态保存在对象里，
+    分块多次调用 apply 与整条一次调用结果相同 (白噪声按点顺序抽取)。
+    """
+    def __init__(self, kind, sigma, vertical_sigma, tau, rng):
+        self.kind, self.tau, self.rng = kind, float(tau), rng
+        self.sigma = np.array([sigma, sigma, vertical_sigma], dtype=float)
+        self.last_time, self.state = None, None
+
+    def apply(self, cols):
+        """返回叠加误差后的新点列字典 (不修改输入)，起点之后的状态延续到下一次调用。"""
+        t = np.asarray(cols['time'], dtype=float)
+        if not len(t): return cols
+        if self.state is None:  # 高斯-马尔可夫从稳态分布起步，随机游走从 0 起步
+            self.last_time = t[0]
+            self.state = self.sigma * self.rng.standard_normal(3) if self.kind == 'gauss-markov' else np.zeros(3)
+        dt = np.maximum(np.diff(t, prepend=self.last_time), 0.0)
+        if self.kind == 'gauss-markov':
+            beta = np.maximum(np.exp(-dt / self.tau), math.exp(-30.0)); scale = np.sqrt(1.0 - beta * beta)
+        else: beta = np.ones_like(dt); scale = np.sqrt(dt / self.tau)
+        white = self.rng.standard_normal((len(t), 3)).T * self.sigma[:, None] * scale
+        (north, east, up), self.state = ar1_filter(white, beta, self.state)
+        self.last_time = t[-1]
+        out = dict(cols); lat = np.asarray(cols['lat'], dtype=float)
+        out['lat'] = lat + np.degrees(north / EARTH_RADIUS)
+        out['lon'] = np.asarray(cols['lon'], dtype=float) + np.degrees(east / (EARTH_RADIUS * np.cos(np.radians(lat))))
+        out['height'] = np.asarray(cols['height'], dtype=float) + up
+        return out
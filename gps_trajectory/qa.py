@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+轨迹质量检查 (--qa / gps_trajectory.analyze)：按块累加分布和异常计数，按运动模式门限判定。
+"""
+from .common import KNOTS_PER_METER_PER_SECOND, PROFILER, SPEED_MODES, LazyModule, calculate_bearing_array, calculate_distance_array
+from .core import nearest_speed_mode
+from .readers import TrajectoryChunkReader
+
+np = LazyModule('numpy', 'np', globals())
+
+
+# --- 轨迹质量检查 (--qa) ---
+# 按块读取已生成的轨迹 (CSV/GTB/NMEA/GPX)，每块整列计算后只累加计数和固定分箱的直方图，百万点级文件也只占一块的内存。
+# 速度/航向取文件里记录的值 (RMC/GTB)，没有记录时 (CSV/GGA/GPX) 由相隔 QA_BASELINE_S 秒的两点推出；加速度、转向角速度和
+# 升降速度同样按这个跨度计算，避免 10Hz 下 NMEA 度分 (约 0.2 米) 和时间 (0.01 秒) 的舍入被放大。连续量按运动模式的门限判 p99 (少数拐角、换挡点不影响)，
+# 时间重复/倒退、断档、跳点和非法坐标一个都不允许。
+QA_LIMITS = {  # 模式: (速度 p99 上限 m/s, 加速度 p99 上限 m/s², 转向角速度 p99 上限 °/s, 升降速度 p99 上限 m/s)
+    "1": (2.0, 1.6, 90.0, 2.0), "2": (4.5, 3.0, 60.0, 2.0), "3": (7.0, 4.0, 45.0, 2.5), "4": (20.0, 6.0, 30.0, 4.0)}
+QA_BASELINE_S = 1.0
+QA_GAP_FACTOR = 2.5          # 相邻点间隔超过标称间隔 (首块间隔的中位数) 的倍数视为断档
+QA_JUMP_FACTOR = 3.0         # 单步推算速度超过速度上限的倍数、且单步超过 QA_JUMP_MIN_M 米视为跳点
+QA_JUMP_MIN_M = 5.0
+QA_BEARING_JUMP_DEG = 30.0   # 移动中相邻两点航向变化超过该角度计为一次航向突变 (拐角也算，只统计不判定)
+QA_MAX_HEIGHT_DRIFT_M = 100.0
+QA_HIST_BINS = 4096          # 直方图覆盖 [0, 4 倍门限)，分位数误差不超过门限的 0.1%
+QA_METRICS = (('speed', "速度", "m/s"), ('accel', "加速度", "m/s²"), ('turn_rate', "转向角速度", "°/s"), ('vertical_rate', "升降速度", "m/s"))
+
+def wrap_degrees(delta):
+    """角度差折算到 [-180, 180)。"""
+    return (delta + 180.0) % 360.0 - 180.0
+
+class TrajectoryQA:
+    """
+    逐块 update() 一条轨迹的点列数组，report() 给出分布、异常计数和按运动模式门限的判定。mode 为 None 时按首块速度中位数选择；
+    derived_motion 表示文件没有记录速度/航向 (CSV、GGA、GPX)，这时二者按 QA_BASELINE_S 跨度的首尾连线计算。
+    """
+    def __init__(self, mode=None, derived_motion=False):
+        self.mode, self.derived_motion, self.step, self.window, self.carry, self.h0 = mode, derived_motion, None, None, None, None
+        self.counts = dict.fromkeys(('points', 'invalid', 'duplicates', 'backwards', 'gaps', 'jumps', 'bearing_jumps'), 0)
+        self.max_gap, self.max_height_drift, self.hist, self.peak = 0.0, 0.0, {}, {}
+
+    def _start(self, t, h):
+        dt = np.diff(t); dt = dt[dt > 0]
+        self.step = round(float(np.median(dt)), 6) if len(dt) else 1.0  # 标称间隔和自动模式都取自第一块 (默认 65536 点)
+        self.window = max(1, int(round(QA_BASELINE_S / self.step)))
+        self.h0 = float(h[0])
+
+    def _add(self, key, values):
+        values = values[np.isfinite(values)]
+        if not len(values): return
+        counts, width = self.hist[key]
+        counts += np.bincount(np.minimum((values / width).astype(np.int64), QA_HIST_BINS), minlength=QA_HIST_BINS + 1)
+        self.peak[key] = max(self.peak[key], float(values.max()))
+
+    def percentile(self, key, q):
+        """直方图分位数 (取所在箱的上沿，偏保守)；没有数据时为 0，落在最后一箱 (超出 4 倍门限) 时返回最大值。"""
+        counts, width = self.hist[key]; total = int(counts.sum())
+        if not total: return 0.0
+        index = int(np.searchsorted(np.cumsum(counts), q / 100.0 * total))
+        return self.peak[key] if index >= QA_HIST_BINS else min((index + 1) * width, self.peak[key])
+
+    def update(self, cols):
+        t, lat, lon, h, bearing = (np.asarray(cols[key], dtype=float) for key in ('time', 'lat', 'lon', 'height', 'bearing'))
+        speed = np.asarray(cols['speed_knots'], dtype=float) / KNOTS_PER_METER_PER_SECOND
+        if not len(t): return
+        if self.step is None: self._start(t, h)
+        self.counts['points'] += len(t)
+        self.counts['invalid'] += int(np.count_nonzero(~(np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180))))
+        self.max_height_drift = max(self.max_height_drift, float(np.max(np.abs(h - self.h0))))
+        # 接上前一块末尾的 2*window 个点 (跨度速度再取跨度差分)，各项只统计新出现的点和点对
+        c, w = 0, self.window
+        if self.carry is not None:
+            c = len(self.carry[0]); t, lat, lon, h, speed, bearing = (np.concatenate((old, new)) for old, new in zip(self.carry, (t, lat, lon, h, speed, bearing)))
+        self.carry = tuple(x[-2 * w:] for x in (t, lat, lon, h, speed, bearing))
+        span = np.full(len(t), np.nan); span[w:] = t[w:] - t[:-w]; span[span <= 0] = np.nan
+        if self.derived_motion:
+            speed, bearing = np.full(len(t), np.nan), np.full(len(t), np.nan)
+            speed[w:] = calculate_distance_array(lat[:-w], lon[:-w], lat[w:], lon[w:]) / span[w:]
+            bearing[w:] = calculate_bearing_array(lat[:-w], lon[:-w], lat[w:], lon[w:])
+        if self.mode is None: self.mode = nearest_speed_mode(float(np.nanmedian(speed)) if np.isfinite(speed).any() else 0.0)
+        if not self.hist:
+            for (key, _, _), limit in zip(QA_METRICS, QA_LIMITS[self.mode]):
+                self.hist[key], self.peak[key] = (np.zeros(QA_HIST_BINS + 1, dtype=np.int64), 4.0 * limit / QA_HIST_BINS), 0.0
+        max_speed = QA_LIMITS[self.mode][0]
+        self._add('speed', speed[c:])
+        # 相邻点：时间重复/倒退/断档、跳点、航向突变
+        s = max(c - 1, 0)
+        dt, dist = np.diff(t[s:]), calculate_distance_array(lat[s:-1], lon[s:-1], lat[s + 1:], lon[s + 1:])
+        self.counts['duplicates'] += int(np.count_nonzero(dt == 0)); self.counts['backwards'] += int(np.count_nonzero(dt < 0))
+        self.counts['gaps'] += int(np.count_nonzero(dt > QA_GAP_FACTOR * self.step))
+        if len(dt): self.max_gap = max(self.max_gap, float(dt.max()))
+        self.counts['jumps'] += int(np.count_nonzero((dist > QA_JUMP_MIN_M) & ((dt <= 0) | (dist > QA_JUMP_FACTOR * max_speed * np.maximum(dt, 0)))))
+        moving = speed > 0.5 * SPEED_MODES[self.mode][0]  # 静止时航向没有意义 (NaN 视为静止)
+        turn = np.abs(wrap_degrees(np.diff(bearing[s:])))
+        self.counts['bearing_jumps'] += int(np.count_nonzero((turn > QA_BEARING_JUMP_DEG) & moving[s:-1] & moving[s + 1:]))
+        # 跨度 window 的点对 (i-window, i)：加速度、转向角速度、升降速度
+        b = np.arange(max(c, w), len(t)); b = b[np.isfinite(span[b])]; a = b - w
+        self._add('accel', np.abs(speed[b] - speed[a]) / span[b])
+        both = moving[a] & moving[b]
+        self._add('turn_rate', np.abs(wrap_degrees(bearing[b] - bearing[a]))[both] / span[b][both])
+        self._add('vertical_rate', np.abs(h[b] - h[a]) / span[b])
+
+    def report(self):
+        """返回 {'mode', 'passed', 'checks': [(名称, 数值, 门限, 是否通过)], ...}。"""
+        if self.step is None: return {'mode': self.mode, 'passed': False, 'points': 0, 'checks': [("点数", 0, ">0", False)]}
+        distribution = {key: {**{f"p{q}": self.percentile(key, q) for q in (50, 95, 99)}, 'max': self.peak[key]} for key, _, _ in QA_METRICS}
+        checks = [(f"{label} p99 ({unit})", distribution[key]['p99'], limit, distribution[key]['p99'] <= limit)
+                  for (key, label, unit), limit in zip(QA_METRICS, QA_LIMITS[self.mode])]
+        checks.append(("高度漂移 (m)", self.max_height_drift, QA_MAX_HEIGHT_DRIFT_M, self.max_height_drift <= QA_MAX_HEIGHT_DRIFT_M))
+        for key, label in (('duplicates', "重复时间戳"), ('backwards', "时间倒退"), ('gaps', "时间断档"), ('jumps', "跳点"), ('invalid', "非法坐标")):
+            checks.append((label, self.counts[key], 0, self.counts[key] == 0))
+        return {'mode': self.mode, 'passed': all(ok for *_, ok in checks), 'step_seconds': self.step, 'baseline_points': self.window,
+                'max_gap_seconds': self.max_gap, 'max_height_drift_m': self.max_height_drift, **self.counts, 'distribution': distribution,
+                'checks': [{'name': name, 'value': value, 'limit': limit, 'passed': ok} for name, value, limit, ok in checks]}
+
+def analyze_trajectory(path, mode=None, coord=None):
+    """对一个轨迹文件做质量检查，返回 TrajectoryQA.report()。"""
+    reader = TrajectoryChunkReader(path, coord)
+    qa = TrajectoryQA(mode, derived_motion=reader.kind not in ('.gtb', 'RMC'))
+    with PROFILER.stage('qa') as st:
+        for cols in reader: qa.update(cols); st['points'] += len(cols['time'])
+    return qa.report()
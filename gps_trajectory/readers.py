@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+输入格式：CSV / NMEA 逐行解析，GPX / GeoJSON 流式导入，以及按块读取任意轨迹文件的 TrajectoryChunkReader 和抽稀。
+"""
+import array
+import contextlib
+import csv
+import math
+import os
+import re
+import tempfile
+from datetime import datetime, timezone, timedelta
+
+from .common import (
+    DEFAULT_HEIGHT, EARTH_RADIUS, KNOTS_PER_METER_PER_SECOND, LOGGER, OOC_CHUNK_POINTS, PROFILER, TRAJECTORY_COLUMNS, LazyModule, bd09_to_wgs84_array,
+    calculate_bearing_array, calculate_distance_array, gcj02_to_wgs84_array, require_numpy,
+)
+from .sinks import GtbWriter, gtb_records_to_columns, iter_batches, open_gtb
+
+np = LazyModule('numpy', 'np', globals())
+
+
+# --- KML转换模块 (无变化) ---
+def dmm_to_decimal(dmm_str, hemisphere):
+    dmm_val = float(dmm_str)
+    degrees = int(dmm_val / 100)
+    minutes = dmm_val - degrees * 100
+    decimal = degrees + minutes / 60.0
+    if hemisphere in ['S', 'W']: return -decimal
+    return decimal
+def csv_line_points(lines):
+    """逐点解析 time,lat,lon[,height] CSV 文本行 (生成器)；跳过表头和无法解析的行。"""
+    for i, row in enumerate(csv.reader(lines)):
+        if not row or len(row) < 3: continue
+        if not row[0].replace('.', '', 1).isdigit(): continue
+        try:
+            lon = float(row[2]); lat = float(row[1])
+            height = float(row[3]) if len(row) > 3 and row[3] else DEFAULT_HEIGHT
+        except (ValueError, IndexError): LOGGER.warning(f"  警告: 跳过CSV第 {i+1} 行: {row}"); continue
+        yield {'lon': lon, 'lat': lat, 'height': height}
+def gpgga_line_points(lines):
+    for line in lines:
+        if line.startswith('$GPGGA'):
+            parts = line.strip().split('*')[0].split(',')
+            if len(parts) > 10 and parts[2] and parts[4] and parts[9]:
+                lat = dmm_to_decimal(parts[2], parts[3]); lon = dmm_to_decimal(parts[4], parts[5]); height = float(parts[9])
+                yield {'lon': lon, 'lat': lat, 'height': height}
+def gprmc_line_points(lines):
+    for line in lines:
+        if line.startswith('$GPRMC'):
+            parts = line.strip().split('*')[0].split(',')
+            if len(parts) > 6 and parts[3] and parts[5]:
+                lat = dmm_to_decimal(parts[3], parts[4]); lon = dmm_to_decimal(parts[5], parts[6])
+                yield {'lon': lon, 'lat': lat, 'height': DEFAULT_HEIGHT}
+def iter_csv_points(filepath):
+    """逐点读取 time,lat,lon[,height] CSV (生成器)；-k 按块转换时不把整个文件读进列表。"""
+    try:
+        with open(filepath, 'r', encoding='utf-8-sig') as f: yield from csv_line_points(f)
+    except Exception as e: LOGGER.error(f"解析CSV文件 '{filepath}' 出错: {e}")
+def iter_gpgga_points(filepath):
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f: yield from gpgga_line_points(f)
+    except Exception as e: LOGGER.error(f"解析GPGGA文件 '{filepath}' 出错: {e}")
+def iter_gprmc_points(filepath):
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f: yield from gprmc_line_points(f)
+    except Exception as e: LOGGER.error(f"解析GPRMC文件 '{filepath}' 出错: {e}")
+def parse_csv_to_points(filepath): return list(iter_csv_points(filepath))
+def parse_gpgga_to_points(filepath): return list(iter_gpgga_points(filepath))
+def parse_gprmc_to_points(filepath): return list(iter_gprmc_points(filepath))
+KML_INPUT_MESSAGES = {'csv': "检测到 CSV 文件，将按 time,lat,lon 格式解析...", 'GGA': "检测到 GPGGA 格式...", 'RMC': "检测到 GPRMC 格式..."}
+KML_LINE_PARSERS = {'csv': csv_line_points, 'GGA': gpgga_line_points, 'RMC': gprmc_line_points}
+def kml_input_kind(input_file):
+    """-k 输入类型：'route' (GPX/GeoJSON)、'gtb'、'csv'、'GGA'、'RMC'，无法识别时为 None。"""
+    file_ext = os.path.splitext(input_file)[1].lower()
+    if file_ext in ('.gpx', '.geojson', '.json'): return 'route'
+    if file_ext in ('.gtb', '.csv'): return file_ext[1:]
+    with open(input_file, 'r', encoding='utf-8') as f: first_line = f.readline().strip()
+    return 'GGA' if first_line.startswith('$GPGGA') else 'RMC' if first_line.startswith('$GPRMC') else None
+
+
+# --- 通用轨迹读取：CSV / GTB / NMEA / GPX 统一按块读成点列数组 ---
+def derive_motion_columns(cols):
+    """由相邻点的位置和时间补出 speed_knots 与 bearing 列 (每点取到下一点的方向，最后一点沿用前一点)。"""
+    lat, lon, t = (np.asarray(cols[k], dtype=float) for k in ('lat', 'lon', 'time'))
+    speed, bearing = np.zeros(len(t)), np.zeros(len(t))
+    if len(t) > 1:
+        dist = calculate_distance_array(lat[:-1], lon[:-1], lat[1:], lon[1:]); dt = np.diff(t)
+        speed[1:] = np.divide(dist, dt, out=np.zeros_like(dist), where=dt > 0) * KNOTS_PER_METER_PER_SECOND
+        bearing[:-1] = calculate_bearing_array(lat[:-1], lon[:-1], lat[1:], lon[1:]); bearing[-1] = bearing[-2]
+    cols['speed_knots'], cols['bearing'] = speed, bearing
+    return cols
+
+def derive_motion_chunks(chunks):
+    """derive_motion_columns 的分块版本：每块最后一点的航向要等下一块的首点，因此延后一点输出；结果与整列计算相同。"""
+    carry, last = None, None
+    for cols in chunks:
+        cols = {key: np.asarray(cols[key], dtype=float) for key in ('time', 'lat', 'lon', 'height')}
+        if not len(cols['time']): continue
+        skip = 0 if carry is None else len(carry['time']) - 1  # carry 中只有最后一点还没输出
+        if carry is not None: cols = {key: np.concatenate((carry[key], values)) for key, values in cols.items()}
+        carry = {key: values[-2:] for key, values in cols.items()}
+        last = derive_motion_columns(cols)
+        if len(cols['time']) - 1 > skip: yield {key: values[skip:-1] for key, values in last.items()}
+    if last is not None: yield {key: values[-1:] for key, values in last.items()}
+
+# --- GPX / GeoJSON 流式导入 ---
+# 两种格式都边读边解析，点直接追加到 array('d') (每个值 8 字节)，内存只随点数增长、与文件大小和嵌套结构无关。
+# 返回的点列字典带 'coord' 标记 (gcj02/bd09/wgs84)，由 to_wgs84_columns 统一转换后进入原有的生成/转换流程。
+IMPORT_CHUNK_BYTES = 1 << 20
+GEOJSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|"|\[|\]|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+
+def coord_tag_from_text(text, default='wgs84'):
+    """从 GPX creator / GeoJSON crs 名称里识别坐标系，认不出时按规范视为 WGS-84。"""
+    text = (text or '').lower()
+    if 'gcj' in text or 'amap' in text or 'gaode' in text: return 'gcj02'
+    if 'bd09' in text or 'baidu' in text: return 'bd09'
+    return default
+
+def gpx_time_to_epoch(text):
+    """GPX <time> 转为 Unix 秒；没有时区后缀的时间按 UTC 处理 (GPX 1.1 规定为 UTC)，不同机器上读出的结果相同。"""
+    when = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    return (when.replace(tzinfo=timezone.utc) if when.tzinfo is None else when).timestamp()
+
+def read_gpx_columns(filepath):
+    """iterparse 流式读取 GPX：有 trkpt 时取轨迹点，否则取 rtept，再否则取 wpt。返回带 time (秒，全部点有时间时) 的点列字典。"""
+    import xml.etree.ElementTree as ET
+    kinds = {kind: [array.array('d') for _ in range(4)] for kind in ('trkpt', 'rtept', 'wpt')}
+    creator, parents = '', []
+    for event, elem in ET.iterparse(filepath, events=('start', 'end')):
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            if not parents: creator = elem.get('creator', '')
+            parents.append(elem); continue
+        parents.pop()
+        if tag not in kinds: continue
+        lat, lon, ele, when = elem.get('lat'), elem.get('lon'), None, None
+        for child in elem:
+            name = child.tag.rsplit('}', 1)[-1]
+            if name == 'ele' and child.text: ele = float(child.text)
+            elif name == 'time' and child.text: when = gpx_time_to_epoch(child.text)
+        if lat is not None and lon is not None:
+            for column, value in zip(kinds[tag], (float(lat), float(lon), DEFAULT_HEIGHT if ele is None else ele, math.nan if when is None else when)): column.append(value)
+        if parents: parents[-1].remove(elem)  # 已处理的点立即从树上摘除，内存不随文件大小增长
+    lat, lon, height, epoch = next((columns for columns in kinds.values() if len(columns[0])), kinds['wpt'])
+    cols = {'lat': np.frombuffer(lat), 'lon': np.frombuffer(lon), 'height': np.frombuffer(height), 'coord': coord_tag_from_text(creator)}
+    epoch = np.frombuffer(epoch)
+    if len(epoch) and not np.isnan(epoch).any():
+        cols['time'], cols['utc_start_time'] = epoch - epoch[0], datetime.fromtimestamp(epoch[0], timezone.utc)
+    return cols
+
+def read_geojson_columns(filepath):
+    """按 1MB 分块扫描 GeoJSON 的 "coordinates" 数组，依次取出每个位置 [经度, 纬度(, 高度)]，不把整个文档读进内存。"""
+    lon, lat, height = array.array('d'), array.array('d'), array.array('d')
+    crs, pending, base_depth, depth, numbers, carry = None, False, None, 0, [], ''
+    with open(filepath, 'r', encoding='utf-8-sig') as f:
+        while True:
+            chunk = f.read(IMPORT_CHUNK_BYTES); eof = not chunk; text = carry + chunk; carry = ''
+            if not eof:  # 块尾的数字可能只读到 "-"、"12."、"1e-" 之类的前半截 (正则会把它当成更短的数)，连同其后内容留到下一块
+                body = text.rstrip('+-.0123456789eE'); carry, text = text[len(body):], body
+            if crs is None: match = re.search(r'"crs"\s*:\s*\{.*?"name"\s*:\s*"([^"]*)"', text, re.S); crs = match.group(1) if match else crs
+            for match in GEOJSON_TOKEN.finditer(text):
+                token = match.group()
+                if not eof and (token == '"' or match.end() == len(text)): carry = text[match.start():] + carry; break  # 记号被分块截断，留到下一块
+                if token == '"coordinates"': pending = True
+                elif token == '[':
+                    depth += 1
+                    if pending: base_depth, pending = depth, False
+                elif token == ']':
+                    if base_depth is not None and numbers:
+                        lon.append(numbers[0]); lat.append(numbers[1]); height.append(numbers[2] if len(numbers) > 2 else DEFAULT_HEIGHT); numbers = []
+                    if depth == base_depth: base_depth = None
+                    depth -= 1
+                elif base_depth is not None and token[0] != '"': numbers.append(float(token))
+            if eof: break
+    return {'lat': np.frombuffer(lat), 'lon': np.frombuffer(lon), 'height': np.frombuffer(height), 'coord': coord_tag_from_text(crs)}
+
+def to_wgs84_columns(cols, coord=None):
+    """按 coord (未指定时用文件自带的标记) 把 lat/lon 列转换为 WGS-84，并把标记改为 wgs84。"""
+    coord = coord or cols.get('coord', 'wgs84')
+    if coord != 'wgs84':
+        convert = gcj02_to_wgs84_array if coord == 'gcj02' else bd09_to_wgs84_array
+        cols['lon'], cols['lat'] = convert(cols['lon'], cols['lat'])
+    cols['coord'] = 'wgs84'
+    return cols
+
+def import_route_columns(filepath, coord=None):
+    """读取 .gpx / .geojson / .json 并转换为 WGS-84 点列字典。"""
+    require_numpy("GPX/GeoJSON 导入")
+    ext = os.path.splitext(filepath)[1].lower()
+    cols = read_gpx_columns(filepath) if ext == '.gpx' else read_geojson_columns(filepath)
+    return to_wgs84_columns(cols, coord)
+
+# --- 分块 (外存) 处理 ---
+# 周级 10Hz 的轨迹放不进内存：读取、转换、抽稀和导出都按 OOC_CHUNK_POINTS 个点一块进行；需要多遍扫描的流程
+# (--replay、--split) 先把输入转成 f8 编码的临时 .gtb (spool)，之后按窗口从 np.memmap 读取。跨块的量 (最后一点的航向、
+# 误差模型状态、重采样的插值区间) 由相邻块传递，结果与整列计算一致，工作集只与块大小有关。
+
+def column_windows(cols, size=OOC_CHUNK_POINTS):
+    """把已在内存中的点列字典按 size 个点一块切成视图。"""
+    keys = [key for key in TRAJECTORY_COLUMNS if key in cols]
+    for lo in range(0, len(cols[keys[0]]), size): yield {key: cols[key][lo:lo + size] for key in keys}
+
+class TrajectoryChunkReader:
+    """
+    按块读取 .gtb、.csv (time,lat,lon[,height])、带时间的 GPX 或 GPGGA/GPRMC 文本，依次产出含 TRAJECTORY_COLUMNS 的点列字典，
+    缺少的 speed_knots / bearing 由相邻点补出。NMEA 时间为相对首点的秒数，跨零点自动顺延。
+    utc_start_time 在产出第一块后确定 (.csv 没有 UTC 信息，为 None)。
+    """
+    def __init__(self, filepath, coord=None, chunk_points=OOC_CHUNK_POINTS):
+        require_numpy("读取轨迹数组")
+        self.filepath, self.coord, self.chunk_points, self.utc_start_time = filepath, coord, chunk_points, None
+        self.kind = os.path.splitext(filepath)[1].lower()
+        if self.kind not in ('.gtb', '.gpx', '.csv'):
+            with open(filepath, 'r', encoding='utf-8', errors='replace') as f: first_line = f.readline().strip()
+            if first_line[3:6] not in ('GGA', 'RMC') or not first_line.startswith('$'): raise ValueError(f"无法识别文件 '{filepath}' 的格式")
+            self.kind = first_line[3:6]
+
+    def __iter__(self):
+        if self.kind == '.gtb':
+            header, records, _ = open_gtb(self.filepath); self.utc_start_time = header['utc_start_time']
+            for lo in range(0, header['points'], self.chunk_points): yield gtb_records_to_columns(records[lo:lo + self.chunk_points], header['encoding'])
+        elif self.kind == '.gpx':
+            cols = import_route_columns(self.filepath, self.coord)  # GPX 用 iterparse 整个读入 (每点 32 字节)，再按块处理
+            if 'time' not in cols: raise ValueError(f"GPX 文件 '{self.filepath}' 中的点没有完整的时间戳")
+            self.utc_start_time = cols['utc_start_time']
+            yield from derive_motion_chunks(column_windows(cols, self.chunk_points))
+        elif self.kind == '.csv': yield from derive_motion_chunks(self._csv_chunks())
+        elif self.kind == 'RMC': yield from self._nmea_chunks()
+        else: yield from derive_motion_chunks(self._nmea_chunks())
+
+    def _csv_chunks(self):
+        def rows(reader):
+            for row in reader:
+                if len(row) < 3 or not row[0].replace('.', '', 1).isdigit(): continue
+                try: yield (float(row[0]), float(row[1]), float(row[2]), float(row[3]) if len(row) > 3 and row[3] else DEFAULT_HEIGHT)
+                except ValueError: continue
+        with open(self.filepath, 'r', encoding='utf-8-sig') as f:
+            for batch in iter_batches(rows(csv.reader(f)), self.chunk_points):
+                yield dict(zip(('time', 'lat', 'lon', 'height'), np.asarray(batch, dtype=float).T.copy()))
+
+    def _nmea_chunks(self):
+        sentence, date, first, previous, day_offset = self.kind, None, None, None, 0.0
+        def rows(f):
+            nonlocal date
+            for line in f:
+                if line[3:6] != sentence or not line.startswith('$'): continue
+                parts = line.strip().split('*')[0].split(',')
+                try:
+                    if sentence == 'GGA' and len(parts) > 9 and parts[1] and parts[2] and parts[4]:
+                        lat, lon = dmm_to_decimal(parts[2], parts[3]), dmm_to_decimal(parts[4], parts[5])
+                        height, speed, course = float(parts[9]) if parts[9] else DEFAULT_HEIGHT, 0.0, 0.0
+                    elif sentence == 'RMC' and len(parts) > 9 and parts[1] and parts[3] and parts[5]:
+                        lat, lon = dmm_to_decimal(parts[3], parts[4]), dmm_to_decimal(parts[5], parts[6])
+                        height, speed, course = DEFAULT_HEIGHT, float(parts[7] or 0), float(parts[8] or 0); date = date or parts[9]
+                    else: continue
+                except ValueError: continue
+                hms = parts[1]
+                yield (int(hms[:2]) * 3600 + int(hms[2:4]) * 60 + float(hms[4:]), lat, lon, height, speed, course)
+        with open(self.filepath, 'r', encoding='utf-8', errors='replace') as f:
+            for batch in iter_batches(rows(f), self.chunk_points):
+                tod, lat, lon, height, speed, course = np.asarray(batch, dtype=float).T.copy()
+                if first is None:
+                    first = float(tod[0])
+                    day = datetime.strptime(date, "%d%m%y").replace(tzinfo=timezone.utc) if date else datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+                    self.utc_start_time = day + timedelta(seconds=first)
+                wraps = np.diff(tod, prepend=tod[0] if previous is None else previous) < -43200  # 时间倒退超过半天视为跨过 UTC 零点
+                day_offsets = day_offset + np.cumsum(wraps) * 86400.0; day_offset, previous = float(day_offsets[-1]), float(tod[-1])
+                cols = {'time': tod + day_offsets - first, 'lat': lat, 'lon': lon, 'height': height}
+                if sentence == 'RMC': cols['speed_knots'], cols['bearing'] = speed, course
+                yield cols
+
+@contextlib.contextmanager
+def spooled_trajectory(filepath, coord=None, spool_dir='.'):
+    """
+    产出一个可按窗口 memmap 读取的 .gtb 路径：输入本身是 .gtb 时直接使用，否则按块转换成 spool_dir 下的临时 f8 .gtb
+    (带时间索引)，退出时删除。调用方应在单独的函数里打开映射，使映射在删除前已释放 (Windows 不能删除仍被映射的文件)。
+    """
+    if os.path.splitext(filepath)[1].lower() == '.gtb': yield filepath; return
+    reader = TrajectoryChunkReader(filepath, coord)
+    fd, path = tempfile.mkstemp(suffix='.gtb', prefix='.spool-', dir=spool_dir); os.close(fd)
+    try:
+        writer = GtbWriter(path, 'f8')
+        try:
+            with PROFILER.stage('parse') as st:
+                for cols in reader: writer.append(cols)
+                st['points'] = writer.n
+        finally: writer.utc_start_time = reader.utc_start_time; writer.close()
+        yield path
+    finally:
+        try: os.remove(path)
+        except OSError as e: LOGGER.warning(f"警告: 无法删除临时文件 '{path}': {e}")
+
+def gtb_time_at(header, records, i):
+    return float(gtb_records_to_columns(records[i:i + 1], header['encoding'])['time'][0])
+
+def simplify_mask(lat, lon, tolerance_m):
+    """Douglas-Peucker 抽稀 (以首点为原点的局部平面近似)，返回保留点的布尔掩码，首末点总是保留。"""
+    n = len(lat); keep = np.zeros(n, dtype=bool); keep[[0, -1]] = True
+    y = np.radians(lat - lat[0]) * EARTH_RADIUS; x = np.radians(lon - lon[0]) * EARTH_RADIUS * math.cos(math.radians(lat[0]))
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2: continue
+        dx, dy = x[j] - x[i], y[j] - y[i]; px, py = x[i + 1:j] - x[i], y[i + 1:j] - y[i]
+        length2 = dx * dx + dy * dy
+        u = np.clip((px * dx + py * dy) / length2, 0.0, 1.0) if length2 > 0 else 0.0  # 到线段 (而不是直线) 的距离
+        offset = np.hypot(px - u * dx, py - u * dy); k = int(np.argmax(offset))
+        if offset[k] > tolerance_m: k += i + 1; keep[k] = True; stack += [(i, k), (k, j)]
+    return keep
+
+def simplify_chunks(chunks, tolerance_m):
+    """
+    分窗口抽稀：每个窗口接在上一窗口最后一个点 (已输出) 之后做 Douglas-Peucker，窗口末点强制保留，
+    因此每个原始点到抽稀后折线的距离都不超过 tolerance_m，内存只与窗口大小有关。
+    """
+    anchor = None
+    for cols in chunks:
+        window = {key: np.asarray(cols[key], dtype=float) for key in ('lat', 'lon', 'height')}
+        if not len(window['lat']): continue
+        if anchor is not None: window = {key: np.concatenate((anchor[key], values)) for key, values in window.items()}
+        keep = simplify_mask(window['lat'], window['lon'], tolerance_m)
+        if anchor is not None: keep[0] = False
+        anchor = {key: values[-1:] for key, values in window.items()}
+        yield {key: values[keep] for key, values in window.items()}
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP 生成服务 (--serve，配合 index.html 选点页面)。http.server、进程池和 multiprocessing 在启动服务时才导入。
+"""
+import json
+import os
+import queue
+import traceback
+from datetime import datetime, timezone
+
+from .cache import TrajectoryCache
+from .common import DEFAULT_HEIGHT, DEFAULT_MOTION_ENGINE, SPEED_MODES, TIME_STEP, bd09_to_wgs84, gcj02_to_wgs84, require_numpy
+from .core import MOTION_ENGINES, iter_route_columns, parse_speed_range, resolve_speed_ranges
+from .sinks import GPX_FOOTER, KML_FOOTER, format_csv_block, format_gpgga_block, format_gprmc_block, format_gpx_block, gpx_header, kml_header, start_row_columns
+
+
+# --- 本地 HTTP 生成服务 (配合 index.html 选点页面) ---
+# HTTP 线程只负责收发，生成和格式化在常驻的工作进程池中完成：
+# 每个工作进程只启动一次，模块、numpy 和结果缓存在请求之间保持热状态。
+SERVE_FORMATS = {'csv': ('text/csv; charset=utf-8', '.csv'), 'gprmc': ('text/plain; charset=utf-8', '_gprmc.txt'),
+                 'gpgga': ('text/plain; charset=utf-8', '_gpgga.txt'), 'kml': ('application/vnd.google-earth.kml+xml', '.kml'),
+                 'gpx': ('application/gpx+xml', '.gpx')}
+SERVE_COORD_SYSTEMS = {'gcj02': gcj02_to_wgs84, 'bd09': bd09_to_wgs84, 'wgs84': lambda lng, lat: (lng, lat)}
+SERVE_CHUNK_ROWS = 5000
+_worker_cache = None
+
+def init_generation_worker(cache_dir, cache_bytes):
+    global _worker_cache
+    if cache_dir: _worker_cache = TrajectoryCache(cache_dir, cache_bytes)
+
+def render_trajectory_chunks(start_row, column_chunks, fmt, utc_start_time, chunk_rows=SERVE_CHUNK_ROWS):
+    """把依次产出的点列数组 (如 iter_route_columns 的各段) 按 chunk_rows 分块渲染为输出文本，与命令行写出的文件内容一致 (CSV、KML 和 GPX 含起点)。"""
+    blocks = ({k: v[i:i + chunk_rows] for k, v in cols.items()} for cols in column_chunks for i in range(0, len(cols['time']), chunk_rows))
+    if fmt == 'csv':
+        yield format_csv_block({k: [v] for k, v in zip(('time', 'lat', 'lon', 'height'), start_row)})
+        for block in blocks: yield format_csv_block(block)
+    elif fmt in ('gprmc', 'gpgga'):
+        formatter = format_gprmc_block if fmt == 'gprmc' else format_gpgga_block
+        for block in blocks: yield ''.join(s + '\n' for s in formatter(block, utc_start_time))
+    elif fmt == 'gpx':
+        yield gpx_header("Generated Track") + format_gpx_block(start_row_columns(start_row), utc_start_time)
+        for block in blocks: yield format_gpx_block(block, utc_start_time)
+        yield GPX_FOOTER
+    else:
+        yield kml_header("Generated Track") + f"{start_row[2]:.8f},{start_row[1]:.8f},{start_row[3]:.3f}"
+        for block in blocks:
+            yield ''.join(map("\n          {:.8f},{:.8f},{:.3f}".format, block['lon'].tolist(), block['lat'].tolist(), block['height'].tolist()))
+        yield KML_FOOTER
+
+SERVE_QUEUE_CHUNKS = 8  # 工作进程最多领先发送线程的分块数 (背压：浏览器收得慢时生成也跟着暂停)
+
+def prepare_generation_job(request):
+    """
+    校验页面提交的 JSON：
+    {"markers": [{"lng":..., "lat":..., "speed": 1-4}, ...], "format": "csv|gprmc|gpgga|kml|gpx",
+     "coord": "gcj02|bd09|wgs84", "speed": "10-15", "seed": 42, "rate": 1, "engine": "bearing-walk"}
+    返回 (文件名, Content-Type, 文本分块生成器)，生成器每生成一段路线就渲染产出；请求内容无效时抛出 ValueError。
+    """
+    if not isinstance(request, dict): raise ValueError("请求内容必须是 JSON 对象")
+    fmt = request.get('format', 'csv')
+    if fmt not in SERVE_FORMATS: raise ValueError(f"不支持的格式 '{fmt}'")
+    convert = SERVE_COORD_SYSTEMS.get(request.get('coord', 'gcj02'))
+    if convert is None: raise ValueError(f"不支持的坐标系 '{request.get('coord')}'")
+    custom_speed_range = parse_speed_range(str(request['speed'])) if request.get('speed') else None
+    markers = request.get('markers') or []
+    if not isinstance(markers, list) or not all(isinstance(marker, dict) for marker in markers): raise ValueError("markers 必须是 JSON 对象数组")
+    waypoints = []
+    for marker in markers:
+        lng, lat = convert(float(marker.get('lng', marker.get('经度'))), float(marker.get('lat', marker.get('纬度'))))
+        mode = str(marker.get('speed', marker.get('速度', ''))).strip()
+        waypoints.append({'lon': lng, 'lat': lat, 'mode': mode if mode in SPEED_MODES and not custom_speed_range else None})
+    if len(waypoints) < 2: raise ValueError("至少需要两个标记点")
+    rate = float(request.get('rate', 1.0 / TIME_STEP))
+    if rate <= 0: raise ValueError("采样频率必须大于 0")
+    seed = int(request['seed']) if request.get('seed') is not None else None
+    engine = request.get('engine') or DEFAULT_MOTION_ENGINE
+    if engine not in MOTION_ENGINES: raise ValueError(f"不支持的运动引擎 '{engine}'")
+    start_row = (0.0, waypoints[0]['lat'], waypoints[0]['lon'], DEFAULT_HEIGHT)
+    column_chunks = iter_route_columns(waypoints, resolve_speed_ranges(waypoints, custom_speed_range), seed, 1.0 / rate, _worker_cache, engine=engine)
+    content_type, suffix = SERVE_FORMATS[fmt]
+    return f"trajectory{suffix}", content_type, render_trajectory_chunks(start_row, column_chunks, fmt, datetime.now(timezone.utc))
+
+def run_generation_job(request, channel):
+    """
+    工作进程入口，结果经 channel (Manager 队列) 逐条交给 HTTP 线程：校验通过后先放 ('head', 文件名, Content-Type)，
+    之后每渲染好一块放 ('data', 字节)，最后放 ('end',)；请求无效时只放 ('error', 400, 原因)，生成中出错时放 ('error', 500, 原因)。
+    """
+    try: filename, content_type, chunks = prepare_generation_job(request)
+    except (ValueError, KeyError, TypeError) as e: channel.put(('error', 400, str(e))); return
+    channel.put(('head', filename, content_type))
+    try:
+        for chunk in chunks:
+            if chunk: channel.put(('data', chunk.encode('utf-8')))
+    except Exception as e: traceback.print_exc(); channel.put(('error', 500, str(e))); return
+    channel.put(('end',))
+
+def generation_request_handler():
+    """构造 HTTP 请求处理类 (http.server 只在 --serve 时导入)。"""
+    from http.server import BaseHTTPRequestHandler
+
+    class GenerationRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        executor, manager = None, None
+        # 允许跨域访问的来源：从本地文件打开的 index.html (Origin 为 null) 和 --serve-origin 指定的来源；本服务自己的页面是同源，不需要 CORS。
+        # 其他网页发来的请求一律拒绝，避免用户浏览的任意网站借本机服务占用 CPU
+        allowed_origins = {'null', 'file://'}
+        page_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "index.html")
+
+        def request_origin_allowed(self):
+            origin, port = self.headers.get('Origin'), self.server.server_address[1]
+            return origin is None or origin in self.allowed_origins or origin in (f"http://127.0.0.1:{port}", f"http://localhost:{port}")
+
+        def send_cors_headers(self):
+            origin = self.headers.get('Origin')
+            self.send_header("Vary", "Origin")
+            if origin not in self.allowed_origins: return
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type")
+            self.send_header("Access-Control-Expose-Headers", "Content-Disposition")  # 页面按它取下载文件名
+
+        def send_json_error(self, status, message):
+            body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+            self.send_response(status); self.send_cors_headers()
+            self.send_header("Content-Type", "application/json; charset=utf-8"); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def do_OPTIONS(self):
+            if not self.request_origin_allowed(): self.send_json_error(403, "origin not allowed"); return
+            self.send_response(204); self.send_cors_headers(); self.send_header("Content-Length", "0"); self.end_headers()
+
+        def do_GET(self):
+            if self.path not in ('/', '/index.html') or not os.path.exists(self.page_path): self.send_json_error(404, "not found"); return
+            with open(self.page_path, 'rb') as f: body = f.read()
+            self.send_response(200); self.send_header("Content-Type", "text/html; charset=utf-8"); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def next_message(self, channel, future):
+            """取工作进程的下一条消息；工作进程异常退出 (队列再也不会有消息) 时抛出异常。"""
+            while True:
+                try: return channel.get(timeout=1.0)
+                except queue.Empty:
+                    if future.done(): future.result(); raise RuntimeError("工作进程没有返回结果")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))  # 先读完请求体，拒绝时连接上也不会残留数据
+            if self.path != '/generate': self.send_json_error(404, "not found"); return
+            if not self.request_origin_allowed(): self.send_json_error(403, "origin not allowed"); return
+            try:
+                request = json.loads(body.decode('utf-8'))
+                channel = self.manager.Queue(SERVE_QUEUE_CHUNKS)
+                future = self.executor.submit(run_generation_job, request, channel)
+                message = self.next_message(channel, future)
+            except ValueError as e: self.send_json_error(400, str(e)); return
+            except Exception as e: traceback.print_exc(); self.send_json_error(500, str(e)); return
+            if message[0] == 'error': self.send_json_error(message[1], message[2]); return
+            # 工作进程每生成一段路线就渲染并送来一块，这里收到一块发一块 (分块传输编码)，大轨迹不必等全部生成完
+            self.send_response(200); self.send_cors_headers()
+            self.send_header("Content-Type", message[2]); self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Content-Disposition", f'attachment; filename="{message[1]}"')
+            self.end_headers()
+            connected = True
+            while True:
+                try: message = self.next_message(channel, future)
+                except Exception: traceback.print_exc(); message = ('error', 500, '')
+                if message[0] != 'data': break
+                if not connected: continue  # 浏览器已断开：继续取完队列，让工作进程结束这个任务
+                try: self.wfile.write(b"%X\r\n%s\r\n" % (len(message[1]), message[1])); self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError): connected = False
+            if connected and message[0] == 'end': self.wfile.write(b"0\r\n\r\n")
+            else: self.close_connection = True  # 生成中途出错：不写结束块，浏览器会把响应当作不完整
+
+    return GenerationRequestHandler
+
+def run_generation_server(args):
+    require_numpy("本地生成服务 (--serve)")
+    workers = args.workers or os.cpu_count() or 1
+    cache_dir, cache_bytes = args.cache, int(args.cache_size * 1024 * 1024)
+    from concurrent.futures import ProcessPoolExecutor
+    from http.server import ThreadingHTTPServer
+    from multiprocessing import Manager
+    handler = generation_request_handler()
+    handler.allowed_origins = handler.allowed_origins | set(args.serve_origin or [])
+    with Manager() as manager, ProcessPoolExecutor(max_workers=workers, initializer=init_generation_worker, initargs=(cache_dir, cache_bytes)) as executor:
+        handler.executor, handler.manager = executor, manager
+        server = ThreadingHTTPServer(('127.0.0.1', args.serve), handler)
+        print(f"--- 本地生成服务 --- http://127.0.0.1:{args.serve}/ ({workers} 个工作进程{'，缓存目录 ' + cache_dir if cache_dir else ''})")
+        print("在浏览器中打开上面的地址选点后点击“生成轨迹”，按 Ctrl+C 退出。")
+        try: server.serve_forever()
+        except KeyboardInterrupt: print("\n服务已停止。")
+        finally: server.server_close()
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+输出格式：CSV / NMEA (GGA、RMC 及 --nmea 语句集) / GPX / KML / KMZ 的逐点和整块格式化、流式写入器，以及二进制轨迹格式 .gtb。
+只依赖 common，不加载生成代码，可以单独用来把任意点列数组写成各种格式。
+"""
+import itertools
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timezone, timedelta
+
+from .common import KNOTS_PER_METER_PER_SECOND, LOGGER, TRAJECTORY_COLUMNS, LazyModule
+
+np = LazyModule('numpy', 'np', globals())
+
+
+# --- 数据格式化与写入模块 (无变化) ---
+def nmea_checksum(sentence_body):
+    checksum = 0;
+    for char in sentence_body: checksum ^= ord(char)
+    return f"{checksum:02X}"
+def decimal_to_dmm(degrees, is_lat):
+    is_negative = degrees < 0; degrees = abs(degrees)
+    d = int(degrees); m = (degrees - d) * 60
+    if is_lat: return f"{d:02d}{m:07.4f}", 'S' if is_negative else 'N'
+    else: return f"{d:03d}{m:07.4f}", 'W' if is_negative else 'E'
+def create_gpgga_sentence(p):
+    # 时间格式会自动处理 .00
+    time_str = p['utc_time'].strftime("%H%M%S.%f")[:9]
+    lat_dmm, lat_hem = decimal_to_dmm(p['lat'], True); lon_dmm, lon_hem = decimal_to_dmm(p['lon'], False)
+    body = f"GPGGA,{time_str},{lat_dmm},{lat_hem},{lon_dmm},{lon_hem},1,12,0.8,{p['height']:.1f},M,,M,,"
+    return f"${body}*{nmea_checksum(body)}"
+def create_gprmc_sentence(p):
+    time_str = p['utc_time'].strftime("%H%M%S.%f")[:9]; date_str = p['utc_time'].strftime("%d%m%y")
+    lat_dmm, lat_hem = decimal_to_dmm(p['lat'], True); lon_dmm, lon_hem = decimal_to_dmm(p['lon'], False)
+    body = f"GPRMC,{time_str},A,{lat_dmm},{lat_hem},{lon_dmm},{lon_hem},{p['speed_knots']:.2f},{p['bearing']:.2f},{date_str},,"
+    return f"${body}*{nmea_checksum(body)}"
+
+# 【新增】整块格式化：输入为点列数组字典 (time/lat/lon/height/speed_knots/bearing)，
+# 输出与上面逐点函数逐字节一致，但时间、度分转换和校验和都按整列计算
+def utc_time_parts(utc_start_time, times, date_format):
+    """把相对秒数整列换算为 UTC：返回 (时, 分, 秒, 微秒, 日期字符串) 五个列表，日期按天只 strftime 一次。"""
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    base_us = (utc_start_time - epoch) // timedelta(microseconds=1)
+    total_us = base_us + np.rint(np.asarray(times, dtype=float) * 1e6).astype(np.int64)
+    days, tod = np.divmod(total_us, 86400 * 10**6)
+    secs, us = np.divmod(tod, 10**6)
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    day_strs = [(epoch + timedelta(days=int(d))).strftime(date_format) for d in unique_days]
+    return (secs // 3600).tolist(), (secs // 60 % 60).tolist(), (secs % 60).tolist(), us.tolist(), [day_strs[i] for i in inverse.reshape(-1).tolist()]
+
+def iso_time_fields(utc_start_time, times):
+    """返回 ISO 8601 时间字符串列表 (YYYY-MM-DDTHH:MM:SS.sssZ)，与 NMEA 共用同一套整列换算。"""
+    hours, minutes, seconds, us, dates = utc_time_parts(utc_start_time, times, "%Y-%m-%d")
+    return list(map("{}T{:02d}:{:02d}:{:02d}.{:03d}Z".format, dates, hours, minutes, seconds, [u // 1000 for u in us]))
+
+def dmm_fields(degrees, is_lat):
+    degrees = np.asarray(degrees, dtype=float); magnitude = np.abs(degrees)
+    d = np.floor(magnitude); m = (magnitude - d) * 60
+    fmt = "{:02d}{:07.4f}" if is_lat else "{:03d}{:07.4f}"
+    hem = np.where(degrees < 0, 'S' if is_lat else 'W', 'N' if is_lat else 'E').tolist()
+    return list(map(fmt.format, d.astype(np.int64).tolist(), m.tolist())), hem
+
+def nmea_checksum_block(bodies):
+    """对一组语句体同时计算校验和：拼接成字节数组后按语句起点做 XOR 归约。"""
+    if not bodies: return []
+    data = np.frombuffer(''.join(bodies).encode('ascii'), dtype=np.uint8)
+    lengths = np.fromiter(map(len, bodies), dtype=np.int64, count=len(bodies))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return list(map("{:02X}".format, np.bitwise_xor.reduceat(data, starts).tolist()))
+
+def finish_nmea_block(bodies):
+    return list(map("${}*{}".format, bodies, nmea_checksum_block(bodies)))
+
+# --nmea 语句集：各语句共用的字段 (UTC 时间/日期、度分、速度/航向、卫星数/HDOP) 每块只算一次
+NMEA_SENTENCES = ('GGA', 'RMC', 'VTG', 'ZDA', 'GLL', 'GNS')
+NMEA_TALKERS = ('GP', 'GN')
+
+def format_nmea_set(cols, utc_start_time, sentences, talker='GP', sky=None):
+    """
+    按 sentences 顺序返回 {语句类型: 完整语句列表}。sky 为 SatelliteSky.observe 的结果时 GGA/GNS 写入实际可见星数和 HDOP，
+    否则与逐点版本一样固定为 12 颗 / 0.8；GP 的 GGA/RMC 与 create_gpgga_sentence/create_gprmc_sentence 逐字节一致。
+    """
+    need = set(sentences); n = len(cols['time'])
+    # 日期按天只 strftime 一次，RMC 用 ddmmyy，ZDA 用 dd,mm,yyyy
+    hours, minutes, seconds, us, dates = utc_time_parts(utc_start_time, cols['time'], "%d%m%y,%d,%m,%Y")
+    time_strs = list(map("{:02d}{:02d}{:02d}.{:02d}".format, hours, minutes, seconds, [u // 10000 for u in us]))
+    if need & {'GGA', 'RMC', 'GLL', 'GNS'}: lat_dmm, lat_hem = dmm_fields(cols['lat'], True); lon_dmm, lon_hem = dmm_fields(cols['lon'], False)
+    if need & {'GGA', 'GNS'}:
+        sats = list(map("{:02d}".format, sky['sats'].tolist())) if sky is not None else ['12'] * n
+        hdop = list(map("{:.1f}".format, sky['hdop'].tolist())) if sky is not None else ['0.8'] * n
+        heights = np.asarray(cols['height']).tolist()
+    if need & {'RMC', 'VTG'}: knots, course = np.asarray(cols['speed_knots']).tolist(), np.asarray(cols['bearing']).tolist()
+    fields = {
+        'GGA': lambda: ("GGA,{},{},{},{},{},1,{},{},{:.1f},M,,M,,", time_strs, lat_dmm, lat_hem, lon_dmm, lon_hem, sats, hdop, heights),
+        'RMC': lambda: ("RMC,{},A,{},{},{},{},{:.2f},{:.2f},{},,", time_strs, lat_dmm, lat_hem, lon_dmm, lon_hem, knots, course, [d[:6] for d in dates]),
+        'VTG': lambda: ("VTG,{:.2f},T,,M,{:.2f},N,{:.2f},K,A", course, knots, (np.asarray(cols['speed_knots'], dtype=float) * 1.852).tolist()),
+        'ZDA': lambda: ("ZDA,{},{},00,00", time_strs, [d[7:] for d in dates]),
+        'GLL': lambda: ("GLL,{},{},{},{},{},A,A", lat_dmm, lat_hem, lon_dmm, lon_hem, time_strs),
+        'GNS': lambda: ("GNS,{},{},{},{},{},AN,{},{},{:.1f},,,", time_strs, lat_dmm, lat_hem, lon_dmm, lon_hem, sats, hdop, heights),  # 模式: GPS 定位、无 GLONASS
+    }
+    blocks = {}
+    for kind in sentences:
+        template, *columns = fields[kind]()
+        blocks[kind] = finish_nmea_block(list(map((talker + template).format, *columns)))
+    return blocks
+
+def format_gpgga_block(cols, utc_start_time, sky=None):
+    return format_nmea_set(cols, utc_start_time, ('GGA',), 'GP', sky)['GGA']
+
+def format_gprmc_block(cols, utc_start_time):
+    return format_nmea_set(cols, utc_start_time, ('RMC',))['RMC']
+
+def nmea_set_paths(base_name, sentences, talker, interleave):
+    """--nmea 的输出文件：各语句 <base>_<talker><语句>.txt (GP 时与 -c/-a 的文件名相同)，交错时只有 <base>_nmea.txt。"""
+    return [f"{base_name}_nmea.txt"] if interleave else [f"{base_name}_{(talker + kind).lower()}.txt" for kind in sentences]
+
+def render_nmea_set(cols, utc_start_time, sentences, talker, interleave, sky=None):
+    """与 nmea_set_paths 一一对应的文本列表；交错时每个历元依次输出 sentences 中的各语句。"""
+    blocks = format_nmea_set(cols, utc_start_time, sentences, talker, sky)
+    if interleave: return [''.join(line + '\n' for epoch in zip(*(blocks[kind] for kind in sentences)) for line in epoch)]
+    return [''.join(line + '\n' for line in blocks[kind]) for kind in sentences]
+
+class NmeaSetWriter:
+    """生成模式下追加写出 --nmea 语句集；render 只格式化，write 只写文件，便于分阶段统计。"""
+    def __init__(self, base_name, sentences, talker='GP', interleave=False):
+        self.sentences, self.talker, self.interleave = sentences, talker, interleave
+        self.paths = nmea_set_paths(base_name, sentences, talker, interleave)
+        self.files = [open(path, 'a', encoding='utf-8') for path in self.paths]
+
+    def render(self, cols, utc_start_time, sky=None):
+        return render_nmea_set(cols, utc_start_time, self.sentences, self.talker, self.interleave, sky)
+
+    def write(self, texts):
+        for f, text in zip(self.files, texts): f.write(text)
+
+    def close(self):
+        for f in self.files: f.close()
+
+GPX_FOOTER = '    </trkseg>\n  </trk>\n</gpx>\n'
+def gpx_header(track_name):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<gpx version="1.1" creator="GPS-Trajectory-Generator 3.1" xmlns="http://www.topografix.com/GPX/1/1"'
+            ' xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v2">\n'
+            f'  <trk>\n    <name>{track_name}</name>\n    <trkseg>\n')
+def format_gpx_block(cols, utc_start_time):
+    """GPX 1.1 trkpt 行；速度 (m/s) 和航向放在 Garmin TrackPointExtension v2 扩展里 (GPX 1.1 核心没有这两个字段)。"""
+    speeds = (np.asarray(cols['speed_knots'], dtype=float) / KNOTS_PER_METER_PER_SECOND).tolist()
+    return ''.join(map('      <trkpt lat="{:.8f}" lon="{:.8f}"><ele>{:.3f}</ele><time>{}</time><extensions><gpxtpx:TrackPointExtension>'
+                       '<gpxtpx:speed>{:.3f}</gpxtpx:speed><gpxtpx:course>{:.2f}</gpxtpx:course></gpxtpx:TrackPointExtension></extensions></trkpt>\n'.format,
+                       np.asarray(cols['lat']).tolist(), np.asarray(cols['lon']).tolist(), np.asarray(cols['height']).tolist(),
+                       iso_time_fields(utc_start_time, cols['time']), speeds, np.asarray(cols['bearing']).tolist()))
+def open_gpx_for_append(path, track_name, buffering=1 << 20):
+    """打开 GPX 输出：已有文件去掉结尾的 </trkseg></trk></gpx> 后接着写，新文件先写文件头。关闭前需写 GPX_FOOTER。"""
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb+') as f:
+            f.seek(max(0, os.path.getsize(path) - len(GPX_FOOTER))); tail_start = f.tell()
+            if f.read() == GPX_FOOTER.encode('utf-8'): f.truncate(tail_start)
+        return open(path, 'a', encoding='utf-8', buffering=buffering)
+    f = open(path, 'w', encoding='utf-8', buffering=buffering); f.write(gpx_header(track_name))
+    return f
+
+def format_csv_block(cols):
+    """与 csv.writer 默认行尾 (\\r\\n) 一致的 time,lat,lon,height 文本。"""
+    return ''.join(map("{:.2f},{:.8f},{:.8f},{:.3f}\r\n".format, *(np.asarray(cols[k]).tolist() for k in ('time', 'lat', 'lon', 'height'))))
+def kml_placemark_header(name):
+    return (f'    <Placemark>\n      <name>{name}</name>\n      <LineString>\n'
+            '        <tessellate>1</tessellate>\n        <altitudeMode>absolute</altitudeMode>\n        <coordinates>\n          ')
+def kml_header(track_name):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n  <Document>\n'
+            f'    <name>{track_name}</name>\n') + kml_placemark_header('Trajectory')
+KML_PLACEMARK_FOOTER = '\n        </coordinates>\n      </LineString>\n    </Placemark>\n'
+KML_FOOTER = KML_PLACEMARK_FOOTER + '  </Document>\n</kml>\n'
+KML_COORD_SEPARATOR = "\n          "
+def kml_point_coordinates(points): return [f"{p['lon']:.8f},{p['lat']:.8f},{p['height']:.3f}" for p in points]
+def kml_column_coordinates(cols):
+    return list(map("{:.8f},{:.8f},{:.3f}".format, np.asarray(cols['lon']).tolist(), np.asarray(cols['lat']).tolist(), np.asarray(cols['height']).tolist()))
+
+# .kmz 只含 doc.kml 一个成员，按 ZIP 格式手写 (不用 zipfile)，这样追加时可以截断压缩流接着写：
+# 正文用原始 deflate 压缩，写完后做一次 Z_FULL_FLUSH (字节对齐、之后的数据不引用之前的内容)，KML_FOOTER 单独压成最后一块，
+# 续写时从 footer 块处截断，用新的压缩器接着压缩新内容，再重写 footer、中央目录，并回填本地文件头里的 CRC 和大小。
+KMZ_MEMBER = b'doc.kml'
+ZIP_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')  # 签名, 所需版本, 标志, 压缩方法, 时间, 日期, CRC, 压缩大小, 原始大小, 文件名长, 扩展长
+ZIP_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+ZIP_END_RECORD = struct.Struct('<IHHHHIIH')
+
+def dos_timestamp(t=None):
+    lt = time.localtime(t)
+    return (lt.tm_hour << 11) | (lt.tm_min << 5) | (lt.tm_sec // 2), ((lt.tm_year - 1980) << 9) | (lt.tm_mon << 5) | lt.tm_mday
+
+class KmlDocumentWriter:
+    """
+    写 .kml 或 .kmz 文档：write() 写正文，close(tail) 写结尾并返回正文末尾的位置 (splice) 等续写状态。
+    resume 为上次 close() 返回的状态时，从 splice 处截断并接着写正文，耗时只与新写的内容有关。
+    """
+    def __init__(self, path, resume=None):
+        self.path, self.kmz = path, path.lower().endswith('.kmz')
+        self.data_offset = ZIP_LOCAL_HEADER.size + len(KMZ_MEMBER) if self.kmz else 0
+        if resume:
+            self.file = open(path, 'r+b'); self.file.seek(resume['splice']); self.file.truncate()
+            self.size, self.crc = resume['body_size'], resume['body_crc']
+        else:
+            self.file = open(path, 'w+b'); self.size, self.crc = 0, 0
+            if self.kmz: self.file.write(b'\0' * self.data_offset)
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if self.kmz else None
+
+    def write(self, text):
+        data = text.encode('utf-8'); self.size += len(data)
+        if self.kmz: self.crc = zlib.crc32(data, self.crc); data = self.compressor.compress(data)
+        self.file.write(data)
+
+    def close(self, tail):
+        if self.kmz: self.file.write(self.compressor.flush(zlib.Z_FULL_FLUSH))
+        state = {'splice': self.file.tell(), 'body_size': self.size, 'body_crc': self.crc}
+        data = tail.encode('utf-8')
+        if self.kmz:
+            crc, size = zlib.crc32(data, self.crc), self.size + len(data)
+            last = zlib.compressobj(6, zlib.DEFLATED, -15); self.file.write(last.compress(data) + last.flush())
+            central_offset = self.file.tell(); compressed = central_offset - self.data_offset
+            if max(size, central_offset) >= 1 << 32: raise ValueError("KMZ 超过 4 GB (未实现 ZIP64)，请改用 .kml 输出")
+            dos_time, dos_date = dos_timestamp()
+            self.file.write(ZIP_CENTRAL_HEADER.pack(0x02014b50, 20, 20, 0, 8, dos_time, dos_date, crc, compressed, size, len(KMZ_MEMBER), 0, 0, 0, 0, 0, 0) + KMZ_MEMBER)
+            self.file.write(ZIP_END_RECORD.pack(0x06054b50, 0, 0, 1, 1, self.file.tell() - central_offset, central_offset, 0))
+            end = self.file.tell(); self.file.seek(0)
+            self.file.write(ZIP_LOCAL_HEADER.pack(0x04034b50, 20, 0, 8, dos_time, dos_date, crc, compressed, size, len(KMZ_MEMBER), 0) + KMZ_MEMBER)
+            self.file.seek(end)
+        else: self.file.write(data)
+        self.file.truncate(); self.file.close()
+        return state
+
+def write_kml_document(coordinate_chunks, kml_filename, track_name="Converted Track", resume=None, session_name=None):
+    """
+    分块写 KML/KMZ，返回 (写入的点数, 续写状态)；没有点时不创建也不改动文件，状态为 None。
+    resume 为上次返回的状态时只写新点：session_name 为 None 时接在原折线末尾，否则从上次的最后一点起新建同名 Placemark (轨迹不断开)。
+    """
+    count, writer, last = 0, None, None
+    try:
+        for coords in coordinate_chunks:
+            if not coords: continue
+            if writer is None:
+                writer = KmlDocumentWriter(kml_filename, resume)
+                if resume is None: writer.write(kml_header(track_name))
+                elif session_name is None: writer.write(KML_COORD_SEPARATOR)
+                else: writer.write(KML_PLACEMARK_FOOTER + kml_placemark_header(session_name) + resume['last'] + KML_COORD_SEPARATOR)
+            else: writer.write(KML_COORD_SEPARATOR)
+            writer.write(KML_COORD_SEPARATOR.join(coords)); count += len(coords); last = coords[-1]
+        if writer is None: return 0, None
+        state = writer.close(KML_FOOTER)
+        state.update(output_size=os.path.getsize(kml_filename), output_mtime=os.stat(kml_filename).st_mtime_ns, last=last,
+                     points=count + (resume['points'] if resume else 0), sessions=(resume['sessions'] + (session_name is not None)) if resume else 1)
+        LOGGER.info(f"KML文件 '{kml_filename}' {'追加' if resume else '生成'}成功 (共 {state['points']} 个点)。")
+        return count, state
+    except (IOError, ValueError) as e: LOGGER.error(f"错误: 无法写入KML文件 '{kml_filename}'。原因: {e}")
+    finally:
+        if writer and not writer.file.closed: writer.file.close()
+    return count, None
+def write_kml_stream(coordinate_chunks, kml_filename, track_name="Converted Track"):
+    """
+    分块写 KML：coordinate_chunks 依次产出 "经度,纬度,高度" 字符串列表，内存只占一块，输出与一次性写出逐字节相同。
+    kml_filename 以 .kmz 结尾时写成 KMZ。返回写入的点数；没有点时不创建文件。
+    """
+    return write_kml_document(coordinate_chunks, kml_filename, track_name)[0]
+def write_kml_file(trajectory_points, kml_filename, track_name="Converted Track"):
+    if not trajectory_points: LOGGER.warning("警告: 没有有效的坐标点，无法生成KML文件。"); return
+    LOGGER.info(f"正在将 {len(trajectory_points)} 个点写入KML文件: {kml_filename}")
+    write_kml_stream([kml_point_coordinates(trajectory_points)], kml_filename, track_name)
+def iter_batches(items, size):
+    """把任意迭代器按 size 个一组切成列表。"""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch: return
+        yield batch
+
+
+# --- 二进制轨迹格式 (.gtb) ---
+# 文件布局 (小端)：64 字节文件头 | 定长记录 (按行存放，可直接追加) | 稀疏时间索引 (float64，每 GTB_INDEX_STRIDE 条记录一个)。
+# 记录可用 np.memmap 零拷贝映射；按时间窗口读取时先查稀疏索引，再只在一个索引间隔内二分查找。
+GTB_MAGIC, GTB_VERSION = b'GTRJ', 1
+GTB_HEADER = struct.Struct('<4sHHQQQIIq16x')  # magic, version, encoding, 点数, 数据偏移, 索引偏移, 索引间隔, 索引条数, UTC 起点 (微秒)
+GTB_INDEX_STRIDE = 1024
+GTB_ENCODINGS = {'f8': 0, 'i4': 1}
+GTB_SCALES = {'time': 1e3, 'lat': 1e7, 'lon': 1e7, 'height': 1e3, 'speed_knots': 1e2, 'bearing': 1e2}  # i4 编码: 毫秒、1e-7 度、毫米、0.01 节、0.01 度
+
+def gtb_dtype(encoding):
+    if encoding == GTB_ENCODINGS['f8']: return np.dtype([(k, '<f8') for k in TRAJECTORY_COLUMNS])
+    return np.dtype([('time', '<i4'), ('lat', '<i4'), ('lon', '<i4'), ('height', '<i4'), ('speed_knots', '<u2'), ('bearing', '<u2')])
+
+def columns_to_gtb_records(cols, encoding):
+    dtype = gtb_dtype(encoding); n = len(cols['time']); records = np.empty(n, dtype=dtype)
+    for key in TRAJECTORY_COLUMNS:
+        values = np.asarray(cols[key], dtype=float) if key in cols else np.zeros(n)
+        if encoding == GTB_ENCODINGS['f8']: records[key] = values; continue
+        scaled = np.rint(np.nan_to_num(values) * GTB_SCALES[key]); info = np.iinfo(dtype[key])
+        if n and (scaled.min() < info.min or scaled.max() > info.max): raise ValueError(f"列 '{key}' 超出 i4 编码范围，请改用 --binary-encoding f8")
+        records[key] = scaled
+    return records
+
+def gtb_records_to_columns(records, encoding):
+    if encoding == GTB_ENCODINGS['f8']: return {key: records[key] for key in TRAJECTORY_COLUMNS}  # 零拷贝视图
+    return {key: records[key] / GTB_SCALES[key] for key in TRAJECTORY_COLUMNS}
+
+def open_gtb(path):
+    """返回 (文件头字典, 记录 memmap, 稀疏时间索引)。"""
+    with open(path, 'rb') as f: raw = f.read(GTB_HEADER.size)
+    if len(raw) < GTB_HEADER.size: raise ValueError(f"'{path}' 不是有效的 .gtb 文件")
+    magic, version, encoding, n, data_offset, index_offset, stride, n_index, utc_us = GTB_HEADER.unpack(raw)
+    if magic != GTB_MAGIC or version != GTB_VERSION: raise ValueError(f"'{path}' 不是受支持的 .gtb 文件 (版本 {version})")
+    header = {'encoding': encoding, 'points': n, 'stride': stride, 'utc_start_time': None if utc_us == 0 else
+              datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=utc_us)}
+    dtype = gtb_dtype(encoding)
+    records = np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(n,)) if n else np.empty(0, dtype=dtype)
+    index = np.memmap(path, dtype='<f8', mode='r', offset=index_offset, shape=(n_index,)) if n_index else np.empty(0)
+    return header, records, index
+
+def gtb_locate(header, records, index, t, side='left'):
+    """时间 t (秒) 在 .gtb 记录中的插入位置 (与 np.searchsorted 相同)：先查稀疏索引，再只在一个索引间隔内二分查找。"""
+    scale = 1.0 if header['encoding'] == GTB_ENCODINGS['f8'] else GTB_SCALES['time']
+    block = max(0, int(np.searchsorted(index, t, side=side)) - 1) * header['stride']
+    window = records['time'][block:block + header['stride'] + 1]
+    return block + int(np.searchsorted(window, t * scale, side=side))
+
+def read_gtb(path, t_start=None, t_end=None):
+    """读取 .gtb，返回 (点列数组字典, UTC 起点)。给定时间窗口时只映射窗口内的记录。"""
+    header, records, index = open_gtb(path)
+    lo, hi = 0, header['points']
+    if t_start is not None and hi: lo = gtb_locate(header, records, index, t_start, 'left')
+    if t_end is not None and hi: hi = gtb_locate(header, records, index, t_end, 'right')
+    return gtb_records_to_columns(records[lo:max(lo, hi)], header['encoding']), header['utc_start_time']
+
+class GtbWriter:
+    """追加写入 .gtb：已有文件会保留原记录和索引，close() 时重写索引和文件头。"""
+    def __init__(self, path, encoding='i4'):
+        self.path, self.utc_start_time = path, None
+        if os.path.exists(path) and os.path.getsize(path) >= GTB_HEADER.size:
+            header, records, index = open_gtb(path)
+            self.encoding, self.n, self.stride, self.utc_start_time = header['encoding'], header['points'], header['stride'], header['utc_start_time']
+            self.index = [float(t) for t in index]; del records, index
+            self.file = open(path, 'r+b'); self.file.truncate(GTB_HEADER.size + self.n * gtb_dtype(self.encoding).itemsize)
+        else:
+            self.encoding, self.n, self.stride, self.index = GTB_ENCODINGS[encoding], 0, GTB_INDEX_STRIDE, []
+            self.file = open(path, 'w+b'); self.file.write(b'\0' * GTB_HEADER.size)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, cols):
+        records = columns_to_gtb_records(cols, self.encoding)
+        first = -self.n % self.stride  # 本批中第一个需要进索引的位置
+        self.index.extend(np.asarray(cols['time'], dtype=float)[first::self.stride].tolist())
+        self.file.write(records.tobytes()); self.n += len(records)
+
+    def close(self):
+        index_offset = GTB_HEADER.size + self.n * gtb_dtype(self.encoding).itemsize
+        self.file.seek(index_offset); self.file.write(np.asarray(self.index, dtype='<f8').tobytes()); self.file.truncate()
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        utc_us = (self.utc_start_time - epoch) // timedelta(microseconds=1) if self.utc_start_time else 0
+        self.file.seek(0); self.file.write(GTB_HEADER.pack(GTB_MAGIC, GTB_VERSION, self.encoding, self.n, GTB_HEADER.size, index_offset, self.stride, len(self.index), utc_us))
+        self.file.close()
+
+def write_gtb_file(path, cols, encoding='i4', utc_start_time=None):
+    writer = GtbWriter(path, encoding); writer.utc_start_time = writer.utc_start_time or utc_start_time
+    writer.append(cols); writer.close()
+
+def start_row_columns(start_row):
+    """把起点行 (time, lat, lon, height) 变成单点的点列字典，速度和方位角记为 0。"""
+    return dict(zip(TRAJECTORY_COLUMNS, ([value] for value in (*start_row, 0.0, 0.0))))
+
+
+def points_to_columns(points):
+    """把 generate_segment 返回的点字典列表转成点列数组字典。"""
+    return {key: np.array([p[key] for p in points], dtype=float) for key in TRAJECTORY_COLUMNS}
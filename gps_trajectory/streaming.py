@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+实时输出通道：按墙钟节奏推送 NMEA 的 NmeaStreamSink (--stream) 和共享内存环形缓冲 (--shm)。
+"""
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+
+from .common import DEFAULT_SHM_CAPACITY, DEFAULT_STREAM_BUFFER, LOGGER, TRAJECTORY_COLUMNS, LazyModule, progress, require_numpy
+
+np = LazyModule('numpy', 'np', globals())
+
+
+# --- 实时 NMEA 流输出 (--stream) ---
+# 生成线程在有界队列里最多领先 --stream-buffer 个点；发送线程按绝对截止时间 (起点 + 轨迹时间) 输出，
+# 先 sleep 到截止前 2ms 再自旋等待，误差不会随时间累积，抖动通常在 1ms 以内。
+STREAM_SPIN_SECONDS = 0.002
+STREAM_CLIENT_BACKLOG_BYTES = 1 << 22  # 每个 TCP 客户端最多积压的未发送字节，超过时丢弃新数据 (计入 dropped)
+
+class NmeaStreamSink:
+    """
+    tcp://HOST:PORT 作为服务端向所有已连接客户端广播；udp://HOST:PORT 逐条发送数据报；pty 创建伪终端 (仅 Unix)。
+    TCP 客户端各有一个待发缓冲：套接字缓冲区满时剩余部分留到下一次 send 再发，只有真正的连接错误才断开该客户端。
+    """
+    def __init__(self, target):
+        self.clients, self.server, self.udp, self.master_fd, self.dropped = {}, None, None, None, 0
+        if target == 'pty':
+            import tty
+            self.master_fd, slave_fd = os.openpty(); tty.setraw(slave_fd); os.set_blocking(self.master_fd, False)
+            self.slave_fd, self.description = slave_fd, os.ttyname(slave_fd)
+            return
+        scheme, _, address = target.partition('://'); host, _, port = address.rpartition(':')
+        if scheme not in ('tcp', 'udp') or not port.isdigit(): raise ValueError(f"无效的流输出目标 '{target}'，应为 tcp://HOST:PORT、udp://HOST:PORT 或 pty")
+        self.address, self.description = (host or '127.0.0.1', int(port)), target
+        if scheme == 'udp': self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM); return
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM); self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address); self.server.listen(); self.server.setblocking(False)
+
+    def send(self, payload):
+        if self.udp: self.udp.sendto(payload, self.address); return
+        if self.master_fd is not None:
+            try: os.write(self.master_fd, payload)
+            except BlockingIOError: self.dropped += 1  # 没有程序在读伪终端时丢弃，不阻塞调度
+            return
+        while True:
+            try: client, _ = self.server.accept()
+            except BlockingIOError: break
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1); client.setblocking(False); self.clients[client] = bytearray()
+        for client, pending in list(self.clients.items()):
+            if len(pending) + len(payload) > STREAM_CLIENT_BACKLOG_BYTES: self.dropped += 1  # 客户端长时间不读：丢弃整条，不截断语句
+            else: pending += payload
+            try: del pending[:client.send(pending)]
+            except BlockingIOError: pass  # 发送缓冲区满，剩余部分下次再发
+            except OSError: del self.clients[client]; client.close()
+
+    def close(self):
+        for client, pending in self.clients.items():
+            try: client.settimeout(1.0); client.sendall(pending)  # 尽量把积压的数据发完再断开
+            except OSError: pass
+        for sock in list(self.clients) + [self.server, self.udp]:
+            if sock: sock.close()
+        if self.master_fd is not None: os.close(self.master_fd); os.close(self.slave_fd)
+
+def stream_paced(sink, records, buffer_points=DEFAULT_STREAM_BUFFER):
+    """
+    records 为 (轨迹时间秒, 字节串) 的迭代器，由后台线程填入有界队列；按轨迹时间相对首点的墙钟节奏发送。
+    返回迟到统计字典 (毫秒)；生成跟不上时记为 underrun，发送会顺延但不会重新对时。
+    """
+    buffer, done = queue.Queue(maxsize=buffer_points), object()
+    def produce():
+        try:
+            for record in records: buffer.put(record)
+        finally: buffer.put(done)
+    threading.Thread(target=produce, daemon=True).start()
+    lateness, underruns, origin, first_time, last_report = [], 0, None, None, time.perf_counter()
+    while True:
+        try: record = buffer.get_nowait()
+        except queue.Empty: underruns += origin is not None; record = buffer.get()
+        if record is done: break
+        point_time, payload = record
+        if origin is None: origin, first_time = time.perf_counter(), point_time
+        deadline = origin + (point_time - first_time)
+        remaining = deadline - time.perf_counter()
+        if remaining > STREAM_SPIN_SECONDS: time.sleep(remaining - STREAM_SPIN_SECONDS)
+        while time.perf_counter() < deadline: pass
+        lateness.append(time.perf_counter() - deadline); sink.send(payload)
+        if deadline - last_report >= 10.0:
+            last_report = deadline; progress(f"  流输出 T={point_time:.1f}s，已发送 {len(lateness)} 点，缓冲 {buffer.qsize()} 点，最大迟到 {max(lateness) * 1e3:.3f} ms")
+    ordered = sorted(lateness); pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3 if ordered else 0.0
+    return {'points': len(ordered), 'mean_ms': sum(ordered) / len(ordered) * 1e3 if ordered else 0.0, 'p50_ms': pick(0.5), 'p99_ms': pick(0.99),
+            'max_ms': ordered[-1] * 1e3 if ordered else 0.0, 'late_over_1ms': sum(1 for x in ordered if x > 0.001), 'underruns': underruns, 'dropped': sink.dropped}
+
+
+# --- 共享内存环形缓冲 (--shm) ---
+# 把生成的点列数组直接放进 multiprocessing.shared_memory，下游合成程序 attach 后用 numpy 视图零拷贝读取，
+# 不再经过 CSV 文本。布局：64 字节头 + capacity 条定长记录 (TRAJECTORY_COLUMNS 各一个 <f8，共 48 字节)。
+# 头 (小端)：magic 'GTSH', 版本 u16, 头长 u16, 记录长 u32, 标志 u32 (bit0 = 生产者已结束), 容量 u64,
+#            写序号 u64 (已写入的总条数), 读序号 u64 (消费者已读完的总条数), 起始 UTC (微秒 i64), 16 字节保留。
+# 第 k 条记录位于槽位 k % capacity；生产者先写数据再推进写序号，消费者读完后推进读序号，环满时生产者等待 (背压)。
+SHM_MAGIC = b'GTSH'
+SHM_HEADER = struct.Struct('<4sHHIIQQQq16x')
+SHM_WRITE_OFFSET, SHM_READ_OFFSET, SHM_FLAGS_OFFSET = 24, 32, 12
+SHM_DONE = 1
+SHM_POLL_SECONDS = 0.001
+
+def shm_dtype():
+    return np.dtype([(key, '<f8') for key in TRAJECTORY_COLUMNS])
+
+def shm_ring_view(buf, capacity):
+    return np.ndarray((capacity,), dtype=shm_dtype(), buffer=buf, offset=SHM_HEADER.size)
+
+class ShmRingWriter:
+    """生产者：创建共享内存段并按环形缓冲追加点列数组；接口与 GtbWriter 相同 (append / close)。"""
+    def __init__(self, name, capacity=DEFAULT_SHM_CAPACITY, linger=10.0):
+        require_numpy("共享内存输出 (--shm)")
+        self.capacity, self.linger, self.written, self._waiting_noted = int(capacity), linger, 0, False
+        from multiprocessing import shared_memory
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=SHM_HEADER.size + self.capacity * shm_dtype().itemsize)
+        self.ring = shm_ring_view(self.shm.buf, self.capacity)
+        SHM_HEADER.pack_into(self.shm.buf, 0, SHM_MAGIC, 1, SHM_HEADER.size, shm_dtype().itemsize, 0, self.capacity, 0, 0, 0)
+
+    def set_utc_start(self, utc_start_time):
+        us = (utc_start_time - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1)
+        struct.pack_into('<q', self.shm.buf, 40, us)
+
+    def _read_index(self):
+        return struct.unpack_from('<Q', self.shm.buf, SHM_READ_OFFSET)[0]
+
+    def append(self, cols):
+        n, done = len(cols['time']), 0
+        while done < n:
+            free = self.capacity - (self.written - self._read_index())
+            if free <= 0:
+                if not self._waiting_noted: LOGGER.info(f"信息: 共享内存 '{self.shm.name}' 已满，等待消费者读取..."); self._waiting_noted = True
+                time.sleep(SHM_POLL_SECONDS); continue
+            slot = self.written % self.capacity
+            count = min(n - done, free, self.capacity - slot)  # 不跨越环尾，回绕部分下一轮再写
+            block = self.ring[slot:slot + count]
+            for key in TRAJECTORY_COLUMNS: block[key] = cols[key][done:done + count]
+            done += count; self.written += count
+            struct.pack_into('<Q', self.shm.buf, SHM_WRITE_OFFSET, self.written)  # 数据写完后才发布写序号
+
+    def close(self):
+        """标记结束；等消费者读完 (读序号在 linger 秒内没有进展则放弃) 后删除共享内存段。"""
+        struct.pack_into('<I', self.shm.buf, SHM_FLAGS_OFFSET, SHM_DONE)
+        last, last_change = self._read_index(), time.monotonic()
+        while last < self.written and time.monotonic() - last_change < self.linger:
+            time.sleep(SHM_POLL_SECONDS * 10); current = self._read_index()
+            if current != last: last, last_change = current, time.monotonic()
+        if last < self.written: LOGGER.warning(f"警告: 共享内存 '{self.shm.name}' 还有 {self.written - last} 条记录未被读取。")
+        del self.ring; self.shm.close(); self.shm.unlink()
+
+class ShmRingReader:
+    """
+    消费者：attach 到生产者的共享内存段。chunks() 依次产出可读记录的结构化数组视图 (零拷贝)，
+    取下一块时才把上一块的槽位归还给生产者，因此处理视图期间数据不会被覆盖。
+    """
+    def __init__(self, name):
+        from multiprocessing import shared_memory
+        self.shm = shared_memory.SharedMemory(name=name)
+        if sys.version_info < (3, 13):  # 3.13 之前 attach 也会登记到 resource_tracker，退出时会误删生产者的段
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        magic, version, _, record_size, _, self.capacity, _, self.consumed, utc_us = SHM_HEADER.unpack_from(self.shm.buf, 0)
+        if magic != SHM_MAGIC or version != 1 or record_size != shm_dtype().itemsize: raise ValueError(f"'{name}' 不是本程序的共享内存轨迹缓冲。")
+        self.utc_start_time = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=utc_us) if utc_us else None
+        self.ring = shm_ring_view(self.shm.buf, self.capacity)
+
+    def chunks(self, max_records=None):
+        while True:
+            done = struct.unpack_from('<I', self.shm.buf, SHM_FLAGS_OFFSET)[0] & SHM_DONE  # 先读标志再读写序号，标志置位时写序号已是最终值
+            written = struct.unpack_from('<Q', self.shm.buf, SHM_WRITE_OFFSET)[0]
+            if written == self.consumed:
+                if done: return
+                time.sleep(SHM_POLL_SECONDS); continue
+            slot = self.consumed % self.capacity
+            count = min(written - self.consumed, self.capacity - slot, max_records or self.capacity)
+            yield self.ring[slot:slot + count]
+            self.consumed += count
+            struct.pack_into('<Q', self.shm.buf, SHM_READ_OFFSET, self.consumed)
+
+    def close(self):
+        del self.ring; self.shm.close()
+
+
+
+class ColumnFanout:
+    """把同一批点列数组依次交给多个写入器 (例如 -B 的 GtbWriter 和 --shm 的 ShmRingWriter)。"""
+    def __init__(self, writers): self.writers = writers
+    def append(self, cols):
+        for writer in self.writers: writer.append(cols)
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+差分正确性校验：在随机生成的路线上，用同一组带种子的输入分别运行 3.1 的标量参考实现 (逐点函数) 和优化路径
+(整块格式化、数组几何/坐标转换、向量化与直线插值引擎、分块读取)。格式化输出要求逐字节相同，几何量要求误差在容差内，
+同一次运行里报告吞吐比 (优化路径 点/秒 ÷ 参考实现 点/秒)。任何一项不通过时退出码为 1。
+
+    python verify.py                        # 默认 20 条随机路线，种子 0
+    python verify.py --routes 200 --seed 7  # 更多路线 / 换一组输入
+    python verify.py -k format/ --json verify.json
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import bench
+from gps_trajectory import engine as m, readers
+
+# 几何容差：位置 (米)、方位角 (度)、速度 (节)、高度 (米)、经纬度 (度)。
+# 路段生成是逐步累加 (10Hz 下一段可达数万步)，位置和时间的末位误差随步数累积，单独放宽到 0.1 毫米 / 10 微秒；
+# 路段的方位角是"当前点指向终点"，最后一两步离终点只有几米，位置误差会被放大，同样单独放宽。
+POSITION_TOLERANCE_M = 1e-6
+BEARING_TOLERANCE_DEG = 1e-7
+SEGMENT_POSITION_TOLERANCE_M = 1e-4
+SEGMENT_TIME_TOLERANCE_S = 1e-5
+SEGMENT_BEARING_TOLERANCE_DEG = 1e-5
+SPEED_TOLERANCE_KNOTS = 1e-9
+HEIGHT_TOLERANCE_M = 1e-9
+DEGREE_TOLERANCE = 1e-12
+
+
+def random_route(rng):
+    """随机路线：2-6 个点，每段 20 米到 3 公里；大多在国内 (坐标转换有效)，少数在南/西半球 (度分格式的 S/W)。"""
+    if rng.random() < 0.8: lat, lon = rng.uniform(18.0, 50.0), rng.uniform(75.0, 134.0)
+    else: lat, lon = rng.uniform(-60.0, 60.0), rng.uniform(-179.0, -1.0)
+    waypoints = [{'lat': lat, 'lon': lon}]
+    for _ in range(rng.randint(1, 5)):
+        lat, lon = m.calculate_new_point(lat, lon, rng.uniform(0, 360), rng.uniform(20, 3000)); waypoints.append({'lat': lat, 'lon': lon})
+    speed_ranges = [m.SPEED_MODES[rng.choice(sorted(m.SPEED_MODES))] for _ in waypoints[1:]]
+    # UTC 起点随机落在一天中的任意时刻，覆盖跨零点和跨日
+    utc = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(days=rng.randint(0, 900), seconds=rng.uniform(0, 86400))
+    return waypoints, speed_ranges, 1.0 / rng.choice((1, 2, 5, 10)), utc.replace(microsecond=0)
+
+
+class ReplayedDraws:
+    """
+    按 generate_segment 消耗 random 的顺序 (初速度，之后每步 目标速度、高度浮动 交替) 取出同一串均匀数，
+    以 numpy Generator.uniform 的接口交给 generate_variant_segment，使两条路径用完全相同的随机输入。
+    """
+    def __init__(self, seed):
+        self.random, self.jitter = random.Random(seed), None
+
+    def uniform(self, low, high, size=None):
+        if size is None: return low + (high - low) * self.random.random()
+        if self.jitter is None:
+            u = m.np.array([self.random.random() for _ in range(2 * size)])
+            self.jitter = u[1::2]
+            return low + (high - low) * u[0::2]
+        return low + (high - low) * self.jitter
+
+
+def scalar_route(waypoints, speed_ranges, time_step, utc, seed):
+    """参考：逐段调用标量 generate_segment，每段返回 (起点, 终点, 速度范围, 起始时间, 起始高度, 点列表)。"""
+    random.seed(seed); segments, t, h = [], 0.0, m.DEFAULT_HEIGHT
+    for (a, b), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+        points, _, _, t_next, h_next, _ = m.generate_segment(a['lat'], a['lon'], b['lat'], b['lon'], speed_range, t, h, None, utc, time_step)
+        segments.append((a, b, speed_range, t, h, points)); t, h = t_next, h_next
+    return segments
+
+
+def max_abs(a, b):
+    a, b = m.np.asarray(a, dtype=float), m.np.asarray(b, dtype=float)
+    return float(m.np.max(m.np.abs(a - b))) if a.size else 0.0
+
+
+def bearing_error(a, b):
+    d = m.np.abs(m.np.asarray(a, dtype=float) - m.np.asarray(b, dtype=float)) % 360
+    return float(m.np.max(m.np.minimum(d, 360 - d))) if d.size else 0.0
+
+
+def position_error(lat1, lon1, lat2, lon2):
+    return float(m.np.max(m.calculate_distance_array(lat1, lon1, lat2, lon2))) if len(lat1) else 0.0
+
+
+def timed(run):
+    start = time.perf_counter(); result = run(); return result, time.perf_counter() - start
+
+
+# --- 检查项：每个函数对一条路线返回 (参考输出, 参考耗时, 优化输出, 优化耗时, 点数)，比较由 CHECKS 中的比较函数完成 ---
+def check_format(route, kind):
+    waypoints, speed_ranges, time_step, utc = route['input']
+    points, cols = route['points'], route['cols']
+    if kind == 'csv':
+        def reference():
+            buf = io.StringIO(); w = csv.writer(buf)
+            for p in points: w.writerow([f"{p['time']:.2f}", f"{p['lat']:.8f}", f"{p['lon']:.8f}", f"{p['height']:.3f}"])
+            return buf.getvalue()
+        optimized = lambda: m.format_csv_block(cols)
+    elif kind == 'gpgga': reference, optimized = (lambda: [m.create_gpgga_sentence(p) for p in points]), (lambda: m.format_gpgga_block(cols, utc))
+    elif kind == 'gprmc': reference, optimized = (lambda: [m.create_gprmc_sentence(p) for p in points]), (lambda: m.format_gprmc_block(cols, utc))
+    elif kind == 'nmea-set':
+        reference = lambda: ''.join(m.create_gpgga_sentence(p) + '\n' + m.create_gprmc_sentence(p) + '\n' for p in points)
+        optimized = lambda: m.render_nmea_set(cols, utc, ('GGA', 'RMC'), 'GP', True)[0]
+    else: reference, optimized = (lambda: m.kml_point_coordinates(points)), (lambda: m.kml_column_coordinates(cols))
+    ref, ref_s = timed(reference); opt, opt_s = timed(optimized)
+    return ref, ref_s, opt, opt_s, len(points)
+
+
+def check_geometry(route, kind):
+    cols = route['cols']; lat, lon = cols['lat'], cols['lon']
+    lat1, lon1, lat2, lon2 = lat[:-1], lon[:-1], lat[1:], lon[1:]
+    pairs = list(zip(lat1.tolist(), lon1.tolist(), lat2.tolist(), lon2.tolist()))
+    if kind == 'distance':
+        ref, ref_s = timed(lambda: [m.calculate_distance(*p) for p in pairs]); opt, opt_s = timed(lambda: m.calculate_distance_array(lat1, lon1, lat2, lon2))
+    elif kind == 'bearing':
+        ref, ref_s = timed(lambda: [m.calculate_bearing(*p) for p in pairs]); opt, opt_s = timed(lambda: m.calculate_bearing_array(lat1, lon1, lat2, lon2))
+    else:
+        bearing, distance = cols['bearing'][1:], cols['speed_knots'][1:]  # 用真实的方位角和一个与速度同量级的距离
+        args = list(zip(lat1.tolist(), lon1.tolist(), bearing.tolist(), distance.tolist()))
+        ref, ref_s = timed(lambda: [m.calculate_new_point(*a) for a in args])
+        opt, opt_s = timed(lambda: m.calculate_new_point_array(lat1, lon1, bearing, distance))
+        ref = tuple(m.np.array(v) for v in zip(*ref)) if ref else (m.np.zeros(0), m.np.zeros(0))
+    return ref, ref_s, opt, opt_s, len(pairs)
+
+
+def check_convert(route, kind):
+    lat, lon = route['cols']['lat'], route['cols']['lon']
+    scalar, array = (m.gcj02_to_wgs84, m.gcj02_to_wgs84_array) if kind == 'gcj02' else (m.bd09_to_wgs84, m.bd09_to_wgs84_array)
+    coords = list(zip(lon.tolist(), lat.tolist()))
+    ref, ref_s = timed(lambda: [scalar(x, y) for x, y in coords]); opt, opt_s = timed(lambda: array(lon, lat))
+    ref = tuple(m.np.array(v) for v in zip(*ref)) if ref else (m.np.zeros(0), m.np.zeros(0))
+    return ref, ref_s, opt, opt_s, len(coords)
+
+
+def check_segment_vectorized(route, _):
+    """每段用同一串随机数分别跑 generate_segment 与 generate_variant_segment (K=1)；吞吐比另用 numpy 随机数计时。"""
+    waypoints, speed_ranges, time_step, utc = route['input']
+    ref, opt, n, ref_s, opt_s = [], [], 0, 0.0, 0.0
+    for index, (a, b, speed_range, t, h, _) in enumerate(route['segments']):
+        seed = route['seed'] * 100 + index
+        random.seed(seed)
+        points, ref_seconds = timed(lambda: m.generate_segment(a['lat'], a['lon'], b['lat'], b['lon'], speed_range, t, h, None, utc, time_step)[0])
+        cols, counts, *_ = m.generate_variant_segment(a['lat'], a['lon'], b['lat'], b['lon'], speed_range, m.np.array([t]), m.np.array([h]), None,
+                                                      [ReplayedDraws(seed)], time_step)
+        _, opt_seconds = timed(lambda: m.generate_variant_segment(a['lat'], a['lon'], b['lat'], b['lon'], speed_range, m.np.array([t]), m.np.array([h]),
+                                                                  None, [m.np.random.default_rng(seed)], time_step))
+        ref.append(m.points_to_columns(points) if points else None); opt.append(cols if counts[0] else None)
+        n += len(points); ref_s += ref_seconds; opt_s += opt_seconds
+    return ref, ref_s, opt, opt_s, n
+
+
+def check_segment_linear(route, _):
+    """engine 的 linear 后端与 3.0.py 的 generate_segment (逐点参考) 在同一种子下比较。"""
+    waypoints, speed_ranges, time_step, utc = route['input']
+    v30 = LEGACY['3.0']; v30.TIME_STEP = time_step
+    def reference():
+        random.seed(route['seed']); t, h, speed, points = 0.0, m.DEFAULT_HEIGHT, None, []
+        for (a, b), speed_range in zip(zip(waypoints, waypoints[1:]), speed_ranges):
+            segment, _, _, t, h, speed = v30.generate_segment(a['lat'], a['lon'], b['lat'], b['lon'], speed_range, t, h, speed, utc)
+            points.extend(segment)
+        return m.points_to_columns(points)
+    def optimized():
+        random.seed(route['seed'])
+        return m.motion_chunks_to_columns(m.MOTION_ENGINES['linear']['run'](waypoints, speed_ranges, time_step, 0.0, m.DEFAULT_HEIGHT, route['seed'], False))
+    ref, ref_s = timed(reference); opt, opt_s = timed(optimized)
+    return [ref], ref_s, [opt], opt_s, len(ref['time'])
+
+
+def check_segment_jit(route, _):
+    """jit 后端与 bearing-walk (generate_segment) 在同一种子下比较；没有 numba 时 jit 即 bearing-walk，比较结果必然相同。"""
+    waypoints, speed_ranges, time_step, _ = route['input']
+    m.bearing_walk_jit()  # 编译/载入不计入耗时
+    def run(name):
+        random.seed(route['seed'])
+        return m.motion_chunks_to_columns(m.MOTION_ENGINES[name]['run'](waypoints, speed_ranges, time_step, 0.0, m.DEFAULT_HEIGHT, route['seed'], False))
+    ref, ref_s = timed(lambda: run('bearing-walk')); opt, opt_s = timed(lambda: run('jit'))
+    return [ref], ref_s, [opt], opt_s, len(ref['time'])
+
+
+def check_parse(route, kind):
+    """标量解析 (iter_*_points) 与分块读取 (TrajectoryChunkReader) 读同一个文件。"""
+    points, workdir = route['points'], route['workdir']
+    path = os.path.join(workdir, f"verify_{kind}.{'csv' if kind == 'csv' else 'txt'}")
+    with open(path, 'w', newline='' if kind == 'csv' else None, encoding='utf-8') as f:
+        if kind == 'csv': f.write(m.format_csv_block(route['cols']))
+        else: f.writelines((m.create_gpgga_sentence(p) if kind == 'gpgga' else m.create_gprmc_sentence(p)) + '\n' for p in points)
+    scalar = {'csv': m.parse_csv_to_points, 'gpgga': m.parse_gpgga_to_points, 'gprmc': m.parse_gprmc_to_points}[kind]
+    ref, ref_s = timed(lambda: scalar(path)); opt, opt_s = timed(lambda: list(m.TrajectoryChunkReader(path)))
+    keys = ('lat', 'lon', 'height') if kind != 'gprmc' else ('lat', 'lon')
+    ref = {key: m.np.array([p[key] for p in ref], dtype=float) for key in keys}
+    opt = {key: m.np.concatenate([c[key] for c in opt]) if opt else m.np.zeros(0) for key in keys}
+    return ref, ref_s, opt, opt_s, len(points)
+
+
+
+def check_geojson_chunks(route, _):
+    """GeoJSON 导入：整个文件一块读取 vs 极小的 IMPORT_CHUNK_BYTES (数字、负号、指数和字符串都会被块边界截断)。"""
+    path = os.path.join(route['workdir'], "verify_route.geojson")
+    cols = route['cols']  # 经纬度取负、高度用指数写法，覆盖 "-"、"." 和 "e-" 处被截断的情况
+    coords = ','.join(f"[{-lon!r},{-lat!r},{h:.6e}]" for lon, lat, h in zip(cols['lon'].tolist(), cols['lat'].tolist(), cols['height'].tolist()))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"type": "Feature", "properties": {"name": "verify, [chunks]"}, "geometry": {"type": "LineString", "coordinates": [' + coords + ']}}')
+    chunk_bytes = readers.IMPORT_CHUNK_BYTES  # 块大小是 readers 模块的全局量，engine 只是汇总
+    try:
+        readers.IMPORT_CHUNK_BYTES = os.path.getsize(path) + 1; ref, ref_s = timed(lambda: m.read_geojson_columns(path))
+        readers.IMPORT_CHUNK_BYTES = 7; opt, opt_s = timed(lambda: m.read_geojson_columns(path))
+    finally: readers.IMPORT_CHUNK_BYTES = chunk_bytes
+    keys = ('lat', 'lon', 'height')
+    return {key: ref[key] for key in keys}, ref_s, {key: opt[key] for key in keys}, opt_s, len(cols['lat'])
+
+# --- 比较函数：返回 (是否通过, 误差 (用于取最坏值), 说明) ---
+def compare_bytes(ref, opt):
+    if ref == opt: return True, 0.0, "逐字节相同"
+    ref_lines, opt_lines = (v.splitlines() if isinstance(v, str) else list(v) for v in (ref, opt))
+    for index, (a, b) in enumerate(zip(ref_lines, opt_lines)):
+        if a != b: return False, math.inf, f"第 {index + 1} 行不同: {a!r} != {b!r}"
+    return False, math.inf, f"行数不同: {len(ref_lines)} != {len(opt_lines)}"
+
+
+def compare_scalar_array(tolerance):
+    def compare(ref, opt):
+        error = max_abs(ref, opt) if not isinstance(ref, tuple) else max(max_abs(r, o) for r, o in zip(ref, opt))
+        return error <= tolerance, error, f"最大误差 {error:.3g}"
+    return compare
+
+
+def compare_bearing(ref, opt):
+    error = bearing_error(ref, opt); return error <= BEARING_TOLERANCE_DEG, error, f"最大误差 {error:.3g}°"
+
+
+def compare_new_point(ref, opt):
+    error = position_error(ref[0], ref[1], opt[0], opt[1]); return error <= POSITION_TOLERANCE_M, error, f"最大误差 {error:.3g} m"
+
+
+def compare_trajectories(ref, opt):
+    """逐段比较点列：点数必须相同，位置按米、方位角按度、其余按各自容差；误差取位置误差。"""
+    worst = {'pos': 0.0, 'bearing': 0.0, 'speed': 0.0, 'time': 0.0, 'height': 0.0}
+    for index, (r, o) in enumerate(zip(ref, opt)):
+        if r is None or o is None:
+            if (r is None) != (o is None): return False, math.inf, f"第 {index + 1} 段一边没有点"
+            continue
+        if len(r['time']) != len(o['time']): return False, math.inf, f"第 {index + 1} 段点数不同: {len(r['time'])} != {len(o['time'])}"
+        worst['pos'] = max(worst['pos'], position_error(r['lat'], r['lon'], o['lat'], o['lon']))
+        worst['bearing'] = max(worst['bearing'], bearing_error(r['bearing'], o['bearing']))
+        worst['speed'] = max(worst['speed'], max_abs(r['speed_knots'], o['speed_knots']))
+        worst['time'] = max(worst['time'], max_abs(r['time'], o['time']))
+        worst['height'] = max(worst['height'], max_abs(r['height'], o['height']))
+    ok = (worst['pos'] <= SEGMENT_POSITION_TOLERANCE_M and worst['bearing'] <= SEGMENT_BEARING_TOLERANCE_DEG and worst['speed'] <= SPEED_TOLERANCE_KNOTS
+          and worst['time'] <= SEGMENT_TIME_TOLERANCE_S and worst['height'] <= HEIGHT_TOLERANCE_M)
+    return ok, worst['pos'], f"位置 {worst['pos']:.3g} m / 方位 {worst['bearing']:.3g}° / 速度 {worst['speed']:.3g} kn / 时间 {worst['time']:.3g} s"
+
+
+def compare_parsed(ref, opt):
+    if any(len(ref[key]) != len(opt[key]) for key in ref): return False, math.inf, f"点数不同: {len(ref['lat'])} != {len(opt['lat'])}"
+    error = max(max_abs(ref[key], opt[key]) for key in ref); return error <= DEGREE_TOLERANCE, error, f"最大误差 {error:.3g}"
+
+
+CHECKS = [
+    ("format/csv", "字节", lambda r: check_format(r, 'csv'), compare_bytes),
+    ("format/gpgga", "字节", lambda r: check_format(r, 'gpgga'), compare_bytes),
+    ("format/gprmc", "字节", lambda r: check_format(r, 'gprmc'), compare_bytes),
+    ("format/nmea-set", "字节", lambda r: check_format(r, 'nmea-set'), compare_bytes),
+    ("format/kml", "字节", lambda r: check_format(r, 'kml'), compare_bytes),
+    ("geometry/distance", "容差", lambda r: check_geometry(r, 'distance'), compare_scalar_array(POSITION_TOLERANCE_M)),
+    ("geometry/bearing", "容差", lambda r: check_geometry(r, 'bearing'), compare_bearing),
+    ("geometry/new-point", "容差", lambda r: check_geometry(r, 'new-point'), compare_new_point),
+    ("convert/gcj02", "容差", lambda r: check_convert(r, 'gcj02'), compare_scalar_array(DEGREE_TOLERANCE)),
+    ("convert/bd09", "容差", lambda r: check_convert(r, 'bd09'), compare_scalar_array(DEGREE_TOLERANCE)),
+    ("segment/vectorized", "容差", lambda r: check_segment_vectorized(r, None), compare_trajectories),
+    ("segment/linear-vs-3.0", "容差", lambda r: check_segment_linear(r, None), compare_trajectories),
+    ("segment/jit", "容差", lambda r: check_segment_jit(r, None), compare_trajectories),
+    ("parse/csv", "容差", lambda r: check_parse(r, 'csv'), compare_parsed),
+    ("parse/gpgga", "容差", lambda r: check_parse(r, 'gpgga'), compare_parsed),
+    ("parse/gprmc", "容差", lambda r: check_parse(r, 'gprmc'), compare_parsed),
+    ("parse/geojson-chunks", "容差", lambda r: check_geojson_chunks(r, None), compare_parsed),
+]
+LEGACY = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS 轨迹生成器差分正确性校验 (参考实现 vs 优化路径)")
+    parser.add_argument("--routes", type=int, default=20, help="随机路线条数，默认 20。")
+    parser.add_argument("--seed", type=int, default=0, help="随机路线的种子，默认 0；第 i 条路线的种子为 seed+i。")
+    parser.add_argument("-k", "--filter", type=str, default="", help="只运行名称包含该字符串的检查项。")
+    parser.add_argument("--json", type=str, metavar='JSON', help="把结果保存为 JSON。")
+    args = parser.parse_args()
+    if m.numpy_module() is None: print("错误: 校验优化路径需要 numpy，请先执行 pip install numpy。"); sys.exit(1)
+    LEGACY['3.0'] = bench.load_engine("3.0")
+
+    checks = [c for c in CHECKS if args.filter in c[0]]
+    totals = {name: {'kind': kind, 'points': 0, 'reference_seconds': 0.0, 'optimized_seconds': 0.0, 'passed': True, 'error': -1.0, 'worst': '', 'failure': None}
+              for name, kind, _, _ in checks}
+    with tempfile.TemporaryDirectory() as workdir:
+        for index in range(args.routes):
+            seed = args.seed + index; rng = random.Random(seed)
+            waypoints, speed_ranges, time_step, utc = random_route(rng)
+            segments = scalar_route(waypoints, speed_ranges, time_step, utc, seed)
+            points = [p for segment in segments for p in segment[5]]
+            route = {'seed': seed, 'input': (waypoints, speed_ranges, time_step, utc), 'segments': segments, 'points': points,
+                     'cols': m.points_to_columns(points), 'workdir': workdir}
+            for name, _, run, compare in checks:
+                ref, ref_s, opt, opt_s, n = run(route)
+                ok, error, detail = compare(ref, opt); total = totals[name]
+                total['points'] += n; total['reference_seconds'] += ref_s; total['optimized_seconds'] += opt_s
+                if error > total['error']: total['error'], total['worst'] = error, detail
+                if not ok and total['passed']: total['passed'], total['failure'] = False, f"路线 {seed}: {detail}"
+
+    print(f"{'检查项':<24}{'方式':<6}{'点数':>9}{'参考 点/秒':>14}{'优化 点/秒':>14}{'加速比':>9}  结果")
+    for name, total in totals.items():
+        ref_rate = total['points'] / total['reference_seconds'] if total['reference_seconds'] > 0 else float('inf')
+        opt_rate = total['points'] / total['optimized_seconds'] if total['optimized_seconds'] > 0 else float('inf')
+        total['reference_points_per_sec'], total['optimized_points_per_sec'], total['speedup'] = ref_rate, opt_rate, opt_rate / ref_rate
+        result = f"通过 ({total['worst']})" if total['passed'] else f"不通过 - {total['failure']}"
+        print(f"{name:<24}{total['kind']:<6}{total['points']:>9}{ref_rate:>14,.0f}{opt_rate:>14,.0f}{total['speedup']:>8.1f}x  {result}")
+    failed = [name for name, total in totals.items() if not total['passed']]
+    if args.json:
+        report = {'meta': {'timestamp': datetime.now(timezone.utc).isoformat(), 'routes': args.routes, 'seed': args.seed,
+                           'numpy': m.np.__version__}, 'checks': totals}
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"结果已保存到 '{args.json}'。")
+    if failed: print(f"\n{len(failed)} 项不通过: {', '.join(failed)}"); sys.exit(1)
+    print(f"\n全部 {len(totals)} 项通过 ({args.routes} 条随机路线)。")
+
+
+if __name__ == "__main__":
+    main()